@@ -0,0 +1,78 @@
+"""
+Memória e tempo por movimentação: ``MovimentacaoItem`` via ItemLoader
+(como era) contra o registro compacto ``Movimentacao``.
+
+    python benchmarks/bench_movimentacoes.py [quantidade]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.loader import ItemLoader  # noqa: E402
+
+from trf_scraper.items import Movimentacao, MovimentacaoItem, to_document  # noqa: E402
+from trf_scraper.textcodes import TEXT_POOL  # noqa: E402
+
+
+TEXTO = 'Juntada de Petição de contrarrazões - Processo remetido ao TRF da 5ª Região'
+
+
+def entradas(quantidade):
+    return [
+        (f'{(i % 28) + 1:02d}/{(i % 12) + 1:02d}/2015 10:{i % 60:02d}:00', f'{TEXTO} ({i})')
+        for i in range(quantidade)
+    ]
+
+
+def com_item_loader(linhas):
+    movimentacoes = []
+    for data, texto in linhas:
+        loader = ItemLoader(item=MovimentacaoItem())
+        loader.add_value('data', data)
+        loader.add_value('texto', texto)
+        movimentacoes.append(loader.load_item())
+    return movimentacoes
+
+
+def com_registros(linhas):
+    return [Movimentacao.extract(data, texto) for data, texto in linhas]
+
+
+def medir(nome, construir, linhas):
+    # Cada medição começa com a tabela de interning vazia: senão a segunda
+    # reaproveita os textos que a primeira guardou e parece gastar menos
+    TEXT_POOL.clear()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    movimentacoes = construir(linhas)
+    extracao = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    to_document(movimentacoes)
+    conversao = time.perf_counter() - inicio
+
+    n = len(linhas)
+    print(
+        f'{nome:<20} {memoria / n:>10.0f} B/mov {extracao / n * 1e6:>10.1f} µs/mov '
+        f'{conversao / n * 1e6:>10.1f} µs/mov'
+    )
+    return memoria / n
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    linhas = entradas(quantidade)
+    print(f'{quantidade} movimentações (memória inclui datas e textos)')
+    print(f'{"":<20} {"memória":>14} {"extração":>17} {"para documento":>17}')
+    antes = medir('MovimentacaoItem', com_item_loader, linhas)
+    depois = medir('Movimentacao', com_registros, linhas)
+    print(f'Redução de memória: {(1 - depois / antes) * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,5 +6,25 @@ Estrutura:
 - test_spider.py: Testes do spider
 - test_pipelines.py: Testes do pipeline MongoDB
 - test_middlewares.py: Testes dos middlewares
+- test_indexes.py: Testes do gerenciamento de índices
+- test_api.py: Testes da API de consulta
+- test_httpcache.py: Testes do cache HTTP
+- test_downloader.py: Testes do pool de conexões
+- test_ratelimit.py: Testes do rate limiter compartilhado
+- test_histogram.py: Testes do histograma de latências
+- test_extensions.py: Testes das métricas do crawl
+- test_profiling.py: Testes da instrumentação de tempo por etapa
+- test_logutils.py: Testes do logging com fila e amostragem
+- test_memory.py: Testes do diagnóstico de memória
+- test_runs.py: Testes do histórico de execuções
+- test_textcodes.py: Testes do interning e da codificação de textos
+- test_partyindex.py: Testes do índice de partes
+- test_launcher.py: Testes do launcher com shards
+- test_frontier.py: Testes do frontier compartilhado
+- test_checkpoint.py: Testes do checkpoint de crawls
+- test_seen.py: Testes do conjunto persistente de processos vistos
+- test_freshness.py: Testes da prioridade por frescor
+- test_deadline.py: Testes do crawl com prazo
+- test_daemon.py: Testes do serviço residente de crawl
 - test_integration.py: Testes de integração end-to-end
 """
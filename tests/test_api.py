@@ -0,0 +1,227 @@
+"""
+Testes unitários para a API de consulta
+"""
+import json
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from trf_scraper.api import CrawlEnqueuer, LRUCache, LookupService
+from trf_scraper.items import format_numero_processo
+
+
+class TestLRUCache(unittest.TestCase):
+    """Testa o cache LRU com TTL"""
+
+    def setUp(self):
+        """Configura um cache com relógio controlado"""
+        self.now = 0
+        self.cache = LRUCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_get_and_set(self):
+        """Testa leitura de valor armazenado"""
+        self.cache.set('a', 1)
+
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_evicts_least_recently_used(self):
+        """Testa remoção do item menos usado"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_expires_after_ttl(self):
+        """Testa expiração por TTL"""
+        self.cache.set('a', 1)
+        self.now = 11
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestCrawlEnqueuer(unittest.TestCase):
+    """Testa o limite de crawls simultâneos agendados pela API"""
+
+    def setUp(self):
+        """Troca o Popen por processos falsos que terminam quando o teste mandar"""
+        self.procs = []
+
+        def popen(command, **kwargs):
+            proc = Mock()
+            proc.command = command
+            proc.poll.return_value = None
+            self.procs.append(proc)
+            return proc
+
+        patcher = patch('trf_scraper.api.subprocess.Popen', side_effect=popen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.enqueuer = CrawlEnqueuer(command=['crawl'], max_running=1, batch_size=2)
+
+    def test_caps_running_and_batches_queue(self):
+        """Testa que faltas além do limite esperam e saem em lotes por argumento"""
+        self.assertTrue(self.enqueuer.enqueue('1'))
+        for valor in ('2', '3', '4'):
+            self.assertTrue(self.enqueuer.enqueue(valor))
+        self.assertTrue(self.enqueuer.enqueue('12345678000190', 'cnpj'))
+        self.assertFalse(self.enqueuer.enqueue('3'))
+        self.assertEqual(len(self.procs), 1)
+
+        self.enqueuer.drain()
+        self.assertEqual(len(self.procs), 1)
+
+        self.procs[0].poll.return_value = 0
+        self.enqueuer.drain()
+        self.procs[1].poll.return_value = 0
+        self.enqueuer.drain()
+        self.procs[2].poll.return_value = 0
+        self.enqueuer.drain()
+
+        self.assertEqual([p.command for p in self.procs], [
+            ['crawl', '-a', 'processos=1'],
+            ['crawl', '-a', 'processos=2,3'],
+            ['crawl', '-a', 'processos=4'],
+            ['crawl', '-a', 'cnpj=12345678000190'],
+        ])
+
+    def test_finished_crawl_can_be_enqueued_again(self):
+        """Testa que o processo volta a ser agendado depois que o crawl termina"""
+        self.enqueuer.enqueue('1')
+        self.assertFalse(self.enqueuer.enqueue('1'))
+
+        self.procs[0].poll.return_value = 0
+
+        self.assertTrue(self.enqueuer.enqueue('1'))
+        self.assertEqual(len(self.procs), 2)
+
+
+class TestLookupService(unittest.TestCase):
+    """Testa as rotas da API"""
+
+    def setUp(self):
+        """Configura o serviço com banco mock"""
+        self.db = MagicMock()
+        self.db.processos.find_one.return_value = {
+            'numero_processo': '0015648-78.1999.4.05.0000',
+            'envolvidos': [],
+        }
+        self.service = LookupService(self.db)
+
+    def test_format_numero_processo(self):
+        """Testa formatação CNJ de número com 20 dígitos"""
+        self.assertEqual(
+            format_numero_processo('00156487819994050000'),
+            '0015648-78.1999.4.05.0000'
+        )
+        self.assertEqual(format_numero_processo('123'), '123')
+
+    def test_get_processo_excludes_movimentacoes(self):
+        """Testa projeção sem movimentações por padrão"""
+        status, headers, body = self.service.handle('/processo/00156487819994050000')
+
+        self.assertEqual(status, 200)
+        self.assertIn('ETag', headers)
+        self.assertEqual(json.loads(body)['numero_processo'], '0015648-78.1999.4.05.0000')
+        query, projection = self.db.processos.find_one.call_args.args
+        self.assertIn('0015648-78.1999.4.05.0000', query['numero_processo']['$in'])
+        self.assertFalse(projection['movimentacoes'])
+
+    def test_get_processo_with_movimentacoes(self):
+        """Testa inclusão de movimentações quando pedido"""
+        self.service.handle('/processo/00156487819994050000?movimentacoes=1')
+
+        projection = self.db.processos.find_one.call_args.args[1]
+        self.assertNotIn('movimentacoes', projection)
+
+    def test_get_processo_decodes_texto_cod(self):
+        """Testa que movimentações gravadas com texto_cod voltam com o texto"""
+        self.db.processos.find_one.return_value = {
+            'numero_processo': '0015648-78.1999.4.05.0000',
+            'movimentacoes': [{'data': '2020-01-01T00:00:00', 'texto_cod': 5}],
+        }
+        self.db['movimentacao_textos'].find.return_value = [{'_id': 5, 'texto': 'Conclusos'}]
+
+        status, _, body = self.service.handle('/processo/00156487819994050000?movimentacoes=1')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            json.loads(body)['movimentacoes'],
+            [{'data': '2020-01-01T00:00:00', 'texto': 'Conclusos'}]
+        )
+
+    def test_cached_lookup_hits_database_once(self):
+        """Testa que consultas repetidas vêm do cache"""
+        self.service.handle('/processo/00156487819994050000')
+        self.service.handle('/processo/00156487819994050000')
+
+        self.db.processos.find_one.assert_called_once()
+
+    def test_etag_returns_not_modified(self):
+        """Testa resposta 304 com If-None-Match"""
+        _, headers, _ = self.service.handle('/processo/00156487819994050000')
+
+        status, _, body = self.service.handle(
+            '/processo/00156487819994050000',
+            if_none_match=headers['ETag']
+        )
+
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_get_processos_by_cnpj(self):
+        """Testa busca de processos pelo CNPJ"""
+        self.db.processos.find.return_value = [{'numero_processo': '1'}]
+
+        status, _, body = self.service.handle('/cnpj/12.345.678%2F0001-90/processos')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['total'], 1)
+        query = self.db.processos.find.call_args.args[0]
+        self.assertEqual(query, {'cnpjs': '12345678000190'})
+
+    def test_missing_processo_returns_404(self):
+        """Testa processo não encontrado"""
+        self.db.processos.find_one.return_value = None
+
+        status, _, _ = self.service.handle('/processo/00156487819994050000')
+
+        self.assertEqual(status, 404)
+
+    def test_missing_processo_enqueues_crawl(self):
+        """Testa agendamento de crawl quando o processo não existe"""
+        self.db.processos.find_one.return_value = None
+        enqueuer = Mock()
+        enqueuer.enqueue.return_value = True
+        service = LookupService(self.db, enqueuer=enqueuer)
+
+        status, _, _ = service.handle('/processo/00156487819994050000')
+
+        self.assertEqual(status, 202)
+        enqueuer.enqueue.assert_called_once_with('00156487819994050000', 'processos')
+
+    def test_missing_cnpj_enqueues_cnpj_search(self):
+        """Testa que CNPJ sem processos agenda a busca por CNPJ, e não por número"""
+        self.db.processos.find.return_value = []
+        enqueuer = Mock()
+        enqueuer.enqueue.return_value = False
+        service = LookupService(self.db, enqueuer=enqueuer)
+
+        status, _, body = service.handle('/cnpj/12.345.678%2F0001-90/processos')
+
+        self.assertEqual(status, 202)
+        self.assertEqual(json.loads(body)['status'], 'crawl em andamento')
+        enqueuer.enqueue.assert_called_once_with('12345678000190', 'cnpj')
+
+    def test_unknown_route(self):
+        """Testa rota inexistente"""
+        status, _, _ = self.service.handle('/outra/rota')
+
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Testes unitários para o checkpoint de crawls
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from trf_scraper.checkpoint import Checkpoint, decode_run, encode_run, key_of
+
+
+class TestEncoding(unittest.TestCase):
+    """Testa chaves e codificação dos arquivos ordenados"""
+
+    def test_key_of(self):
+        """Testa que a chave ignora formatação e dígitos verificadores"""
+        self.assertEqual(key_of('0015648-78.1999.4.05.0000'), key_of('00156487819994050000'))
+        self.assertEqual(key_of('00156487819994050000'), 1564819994050000)
+        self.assertIsNone(key_of(''))
+        self.assertIsNone(key_of('9' * 25))
+
+    def test_encode_decode_roundtrip(self):
+        """Testa ida e volta das diferenças em varint"""
+        keys = [0, 1, 127, 128, 300, 10 ** 17, 2 ** 64 - 1]
+
+        data = encode_run(keys)
+
+        self.assertEqual(list(decode_run(data)), keys)
+        self.assertLess(len(data), 8 * len(keys) + 10)
+
+    def test_decode_invalid(self):
+        """Testa arquivo que não é um checkpoint"""
+        with self.assertRaises(ValueError):
+            decode_run(b'lixo')
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Testa gravação, retomada e compactação"""
+
+    def setUp(self):
+        """Cria o diretório do checkpoint"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = self.tmpdir.name
+
+    def _runs(self):
+        return sorted(f for f in os.listdir(self.path) if f.startswith('run_'))
+
+    def test_flush_by_batch(self):
+        """Testa gravação a cada batch processos"""
+        checkpoint = Checkpoint(self.path, batch=2, interval=3600)
+
+        checkpoint.mark(['00000000000000000001'])
+        self.assertEqual(self._runs(), [])
+        checkpoint.mark(['00000000000000000002'])
+
+        self.assertEqual(self._runs(), ['run_000001.bin'])
+
+    def test_resume_skips_done_and_keeps_position(self):
+        """Testa que a retomada pula os concluídos a partir da posição salva"""
+        entrada = [f'{i:020d}' for i in range(1, 6)]
+        checkpoint = Checkpoint(self.path)
+        checkpoint.entrada = entrada
+        checkpoint.mark([entrada[0], entrada[1], entrada[3]])
+        checkpoint.close()
+
+        retomado = Checkpoint(self.path, resume=True)
+        retomado.entrada = entrada
+
+        self.assertEqual(retomado.posicao, 2)
+        self.assertEqual(list(retomado.pending_input()), [entrada[2], entrada[4]])
+        self.assertIn('0000000-00.0000.0.00.0004', retomado)
+        with open(os.path.join(self.path, 'state.json')) as f:
+            self.assertEqual(json.load(f)['concluidos'], 3)
+
+    def test_without_resume_starts_over(self):
+        """Testa que checkpoint= sem resume= descarta o checkpoint anterior"""
+        checkpoint = Checkpoint(self.path)
+        checkpoint.mark(['00000000000000000001'])
+        checkpoint.close()
+
+        novo = Checkpoint(self.path)
+
+        self.assertNotIn('00000000000000000001', novo)
+        self.assertEqual(self._runs(), [])
+
+    def test_fresh_run_resets_position(self):
+        """Testa que uma execução nova que cai antes de gravar não herda a posição antiga"""
+        antigo = Checkpoint(self.path, batch=1)
+        antigo.entrada = ['00000000000000000001', '00000000000000000002']
+        antigo.mark(antigo.entrada)
+        antigo.close()
+
+        Checkpoint(self.path)
+        retomado = Checkpoint(self.path, resume=True)
+
+        self.assertEqual(retomado.posicao, 0)
+        self.assertFalse(os.path.exists(os.path.join(self.path, 'state.json')))
+
+    def test_flushed_keys_leave_the_set(self):
+        """Testa que, gravados, os processos ficam só nos arrays compactos"""
+        checkpoint = Checkpoint(self.path, batch=2, max_runs=4)
+
+        checkpoint.mark(['00000000000000000007', '00000000000000000002'])
+        checkpoint.mark(['00000000000000000002', '00000000000000000004'])
+
+        self.assertEqual(checkpoint._pending, {key_of('00000000000000000004')})
+        gravados = [key_of('00000000000000000002'), key_of('00000000000000000007')]
+        self.assertEqual([list(run) for run in checkpoint._done], [gravados])
+        self.assertIn('00000000000000000007', checkpoint)
+        self.assertEqual(len(checkpoint), 3)
+
+    def test_compaction(self):
+        """Testa que os arquivos são intercalados em um só acima de max_runs"""
+        checkpoint = Checkpoint(self.path, batch=1, max_runs=1)
+
+        checkpoint.mark(f'{i:020d}' for i in (5, 3, 9))
+        checkpoint.mark(['00000000000000000003', '00000000000000000001'])
+
+        self.assertEqual(len(self._runs()), 1)
+        retomado = Checkpoint(self.path, resume=True)
+        self.assertEqual(len(retomado), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+"""
+Testes unitários para o serviço residente de crawl
+"""
+import json
+import unittest
+from unittest.mock import Mock
+
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+from twisted.web.server import NOT_DONE_YET
+from twisted.web.test.requesthelper import DummyRequest
+
+from trf_scraper.daemon import CONCLUIDO, EM_ANDAMENTO, DaemonSpider, JobsResource, JobTracker
+from trf_scraper.items import ProcessoItem
+
+
+NUMERO = '00156487819994050000'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestJobTracker(unittest.TestCase):
+    """Testa a contagem de requisições e itens e a latência dos jobs"""
+
+    def setUp(self):
+        """Configura o tracker com relógio controlado"""
+        self.clock = FakeClock()
+        self.tracker = JobTracker(stats=Mock(), max_jobs=2, clock=self.clock)
+        self.job = self.tracker.create([NUMERO], [])
+
+    def _request(self, **meta):
+        meta.setdefault('job', self.job.id)
+        return Request(f'https://cp.trf5.jus.br/processo/{NUMERO}', meta=meta)
+
+    def _response(self, request):
+        return HtmlResponse(request.url, body=b'<html></html>', request=request)
+
+    def test_job_finishes_after_item_is_stored(self):
+        """Testa que o job só termina quando o item passa pelos pipelines"""
+        request = self._request()
+        self.tracker.request_scheduled(request)
+        self.tracker.item_pending(self.job.id)
+        self.tracker.request_done(request)
+        self.assertFalse(self.job.done)
+
+        self.clock.now += 1.5
+        self.tracker.item_scraped({'numero_processo': NUMERO}, self._response(request))
+
+        self.assertTrue(self.job.done)
+        self.assertEqual(self.job.itens, [(NUMERO, 1.5)])
+        self.assertEqual(self.tracker.latency.count, 1)
+        data = self.job.to_dict()
+        self.assertEqual(data['status'], CONCLUIDO)
+        self.assertEqual(data['latencia']['primeiro_item'], 1.5)
+        self.assertEqual(data['gravados'], [{'numero_processo': NUMERO, 'latencia': 1.5}])
+
+    def test_retries_and_redirects_are_not_counted_twice(self):
+        """Testa que continuações de uma requisição não abrem outra pendência"""
+        self.tracker.request_scheduled(self._request())
+        retry = self._request(retry_times=1)
+        self.tracker.request_scheduled(retry)
+        self.tracker.request_scheduled(self._request(redirect_times=1))
+        self.assertEqual(self.job.outstanding, 1)
+
+        self.tracker.request_done(retry, failed=True)
+        self.tracker.request_done(retry, failed=True)
+
+        self.assertTrue(self.job.done)
+        self.assertEqual(self.job.erros, 1)
+
+    def test_dropped_request_finishes(self):
+        """Testa que requisição descartada pelo scheduler não prende o job"""
+        request = self._request()
+        self.tracker.request_scheduled(request)
+        self.tracker.request_dropped(request)
+
+        self.assertTrue(self.job.done)
+
+    def test_waiters_called_on_finish(self):
+        """Testa que quem espera o job é avisado na conclusão"""
+        waiter = Mock()
+        self.job.waiters.append(waiter)
+        request = self._request()
+        self.tracker.request_scheduled(request)
+        self.tracker.request_done(request)
+
+        waiter.assert_called_once_with()
+        self.assertEqual(self.job.waiters, [])
+
+    def test_old_finished_jobs_are_evicted(self):
+        """Testa que só os últimos jobs concluídos ficam em memória"""
+        self.tracker.check(self.job)
+        segundo = self.tracker.create([NUMERO], [])
+        terceiro = self.tracker.create([NUMERO], [])
+
+        self.assertIsNone(self.tracker.get(self.job.id))
+        self.assertIs(self.tracker.get(segundo.id), segundo)
+        self.assertIs(self.tracker.get(terceiro.id), terceiro)
+
+
+class TestDaemonSpider(unittest.TestCase):
+    """Testa a submissão de jobs no spider sempre aberto"""
+
+    def setUp(self):
+        """Cria o spider sem entrada, com crawler mock"""
+        self.spider = DaemonSpider()
+        self.spider.settings = Settings({'PARTY_INDEX_ENABLED': False})
+        self.spider.crawler = Mock()
+        self.spider.tracker = JobTracker(stats=Mock())
+        self.scheduled = []
+
+        def crawl(request):
+            self.scheduled.append(request)
+            self.spider.tracker.request_scheduled(request)
+
+        self.spider.crawler.engine.crawl.side_effect = crawl
+
+    def test_no_input_required_and_stays_open(self):
+        """Testa que o daemon abre sem processos e não fecha ocioso"""
+        self.assertEqual(self.spider.processos, [])
+        with self.assertRaises(DontCloseSpider):
+            self.spider.daemon_idle(self.spider)
+
+    def test_submit_schedules_job_requests(self):
+        """Testa que os processos e CNPJs do job são agendados com o id do job"""
+        job = self.spider.submit([NUMERO, NUMERO, ' '], ['12.345.678/0001-90'])
+
+        self.assertEqual(len(self.scheduled), 2)
+        self.assertTrue(all(r.meta['job'] == job.id for r in self.scheduled))
+        self.assertEqual(self.scheduled[0].meta['fonte'], 'daemon')
+        self.assertEqual(job.outstanding, 2)
+        self.assertEqual(job.to_dict()['status'], EM_ANDAMENTO)
+
+    def test_callback_output_propagates_job(self):
+        """Testa que requisições filhas herdam o job e itens ficam pendentes"""
+        job = self.spider.submit([NUMERO], [])
+        request = self.scheduled[0]
+        response = HtmlResponse(request.url, body=b'<html></html>', request=request)
+        filha = Request('https://cp.trf5.jus.br/processo/00000000000000000001')
+
+        saida = list(self.spider._job_output(response, iter([filha, ProcessoItem(numero_processo=NUMERO)])))
+
+        self.assertEqual(saida[0].meta['job'], job.id)
+        self.assertEqual(job.pending_items, 1)
+        self.assertEqual(job.outstanding, 0)
+        self.assertFalse(job.done)
+
+    def test_deferred_retry_keeps_job_open(self):
+        """Testa que a requisição adiada para o fim não encerra o job"""
+        job = self.spider.submit([NUMERO], [])
+        request = self.scheduled[0]
+        request.meta['retry_deferred'] = True
+        failure = Failure(Exception('503'))
+        failure.request = request
+
+        self.spider.handle_error(failure)
+        self.assertFalse(job.done)
+
+        request.meta.pop('retry_deferred')
+        self.spider.handle_error(failure)
+        self.assertTrue(job.done)
+        self.assertEqual(job.erros, 1)
+
+
+class TestJobsResource(unittest.TestCase):
+    """Testa as rotas HTTP do daemon"""
+
+    def setUp(self):
+        """Configura o recurso com spider mock e reactor controlado"""
+        self.tracker = JobTracker()
+        self.spider = Mock()
+        self.spider.tracker = self.tracker
+        self.job = self.tracker.create([NUMERO], [])
+        self.job.outstanding = 1
+        self.spider.submit.return_value = self.job
+        self.reactor = Clock()
+        self.resource = JobsResource(self.spider, max_wait=60, reactor=self.reactor)
+
+    def _request(self, method, path, body=b'', args=None):
+        request = DummyRequest([s.encode() for s in path.strip('/').split('/')])
+        request.method = method
+        request.content = Mock()
+        request.content.read.return_value = body
+        request.args = args or {}
+        return request
+
+    def test_post_job(self):
+        """Testa a submissão de um job"""
+        request = self._request(b'POST', '/jobs', json.dumps({'processos': NUMERO, 'cnpj': ['1', '2']}).encode())
+        body = json.loads(self.resource.render(request))
+
+        self.assertEqual(request.responseCode, 202)
+        self.assertEqual(body['id'], self.job.id)
+        self.spider.submit.assert_called_once_with([NUMERO], ['1', '2'])
+
+    def test_post_invalid(self):
+        """Testa corpo inválido e job vazio"""
+        for corpo in (b'nao e json', b'{}', b'{"processos": ["abc"]}'):
+            request = self._request(b'POST', '/jobs', corpo)
+            self.resource.render(request)
+            self.assertEqual(request.responseCode, 400)
+        self.spider.submit.assert_not_called()
+
+    def test_post_wait_answers_on_finish(self):
+        """Testa que ?wait=N responde quando o job termina"""
+        request = self._request(b'POST', '/jobs', b'{"processos": ["%s"]}' % NUMERO.encode(), {b'wait': [b'30']})
+
+        self.assertEqual(self.resource.render(request), NOT_DONE_YET)
+        self.job.outstanding = 0
+        self.tracker.check(self.job)
+
+        self.assertEqual(request.finished, 1)
+        self.assertEqual(json.loads(b''.join(request.written))['status'], CONCLUIDO)
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
+    def test_post_wait_times_out(self):
+        """Testa que ?wait=N responde 202 se o job não terminar a tempo"""
+        request = self._request(b'POST', '/jobs', b'{"processos": ["%s"]}' % NUMERO.encode(), {b'wait': [b'30']})
+        self.resource.render(request)
+        self.reactor.advance(30)
+
+        self.assertEqual(request.responseCode, 202)
+        self.assertEqual(json.loads(b''.join(request.written))['status'], EM_ANDAMENTO)
+        self.assertEqual(self.job.waiters, [])
+
+    def test_get_routes(self):
+        """Testa consulta de job, lista, status e rotas desconhecidas"""
+        self.spider.status.return_value = {'fila': 0}
+
+        request = self._request(b'GET', f'/jobs/{self.job.id}')
+        self.assertEqual(json.loads(self.resource.render(request))['id'], self.job.id)
+
+        request = self._request(b'GET', '/jobs')
+        self.assertEqual(json.loads(self.resource.render(request))['total'], 1)
+
+        request = self._request(b'GET', '/status')
+        self.assertEqual(json.loads(self.resource.render(request)), {'fila': 0})
+
+        for path in ('/jobs/naoexiste', '/outra'):
+            request = self._request(b'GET', path)
+            self.resource.render(request)
+            self.assertEqual(request.responseCode, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Testes unitários para o crawl com prazo
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+from scrapy import signals
+from scrapy.http import Request
+from scrapy.settings import Settings
+from scrapy.exceptions import NotConfigured
+
+from trf_scraper.deadline import CrawlDeadline, behind_schedule, parse_deadline
+from trf_scraper.items import ProcessoItem
+
+
+AGORA = datetime(2024, 1, 10, 22, 0).timestamp()
+
+
+class TestParseDeadline(unittest.TestCase):
+    """Testa os formatos de prazo"""
+
+    def test_duration(self):
+        """Testa durações relativas"""
+        self.assertEqual(parse_deadline('2h', now=AGORA), AGORA + 7200)
+        self.assertEqual(parse_deadline('1h30m', now=AGORA), AGORA + 5400)
+        self.assertEqual(parse_deadline('45s', now=AGORA), AGORA + 45)
+
+    def test_clock_time_is_next_occurrence(self):
+        """Testa que um horário já passado vale para o dia seguinte"""
+        self.assertEqual(parse_deadline('23:30', now=AGORA), datetime(2024, 1, 10, 23, 30).timestamp())
+        self.assertEqual(parse_deadline('06:00', now=AGORA), datetime(2024, 1, 11, 6, 0).timestamp())
+
+    def test_iso_and_invalid(self):
+        """Testa data ISO, ausência de prazo e formato inválido"""
+        self.assertEqual(parse_deadline('2024-01-11T06:00', now=AGORA), datetime(2024, 1, 11, 6, 0).timestamp())
+        self.assertIsNone(parse_deadline(None))
+        with self.assertRaises(ValueError):
+            parse_deadline('amanhã')
+
+
+class TestCrawlDeadline(unittest.TestCase):
+    """Testa estimativa, aceleração e encerramento"""
+
+    def setUp(self):
+        """Configura a extensão com crawler mock e relógio controlado"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.now = AGORA
+        self.stats = {}
+        self.crawler = Mock()
+        self.crawler.stats.get_value.side_effect = lambda key, default=None: self.stats.get(key, default)
+        self.crawler.engine.downloader.active = set()
+        self.ext = CrawlDeadline(self.crawler, output_dir=self.tmpdir.name, clock=lambda: self.now)
+        self.ext.spider = Mock()
+        self.ext.spider.name = 'processo'
+        self.ext.spider.processos = ['00000000000000000001', '0000000-00.0000.0.00.0002', '00000000000000000003']
+        self.ext.spider.cnpjs = ['12345678000190']
+        self.ext.deadline = AGORA + 100
+        self.ext.task = Mock()
+        self.ext.sample()
+
+    def _scrape(self, numero):
+        response = Mock()
+        response.meta = {'numero_busca': numero}
+        self.ext.item_scraped({'numero_processo': numero}, response, self.ext.spider)
+
+    def test_disabled_raises_not_configured(self):
+        """Testa que a extensão pode ser desligada"""
+        crawler = Mock()
+        crawler.settings = Settings({'DEADLINE_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            CrawlDeadline.from_crawler(crawler)
+
+    def test_tracks_processos_only_with_deadline(self):
+        """Testa que sem prazo nenhum processo é acompanhado"""
+        crawler = Mock()
+        crawler.settings = Settings({'DEADLINE_ENABLED': True, 'ITEM_PIPELINES': {}})
+        ext = CrawlDeadline.from_crawler(crawler)
+        spider = Mock(deadline=None)
+
+        ext.spider_opened(spider)
+        conectados = [c.kwargs['signal'] for c in crawler.signals.connect.call_args_list]
+        self.assertNotIn(signals.item_scraped, conectados)
+        self.assertNotIn(signals.request_scheduled, conectados)
+
+        spider.deadline = AGORA + 3600
+        with patch('trf_scraper.deadline.task'), patch('twisted.internet.reactor.callLater'):
+            ext.spider_opened(spider)
+        conectados = [c.kwargs['signal'] for c in crawler.signals.connect.call_args_list]
+        self.assertIn(signals.item_scraped, conectados)
+        self.assertIn(signals.request_scheduled, conectados)
+
+    def test_item_not_stored_stays_pending(self):
+        """Testa que processo com falha no MongoDB continua no restante"""
+        from trf_scraper.pipelines import _mark_stored
+
+        self.ext.require_stored = True
+        response = Mock()
+        response.meta = {}
+        falhou = ProcessoItem(numero_processo='00000000000000000001')
+        gravado = ProcessoItem(numero_processo='00000000000000000003')
+        _mark_stored(gravado)
+
+        self.ext.item_scraped(falhou, response, self.ext.spider)
+        self.ext.item_scraped(gravado, response, self.ext.spider)
+
+        self.assertEqual(self.ext.pending(), ['00000000000000000001', '00000000000000000002'])
+
+    def test_pending_keeps_input_order_then_discovered(self):
+        """Testa pendentes: entrada na ordem, depois os descobertos nas listas"""
+        self.ext.request_scheduled(Request('https://cp.trf5.jus.br/processo/00000000000000000009'), None)
+        self._scrape('00000000000000000001')
+
+        self.assertEqual(
+            self.ext.pending(),
+            ['00000000000000000002', '00000000000000000003', '00000000000000000009']
+        )
+
+    def test_behind_schedule_asks_for_more_concurrency(self):
+        """Testa o sinal quando a vazão não basta para o prazo"""
+        self.now += 80
+        self.stats['item_scraped_count'] = 8
+
+        self.ext.check()
+
+        self.crawler.signals.send_catch_log.assert_called_once_with(behind_schedule, spider=self.ext.spider)
+        self.crawler.stats.set_value.assert_any_call('deadline/projected_unfinished', 1)
+
+    def test_on_schedule_does_not_signal(self):
+        """Testa que sem atraso a concorrência não é mexida"""
+        self.now += 10
+        self.stats['item_scraped_count'] = 10
+
+        self.ext.check()
+
+        self.crawler.signals.send_catch_log.assert_not_called()
+
+    def test_closes_early_when_in_flight_would_overrun(self):
+        """Testa encerramento antes do prazo se o que está em andamento não cabe"""
+        self.now += 90
+        self.stats['item_scraped_count'] = 9
+        self.crawler.engine.downloader.active = set(range(20))
+
+        self.ext.check()
+
+        self.crawler.engine.close_spider.assert_called_once_with(self.ext.spider, 'deadline')
+
+    def test_remainder_written_on_deadline(self):
+        """Testa o arquivo com o restante, pronto para arquivo_processos"""
+        self._scrape('00000000000000000003')
+
+        self.ext.spider_closed(self.ext.spider, 'deadline')
+
+        arquivos = os.listdir(self.tmpdir.name)
+        self.assertEqual(len(arquivos), 1)
+        with open(os.path.join(self.tmpdir.name, arquivos[0]), encoding='utf-8') as f:
+            linhas = f.read().splitlines()
+        self.assertEqual(
+            [l for l in linhas if not l.startswith('#')],
+            ['00000000000000000001', '00000000000000000002']
+        )
+        self.assertIn('# CNPJs sem lista recebida: -a cnpj=12345678000190', linhas)
+
+    def test_no_remainder_when_finished(self):
+        """Testa que o crawl terminado normalmente não grava restante"""
+        self.ext.spider_closed(self.ext.spider, 'finished')
+
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
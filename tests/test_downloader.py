@@ -0,0 +1,71 @@
+"""
+Testes unitários para o pool de conexões instrumentado
+"""
+import unittest
+from unittest.mock import Mock
+
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+from twisted.web.client import HTTPConnectionPool
+
+from trf_scraper.downloader import CountingConnectionPool, PersistentHTTPDownloadHandler
+
+
+class TestCountingConnectionPool(unittest.TestCase):
+    """Testa a contagem de conexões novas e reaproveitadas"""
+
+    def setUp(self):
+        """Configura o pool com stats reais e endpoint falso"""
+        self.crawler = get_crawler(settings_dict={})
+        self.crawler.stats.open_spider(None)
+        self.pool = CountingConnectionPool(Mock(), self.crawler.stats)
+        self.endpoint = Mock()
+        self.endpoint.connect.return_value = defer.succeed(Mock())
+        self.key = (b'https', b'cp.trf5.jus.br', 443)
+
+    def test_new_connection_counts_handshake(self):
+        """Testa contagem de conexão nova e handshake TLS"""
+        self.pool.getConnection(self.key, self.endpoint)
+
+        stats = self.crawler.stats
+        self.assertEqual(stats.get_value('connections/opened'), 1)
+        self.assertEqual(stats.get_value('connections/tls_handshakes'), 1)
+        self.assertEqual(stats.get_value('connections/opened/cp.trf5.jus.br'), 1)
+        self.assertEqual(stats.get_value('connections/reuse_ratio'), 0)
+
+    def test_cached_connection_is_reused(self):
+        """Testa que conexão ociosa no pool é reaproveitada"""
+        connection = Mock()
+        connection.state = 'QUIESCENT'
+        self.pool._connections[self.key] = [connection]
+        self.pool._timeouts[connection] = Mock()
+
+        self.pool.getConnection(self.key, self.endpoint)
+
+        stats = self.crawler.stats
+        self.assertIsNone(stats.get_value('connections/opened'))
+        self.assertEqual(stats.get_value('connections/reused'), 1)
+        self.assertEqual(stats.get_value('connections/reuse_ratio'), 1)
+
+
+class TestPersistentHTTPDownloadHandler(unittest.TestCase):
+    """Testa a configuração do handler"""
+
+    def test_pool_sized_to_concurrency(self):
+        """Testa que o pool acompanha a concorrência configurada"""
+        crawler = get_crawler(settings_dict={
+            'CONCURRENT_REQUESTS': 12,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
+        })
+        handler = PersistentHTTPDownloadHandler.__new__(PersistentHTTPDownloadHandler)
+        handler._pool = HTTPConnectionPool(Mock())
+
+        handler._install_pool(crawler)
+
+        self.assertIsInstance(handler._pool, CountingConnectionPool)
+        self.assertEqual(handler._pool.maxPersistentPerHost, 12)
+        self.assertEqual(handler._pool.cachedConnectionTimeout, 240)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Testes unitários para as extensões
+"""
+import json
+import unittest
+from unittest.mock import Mock
+
+from scrapy.exceptions import NotConfigured
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.extensions import MetricsServer
+
+
+class TestMetricsServer(unittest.TestCase):
+    """Testa as métricas e o progresso do crawl"""
+
+    def setUp(self):
+        """Cria a extensão com estatísticas em memória"""
+        self.crawler = Mock()
+        self.crawler.stats = MemoryStatsCollector(Mock())
+        self.crawler.engine.downloader.active = {Mock(), Mock()}
+        self.crawler.engine._slot.scheduler.__len__ = Mock(return_value=7)
+
+        self.ext = MetricsServer(self.crawler)
+        self.ext.spider = Mock(processos=['1', '2', '3', '4'])
+
+    def test_disabled_by_default(self):
+        """Testa que a extensão não é carregada sem METRICS_ENABLED"""
+        crawler = get_crawler(settings_dict={'METRICS_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            MetricsServer.from_crawler(crawler)
+
+    def test_rates_and_eta(self):
+        """Testa taxas pela janela de amostras e ETA pelo tamanho da entrada"""
+        stats = self.crawler.stats
+        self.ext.sample(now=100.0)
+        stats.set_value('item_scraped_count', 2)
+        stats.set_value('response_received_count', 4)
+        stats.set_value('input/discovered', 2)
+        self.ext.sample(now=110.0)
+
+        data = self.ext.snapshot()
+
+        self.assertEqual(data['items_per_second'], 0.2)
+        self.assertEqual(data['pages_per_second'], 0.4)
+        self.assertEqual(data['input_total'], 6)
+        self.assertEqual(data['input_done'], 2)
+        self.assertEqual(data['eta_seconds'], 20.0)
+        self.assertEqual(data['queue_depth'], 7)
+        self.assertEqual(data['in_flight'], 2)
+
+    def test_eta_unknown_without_progress(self):
+        """Testa ETA indefinido quando nenhum item foi extraído"""
+        self.assertIsNone(self.ext.snapshot()['eta_seconds'])
+
+    def test_error_rate_and_mongo_latency(self):
+        """Testa taxa de erro e latência média de escrita no MongoDB"""
+        stats = self.crawler.stats
+        stats.set_value('downloader/request_count', 10)
+        stats.set_value('downloader/exception_count', 1)
+        stats.set_value('downloader/response_status_count/503', 1)
+        stats.set_value('mongodb/writes', 4)
+        stats.set_value('mongodb/write_time', 0.2)
+
+        data = json.loads(self.ext.render_progress())
+
+        self.assertEqual(data['error_rate'], 0.2)
+        self.assertEqual(data['mongodb_write_latency_avg'], 0.05)
+
+    def test_openmetrics_format(self):
+        """Testa o texto OpenMetrics com contadores, gauges e EOF"""
+        self.crawler.stats.set_value('item_scraped_count', 3)
+
+        text = self.ext.render_metrics().decode('utf-8')
+
+        self.assertIn('# TYPE trf5_items_scraped counter', text)
+        self.assertIn('trf5_items_scraped_total 3', text)
+        self.assertIn('trf5_queue_depth 7', text)
+        self.assertNotIn('trf5_eta_seconds', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Testes unitários para a prioridade por frescor
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from trf_scraper.freshness import FreshnessScorer, change_rate, freshness_score, score_priority
+
+
+AGORA = datetime(2024, 6, 1, 12, 0)
+
+
+def documento(numero, dias_desde_verificacao, mudancas=1, dias_observados=100, ultima_movimentacao=None):
+    checked = AGORA - timedelta(days=dias_desde_verificacao)
+    doc = {
+        'numero_processo': numero,
+        'change_count': mudancas,
+        'created_at': checked - timedelta(days=dias_observados),
+        'checked_at': checked,
+    }
+    if ultima_movimentacao is not None:
+        doc['ultima_movimentacao'] = (AGORA - timedelta(days=ultima_movimentacao)).isoformat()
+    return doc
+
+
+class TestFreshnessScore(unittest.TestCase):
+    """Testa a nota de frescor"""
+
+    def test_unknown_processo_has_max_score(self):
+        """Testa que processo nunca gravado tem nota 1"""
+        self.assertEqual(freshness_score(None, AGORA), 1.0)
+        self.assertEqual(freshness_score({'numero_processo': 'x'}, AGORA), 1.0)
+
+    def test_grows_with_time_since_check(self):
+        """Testa que a nota cresce com o tempo desde a última verificação"""
+        recente = freshness_score(documento('a', 1), AGORA)
+        antigo = freshness_score(documento('a', 60), AGORA)
+
+        self.assertLess(recente, antigo)
+        self.assertEqual(freshness_score(documento('a', 0), AGORA), 0.0)
+
+    def test_history_and_recent_activity_raise_rate(self):
+        """Testa que mudanças frequentes e movimentação recente aumentam a taxa"""
+        parado = change_rate(documento('a', 10, mudancas=1, ultima_movimentacao=900), AGORA)
+        frequente = change_rate(documento('a', 10, mudancas=20, ultima_movimentacao=900), AGORA)
+        ativo = change_rate(documento('a', 10, mudancas=1, ultima_movimentacao=2), AGORA)
+
+        self.assertGreater(frequente, parado)
+        self.assertGreater(ativo, parado)
+
+    def test_score_priority(self):
+        """Testa a conversão da nota para prioridade do Scrapy"""
+        self.assertEqual(score_priority(0.0), 1)
+        self.assertEqual(score_priority(1.0), 101)
+
+
+class TestFreshnessScorer(unittest.TestCase):
+    """Testa a consulta e a ordenação"""
+
+    def test_rank(self):
+        """Testa a ordem: novo, ativo e por último o parado"""
+        collection = MagicMock()
+        collection.aggregate.return_value = [
+            documento('0000001-00.2020.4.05.0000', 30, ultima_movimentacao=900),
+            documento('0000002-00.2020.4.05.0000', 30, mudancas=10, ultima_movimentacao=3),
+        ]
+        scorer = FreshnessScorer(collection, clock=lambda: AGORA)
+
+        ranking = scorer.rank(['00000010020204050000', '00000020020204050000', '00000030020204050000'])
+
+        self.assertEqual(
+            [n for n, _ in ranking],
+            ['00000030020204050000', '00000020020204050000', '00000010020204050000']
+        )
+        self.assertEqual(ranking[0][1], 1.0)
+        match = collection.aggregate.call_args.args[0][0]['$match']
+        self.assertIn('0000001-00.2020.4.05.0000', match['numero_processo']['$in'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Testes unitários para o frontier compartilhado
+"""
+import os
+import tempfile
+import unittest
+
+from trf_scraper.frontier import CONCLUIDO, EM_ANDAMENTO, FALHOU, PENDENTE, SqliteFrontier
+
+
+class FakeClock:
+    """Relógio controlado pelo teste"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSqliteFrontier(unittest.TestCase):
+    """Testa arrendamento, confirmação e devolução de processos"""
+
+    def setUp(self):
+        """Cria um frontier em diretório temporário"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'frontier.sqlite')
+        self.clock = FakeClock()
+        self.frontier = SqliteFrontier(self.path, max_attempts=2, clock=self.clock)
+        self.addCleanup(self.frontier.close)
+
+    def test_add_deduplicates(self):
+        """Testa que números repetidos ou já enfileirados não entram de novo"""
+        self.assertEqual(self.frontier.add(['0015648-78.1999.4.05.0000', '00156487819994050000', ' ']), 1)
+        self.assertEqual(self.frontier.add(['00156487819994050000', '00000000000000000002']), 1)
+        self.assertEqual(self.frontier.counts()[PENDENTE], 2)
+
+    def test_lease_is_exclusive_between_workers(self):
+        """Testa que dois workers não recebem o mesmo número"""
+        self.frontier.add([f'{i:020d}' for i in range(5)])
+        outro = SqliteFrontier(self.path, clock=self.clock)
+        self.addCleanup(outro.close)
+
+        primeiro = self.frontier.lease('w1', 3, 60)
+        segundo = outro.lease('w2', 3, 60)
+
+        self.assertEqual(len(primeiro), 3)
+        self.assertEqual(len(segundo), 2)
+        self.assertFalse(set(primeiro) & set(segundo))
+        self.assertEqual(self.frontier.counts()[EM_ANDAMENTO], 5)
+
+    def test_expired_lease_is_reclaimed(self):
+        """Testa que o número de um worker que morreu volta a ser arrendado"""
+        self.frontier.add(['00000000000000000001'])
+        self.frontier.lease('w1', 10, 60)
+        self.assertEqual(self.frontier.lease('w2', 10, 60), [])
+
+        self.clock.now += 61
+
+        self.assertEqual(self.frontier.lease('w2', 10, 60), ['00000000000000000001'])
+
+    def test_ack(self):
+        """Testa que o número confirmado sai da fila"""
+        self.frontier.add(['00000000000000000001'])
+        self.frontier.lease('w1', 10, 60)
+
+        self.frontier.ack(['00000000000000000001'])
+
+        self.assertEqual(self.frontier.counts()[CONCLUIDO], 1)
+        self.assertFalse(self.frontier.has_work())
+
+    def test_nack_with_delay(self):
+        """Testa que o número devolvido só volta depois do atraso"""
+        self.frontier.add(['00000000000000000001'])
+        self.frontier.lease('w1', 10, 60)
+
+        self.frontier.nack(['00000000000000000001'], delay=30)
+
+        self.assertTrue(self.frontier.has_work())
+        self.assertEqual(self.frontier.lease('w1', 10, 60), [])
+        self.clock.now += 30
+        self.assertEqual(self.frontier.lease('w1', 10, 60), ['00000000000000000001'])
+
+    def test_nack_after_max_attempts_fails(self):
+        """Testa que o número vira falhou depois de max_attempts tentativas"""
+        self.frontier.add(['00000000000000000001'])
+        for _ in range(2):
+            self.frontier.lease('w1', 10, 60)
+            self.frontier.nack(['00000000000000000001'])
+
+        self.assertEqual(self.frontier.counts()[FALHOU], 1)
+        self.assertFalse(self.frontier.has_work())
+
+    def test_expired_lease_after_max_attempts_fails(self):
+        """Testa que arrendamento vencido sem tentativas restantes vira falhou"""
+        self.frontier.add(['00000000000000000001'])
+        for _ in range(2):
+            self.assertEqual(self.frontier.lease('w1', 10, 60), ['00000000000000000001'])
+            self.clock.now += 61
+
+        self.assertEqual(self.frontier.lease('w2', 10, 60), [])
+        self.assertEqual(self.frontier.counts()[FALHOU], 1)
+        self.assertFalse(self.frontier.has_work())
+
+
+if __name__ == '__main__':
+    unittest.main()
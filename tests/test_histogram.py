@@ -0,0 +1,51 @@
+"""
+Testes unitários para o histograma logarítmico
+"""
+import unittest
+
+from trf_scraper.histogram import LogHistogram
+
+
+class TestLogHistogram(unittest.TestCase):
+    """Testa o histograma de latências"""
+
+    def setUp(self):
+        """Cria um histograma com valores padrão"""
+        self.histogram = LogHistogram()
+
+    def test_empty_histogram(self):
+        """Testa percentis sem amostras"""
+        self.assertIsNone(self.histogram.percentile(95))
+        self.assertEqual(self.histogram.summary()['count'], 0)
+
+    def test_percentiles_within_relative_error(self):
+        """Testa erro relativo dos percentis abaixo do crescimento dos buckets"""
+        for ms in range(1, 1001):
+            self.histogram.record(ms / 1000)
+
+        for pct, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            with self.subTest(pct=pct):
+                value = self.histogram.percentile(pct)
+                self.assertLessEqual(abs(value - expected) / expected, 0.1)
+
+    def test_fixed_memory(self):
+        """Testa que o número de buckets não cresce com as amostras"""
+        buckets = len(self.histogram.buckets)
+
+        for i in range(10000):
+            self.histogram.record(i * 0.1)
+
+        self.assertEqual(len(self.histogram.buckets), buckets)
+        self.assertEqual(self.histogram.count, 10000)
+
+    def test_values_out_of_range(self):
+        """Testa valores abaixo do mínimo e acima do máximo"""
+        self.histogram.record(0)
+        self.histogram.record(10000)
+
+        self.assertEqual(self.histogram.percentile(100), 10000)
+        self.assertEqual(self.histogram.buckets[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Testes unitários para a política e o armazenamento do cache HTTP
+"""
+import shutil
+import tempfile
+import unittest
+from time import time
+from unittest.mock import Mock
+
+from scrapy.http import FormRequest, HtmlResponse, Request
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.httpcache import SqliteCacheStorage, TRF5CachePolicy
+
+
+PROCESSO_URL = 'https://cp.trf5.jus.br/processo/00156487819994050000'
+FORM_URL = 'https://cp.trf5.jus.br/cp/'
+
+
+class TestTRF5CachePolicy(unittest.TestCase):
+    """Testa a política de cache por tipo de página"""
+
+    def setUp(self):
+        """Configura a política com TTLs conhecidos"""
+        self.policy = TRF5CachePolicy(Settings({
+            'HTTPCACHE_PROCESSO_TTL': 60,
+            'HTTPCACHE_FORM_TTL': 3600,
+        }))
+
+    def _response(self, url, body, status=200):
+        return HtmlResponse(url=url, body=body, status=status)
+
+    def test_caches_process_page(self):
+        """Testa que página de processo válida é guardada"""
+        request = Request(PROCESSO_URL)
+        response = self._response(PROCESSO_URL, b'<p>PROCESSO N 0015648</p>')
+
+        self.assertTrue(self.policy.should_cache_request(request))
+        self.assertTrue(self.policy.should_cache_response(response, request))
+
+    def test_never_caches_error_page(self):
+        """Testa que páginas de erro não são guardadas"""
+        request = Request(PROCESSO_URL)
+
+        for response in (
+            self._response(PROCESSO_URL, b'Processo nao encontrado'),
+            self._response(PROCESSO_URL, b'<p>PROCESSO N 1</p>', status=500),
+        ):
+            with self.subTest(status=response.status):
+                self.assertFalse(self.policy.should_cache_response(response, request))
+
+    def test_never_caches_captcha_page(self):
+        """Testa que páginas de CAPTCHA não são guardadas"""
+        request = Request(FORM_URL)
+        response = self._response(FORM_URL, b'Please solve this CAPTCHA')
+
+        self.assertFalse(self.policy.should_cache_response(response, request))
+
+    def test_ttl_depends_on_endpoint(self):
+        """Testa TTL curto para processo e longo para formulário"""
+        stored_at = time() - 120
+        processo = Request(PROCESSO_URL, meta={'cache_timestamp': stored_at})
+        form = Request(FORM_URL, meta={'cache_timestamp': stored_at})
+
+        self.assertFalse(self.policy.is_cached_response_fresh(Mock(), processo))
+        self.assertTrue(self.policy.is_cached_response_fresh(Mock(), form))
+
+    def test_cnpj_list_request_is_cacheable(self):
+        """Testa que o POST da lista de processos pode ser guardado"""
+        request = FormRequest('https://cp.trf5.jus.br/cp/cp.do', formdata={'a': '1'})
+
+        self.assertTrue(self.policy.should_cache_request(request))
+
+
+class TestSqliteCacheStorage(unittest.TestCase):
+    """Testa o armazenamento comprimido em SQLite"""
+
+    def setUp(self):
+        """Abre o armazenamento em um diretório temporário"""
+        self.tmpdir = tempfile.mkdtemp()
+        settings = Settings({'HTTPCACHE_DIR': self.tmpdir, 'HTTPCACHE_EXPIRATION_SECS': 0})
+        self.crawler = get_crawler(settings_dict={})
+        self.crawler.stats.open_spider(None)
+        self.spider = Mock()
+        self.spider.name = 'processo'
+        self.spider.crawler = self.crawler
+        self.storage = SqliteCacheStorage(settings)
+        self.storage.open_spider(self.spider)
+
+    def tearDown(self):
+        self.storage.close_spider(self.spider)
+        shutil.rmtree(self.tmpdir)
+
+    def test_store_and_retrieve(self):
+        """Testa ida e volta de uma resposta"""
+        request = Request(PROCESSO_URL)
+        body = b'<p>PROCESSO N 0015648</p>' * 100
+        response = HtmlResponse(url=PROCESSO_URL, body=body, headers={'X-Test': 'sim', 'Content-Type': 'text/html'})
+
+        self.storage.store_response(self.spider, request, response)
+        cached = self.storage.retrieve_response(self.spider, Request(PROCESSO_URL))
+
+        self.assertEqual(cached.body, body)
+        self.assertEqual(cached.status, 200)
+        self.assertEqual(cached.headers.get('X-Test'), b'sim')
+        self.assertIsInstance(cached, HtmlResponse)
+
+    def test_body_is_compressed_and_stats_recorded(self):
+        """Testa compressão e estatísticas de bytes"""
+        request = Request(PROCESSO_URL)
+        body = b'<p>PROCESSO N 0015648</p>' * 100
+        self.storage.store_response(self.spider, request, HtmlResponse(url=PROCESSO_URL, body=body))
+        self.storage.retrieve_response(self.spider, request)
+
+        stats = self.crawler.stats
+        self.assertLess(stats.get_value('httpcache/bytes_stored'), len(body))
+        self.assertEqual(stats.get_value('httpcache/bytes_saved'), len(body))
+        self.assertIn('cache_timestamp', request.meta)
+
+    def test_stale_entry_is_not_counted_as_saved(self):
+        """Testa que entrada vencida pelo TTL da política não conta em bytes_saved"""
+        self.storage.policy = TRF5CachePolicy(Settings({'HTTPCACHE_PROCESSO_TTL': 60}))
+        request = Request(PROCESSO_URL)
+        self.storage.store_response(self.spider, request, HtmlResponse(url=PROCESSO_URL, body=b'PROCESSO N'))
+        self.storage.db.execute('UPDATE responses SET stored_at = ?', (time() - 120,))
+
+        self.assertIsNone(self.storage.retrieve_response(self.spider, Request(PROCESSO_URL)))
+        self.assertIsNone(self.crawler.stats.get_value('httpcache/bytes_saved'))
+
+    def test_expired_entries_purged_on_open(self):
+        """Testa que entradas mais velhas que o maior TTL são apagadas ao abrir"""
+        request = Request(PROCESSO_URL)
+        self.storage.store_response(self.spider, request, HtmlResponse(url=PROCESSO_URL, body=b'PROCESSO N'))
+        self.storage.store_response(
+            self.spider, Request(PROCESSO_URL + '1'), HtmlResponse(url=PROCESSO_URL + '1', body=b'PROCESSO N')
+        )
+        self.storage.db.execute('UPDATE responses SET stored_at = ? WHERE url = ?', (time() - 120, PROCESSO_URL))
+        self.storage.close_spider(self.spider)
+
+        self.storage.policy = TRF5CachePolicy(Settings({
+            'HTTPCACHE_PROCESSO_TTL': 60, 'HTTPCACHE_LISTA_TTL': 60, 'HTTPCACHE_FORM_TTL': 90
+        }))
+        self.storage.open_spider(self.spider)
+
+        urls = [row[0] for row in self.storage.db.execute('SELECT url FROM responses')]
+        self.assertEqual(urls, [PROCESSO_URL + '1'])
+        self.assertEqual(self.crawler.stats.get_value('httpcache/purged'), 1)
+
+    def test_retrieve_missing(self):
+        """Testa requisição não guardada"""
+        self.assertIsNone(self.storage.retrieve_response(self.spider, Request(PROCESSO_URL)))
+
+
+if __name__ == '__main__':
+    unittest.main()
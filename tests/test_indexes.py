@@ -0,0 +1,91 @@
+"""
+Testes unitários para o gerenciamento de índices
+"""
+import unittest
+from unittest.mock import MagicMock
+
+from trf_scraper.indexes import (
+    INDEXES,
+    TEXT_INDEX,
+    declared_indexes,
+    ensure_indexes,
+    index_stats
+)
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    """Testa a criação dos índices declarados"""
+
+    def setUp(self):
+        """Configura uma coleção mock"""
+        self.collection = MagicMock()
+        self.collection.index_information.return_value = {'_id_': {}}
+
+    def test_declared_indexes_without_text(self):
+        """Testa que o índice de texto é opcional"""
+        self.assertEqual(declared_indexes(), INDEXES)
+        self.assertIn(TEXT_INDEX, declared_indexes(text_index=True))
+
+    def test_creates_missing_indexes_in_background(self):
+        """Testa criação de todos os índices que não existem"""
+        criados = ensure_indexes(self.collection)
+
+        self.assertEqual(len(criados), len(INDEXES))
+        for call in self.collection.create_index.call_args_list:
+            self.assertTrue(call.kwargs['background'])
+
+    def test_skips_existing_indexes(self):
+        """Testa que índices existentes não são recriados"""
+        self.collection.index_information.return_value = {
+            spec['name']: {} for spec in INDEXES
+        }
+
+        criados = ensure_indexes(self.collection)
+
+        self.assertEqual(criados, [])
+        self.collection.create_index.assert_not_called()
+
+    def test_numero_processo_is_unique(self):
+        """Testa que o índice de numero_processo continua único"""
+        ensure_indexes(self.collection)
+
+        call = self.collection.create_index.call_args_list[0]
+        self.assertEqual(call.args[0], [('numero_processo', 1)])
+        self.assertTrue(call.kwargs['unique'])
+
+    def test_relator_search_uses_envolvidos(self):
+        """Testa que a busca por relator usa papel e nome dos envolvidos"""
+        keys = [spec['keys'] for spec in INDEXES]
+
+        self.assertIn([('envolvidos.papel', 1), ('envolvidos.nome', 1)], keys)
+        self.assertNotIn([('relator', 1)], keys)
+
+    def test_text_index_created_when_requested(self):
+        """Testa criação do índice de texto"""
+        criados = ensure_indexes(self.collection, text_index=True)
+
+        self.assertIn(TEXT_INDEX['name'], criados)
+
+
+class TestIndexStats(unittest.TestCase):
+    """Testa o relatório de tamanho e uso dos índices"""
+
+    def test_index_stats_merges_size_and_usage(self):
+        """Testa junção de collStats com $indexStats"""
+        db = MagicMock()
+        db.command.return_value = {
+            'indexSizes': {'_id_': 4096, 'numero_processo_1': 8192}
+        }
+        db.__getitem__.return_value.aggregate.return_value = [
+            {'name': 'numero_processo_1', 'accesses': {'ops': 42, 'since': 'ontem'}},
+        ]
+
+        stats = {s['name']: s for s in index_stats(db)}
+
+        self.assertEqual(stats['numero_processo_1']['size_bytes'], 8192)
+        self.assertEqual(stats['numero_processo_1']['ops'], 42)
+        self.assertEqual(stats['_id_']['ops'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,6 +39,7 @@ class TestIntegrationProcessoSpider(unittest.TestCase):
     def test_spider_parse_processo_integration(self):
         """Testa parsing completo de um processo"""
         spider = ProcessoSpider(processos="00156487819994050000")
+        spider.crawler = Mock()
         
         # HTML real simplificado de um processo
         html = """
@@ -117,6 +118,7 @@ class TestIntegrationPipeline(unittest.TestCase):
         
         mock_result = Mock()
         mock_result.upserted_id = "new_id"
+        mock_result.matched_count = 0
         mock_collection.update_one.return_value = mock_result
         
         # Pipeline
@@ -153,7 +155,9 @@ class TestIntegrationPipeline(unittest.TestCase):
         
         # Verificações
         self.assertEqual(result, item)
-        mock_collection.update_one.assert_called_once()
+        # Verificação do hash (nenhum documento igual) e depois o upsert
+        self.assertEqual(mock_collection.update_one.call_count, 2)
+        self.assertTrue(mock_collection.update_one.call_args.kwargs['upsert'])
         mock_client.close.assert_called_once()
 
 
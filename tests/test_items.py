@@ -10,11 +10,15 @@ from trf_scraper.items import (
     ProcessoItem, 
     EnvolvidoItem, 
     MovimentacaoItem,
+    Envolvido,
+    Movimentacao,
     clean_numero_processo,
     clean_data_autuacao,
     clean_cnpj,
     parse_date,
-    clean_text
+    clean_text,
+    serialize_records,
+    to_document
 )
 
 
@@ -234,5 +238,77 @@ class TestMovimentacaoItem(unittest.TestCase):
         self.assertEqual(item['texto'], 'Baixa Definitiva - Processo Migrado para o PJe.')
 
 
+class TestRecords(unittest.TestCase):
+    """Testa os registros compactos de movimentações e envolvidos"""
+    
+    def test_movimentacao_matches_item_loader(self):
+        """Testa que o registro aplica os mesmos processadores do ItemLoader"""
+        data, texto = ' 11/11/2025 14:30:00 ', '  Baixa   <b>Definitiva</b> '
+        
+        loader = ItemLoader(item=MovimentacaoItem())
+        loader.add_value('data', data)
+        loader.add_value('texto', texto)
+        
+        self.assertEqual(Movimentacao.extract(data, texto), loader.load_item())
+    
+    def test_envolvido_matches_item_loader(self):
+        """Testa envolvido igual ao extraído pelo ItemLoader"""
+        loader = ItemLoader(item=EnvolvidoItem())
+        loader.add_value('papel', 'RELATOR')
+        loader.add_value('nome', '  DESEMBARGADOR   FEDERAL ')
+        
+        self.assertEqual(Envolvido.extract('RELATOR', '  DESEMBARGADOR   FEDERAL '), loader.load_item())
+    
+    def test_empty_fields_are_missing(self):
+        """Testa que campo vazio fica ausente, como no Item"""
+        mov = Movimentacao.extract('', 'Conclusos')
+        
+        self.assertNotIn('data', mov)
+        self.assertIsNone(mov.get('data'))
+        self.assertEqual(mov.to_dict(), {'texto': 'Conclusos'})
+        with self.assertRaises(KeyError):
+            mov['data']
+    
+    def test_no_instance_dict(self):
+        """Testa que o registro não tem __dict__"""
+        mov = Movimentacao(datetime(2025, 11, 11), 'Conclusos')
+        
+        self.assertFalse(hasattr(mov, '__dict__'))
+        with self.assertRaises(AttributeError):
+            mov.outro = 1
+    
+    def test_to_item(self):
+        """Testa conversão para o Item do Scrapy"""
+        item = Movimentacao(texto='Conclusos').to_item()
+        
+        self.assertIsInstance(item, MovimentacaoItem)
+        self.assertEqual(dict(item), {'texto': 'Conclusos'})
+    
+    def test_to_document(self):
+        """Testa conversão do processo com registros para o MongoDB"""
+        item = ProcessoItem(
+            numero_processo='0015648-78.1999.4.05.0000',
+            data_extracao=datetime(2025, 1, 2, 3, 4, 5),
+            movimentacoes=[Movimentacao(datetime(2025, 11, 11, 14, 30), 'Conclusos')],
+            envolvidos=[Envolvido('RELATOR', 'FULANO')]
+        )
+        
+        documento = to_document(item)
+        
+        self.assertEqual(documento['data_extracao'], '2025-01-02T03:04:05')
+        self.assertEqual(documento['movimentacoes'], [{'data': '2025-11-11T14:30:00', 'texto': 'Conclusos'}])
+        self.assertEqual(documento['envolvidos'], [{'papel': 'RELATOR', 'nome': 'FULANO'}])
+    
+    def test_feed_export_serializer(self):
+        """Testa que os exportadores recebem dicts"""
+        from scrapy.exporters import PythonItemExporter
+        
+        item = ProcessoItem(movimentacoes=[Movimentacao(texto='Conclusos')])
+        exportado = PythonItemExporter().export_item(item)
+        
+        self.assertEqual(exportado['movimentacoes'], [{'texto': 'Conclusos'}])
+        self.assertEqual(serialize_records(None), [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,203 @@
+"""
+Testes unitários para o launcher com shards
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from trf_scraper.items import ProcessoItem
+from trf_scraper.launcher import (
+    EXIT_BLOCKED,
+    EXIT_DEADLINE,
+    ShardCheckpoint,
+    ShardLauncher,
+    merge_stats,
+    read_lines,
+    shard_of,
+    split_input
+)
+
+
+class FakeProcess:
+    """Processo que termina na hora com o código definido pelo teste"""
+
+    def __init__(self, exitcodes, target, args, name):
+        self.exitcode = exitcodes.pop(0)
+        self.args = args
+        self.pid = 0
+
+    def start(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+    def is_alive(self):
+        return False
+
+
+class TestSharding(unittest.TestCase):
+    """Testa a divisão da entrada"""
+
+    def test_shard_is_stable_and_ignores_formatting(self):
+        """Testa que o shard depende só dos dígitos do número"""
+        self.assertEqual(
+            shard_of('0015648-78.1999.4.05.0000', 4),
+            shard_of('00156487819994050000', 4)
+        )
+
+    def test_split_balances_and_deduplicates(self):
+        """Testa distribuição equilibrada e sem repetições"""
+        processos = [f'{i:020d}' for i in range(1000)] + ['00000000000000000001']
+
+        divisao = split_input(processos, ['12.345.678/0001-90', '12345678000190'], 4)
+
+        tamanhos = [len(s['processos']) for s in divisao]
+        self.assertEqual(sum(tamanhos), 1000)
+        self.assertTrue(all(200 < t < 300 for t in tamanhos))
+        self.assertEqual(sum(len(s['cnpjs']) for s in divisao), 1)
+
+    def test_merge_stats(self):
+        """Testa soma de contadores e máximo de picos e percentis"""
+        combinado = merge_stats([
+            {'item_scraped_count': 10, 'latency/processo/total/p95': 2.0,
+             'mongodb/write_time_max': 0.5, 'finish_reason': 'finished', 'start_time': '2024-01-01T10'},
+            {'item_scraped_count': 5, 'latency/processo/total/p95': 3.0,
+             'mongodb/write_time_max': 0.2, 'finish_reason': 'shutdown', 'start_time': '2024-01-01T09'},
+        ])
+
+        self.assertEqual(combinado['item_scraped_count'], 15)
+        self.assertEqual(combinado['latency/processo/total/p95'], 3.0)
+        self.assertEqual(combinado['mongodb/write_time_max'], 0.5)
+        self.assertEqual(combinado['finish_reasons'], {'finished': 1, 'shutdown': 1})
+        self.assertEqual(combinado['start_time'], '2024-01-01T09')
+
+
+class TestShardCheckpoint(unittest.TestCase):
+    """Testa o registro de processos concluídos"""
+
+    def test_marks_numero_and_busca(self):
+        """Testa que número extraído e número buscado são anotados"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'shard_0.done')
+            ext = ShardCheckpoint(path)
+            response = Mock()
+            response.meta = {'numero_busca': '00156487819994050000'}
+
+            ext.item_scraped({'numero_processo': '0015648-78.1999.4.05.0000'}, response, Mock())
+            ext.spider_closed(Mock())
+
+            self.assertEqual(read_lines(path), ['00156487819994050000'])
+
+    def test_marks_only_stored_items(self):
+        """Testa que item com falha na gravação não é anotado como concluído"""
+        from trf_scraper.pipelines import _mark_stored
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'shard_0.done')
+            ext = ShardCheckpoint(path, require_stored=True)
+            response = Mock()
+            response.meta = {}
+            falhou = ProcessoItem(numero_processo='00156487819994050000')
+            gravado = ProcessoItem(numero_processo='00156487819994050001')
+            _mark_stored(gravado)
+
+            ext.item_scraped(falhou, response, Mock())
+            ext.item_scraped(gravado, response, Mock())
+            ext.spider_closed(Mock())
+
+            self.assertEqual(read_lines(path), ['00156487819994050001'])
+
+
+class TestShardLauncher(unittest.TestCase):
+    """Testa execução e reinício dos shards"""
+
+    def setUp(self):
+        """Cria o launcher com processos falsos"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.exitcodes = []
+        context = Mock()
+        context.Process = lambda target, args, name: FakeProcess(self.exitcodes, target, args, name)
+        self.launcher = ShardLauncher(1, self.tmpdir.name, max_restarts=2, context=context, poll_interval=0)
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_restart_resumes_from_checkpoint(self):
+        """Testa que o shard reinicia apenas com os processos pendentes"""
+        shards = self.launcher.prepare(['00000000000000000001', '00000000000000000002'], [])
+        with open(self._path('shard_0.done'), 'w') as f:
+            f.write('00000000000000000001\n')
+        self.exitcodes[:] = [1, 0]
+
+        stats = self.launcher.run(shards)
+
+        self.assertEqual(read_lines(self._path('shard_0.processos')), ['00000000000000000002'])
+        self.assertEqual(stats['restarts'], 1)
+        self.assertEqual(stats['shards_failed'], [])
+
+    def test_gives_up_after_max_restarts(self):
+        """Testa que o shard é marcado como falho depois de max_restarts"""
+        shards = self.launcher.prepare(['00000000000000000001'], ['12345678000190'])
+        self.exitcodes[:] = [1, 1, 1]
+
+        stats = self.launcher.run(shards)
+
+        self.assertEqual(stats['shards_failed'], [0])
+        self.assertEqual(self.launcher.attempts[0], 3)
+
+    def test_blocked_shard_is_not_restarted(self):
+        """Testa que shard encerrado por captcha não é reiniciado, mas tem a entrada aparada"""
+        shards = self.launcher.prepare(['00000000000000000001', '00000000000000000002'], [])
+        with open(self._path('shard_0.done'), 'w') as f:
+            f.write('00000000000000000001\n')
+        self.exitcodes[:] = [EXIT_BLOCKED]
+
+        stats = self.launcher.run(shards)
+
+        self.assertEqual(self.launcher.attempts[0], 1)
+        self.assertEqual(stats['shards_failed'], [0])
+        self.assertEqual(read_lines(self._path('shard_0.processos')), ['00000000000000000002'])
+
+    def test_deadline_is_a_clean_exit(self):
+        """Testa que shard encerrado no prazo não é reiniciado nem conta como falha"""
+        shards = self.launcher.prepare(['00000000000000000001', '00000000000000000002'], [])
+        self.exitcodes[:] = [EXIT_DEADLINE]
+
+        stats = self.launcher.run(shards)
+
+        self.assertEqual(self.launcher.attempts[0], 1)
+        self.assertEqual(stats['restarts'], 0)
+        self.assertEqual(stats['shards_failed'], [])
+
+    def test_nothing_pending_is_not_restarted(self):
+        """Testa que shard sem pendências não é reiniciado"""
+        shards = self.launcher.prepare(['00000000000000000001'], [])
+        with open(self._path('shard_0.done'), 'w') as f:
+            f.write('00000000000000000001\n')
+        self.exitcodes[:] = [3]
+
+        stats = self.launcher.run(shards)
+
+        self.assertEqual(stats['restarts'], 0)
+        self.assertEqual(stats['shards_failed'], [])
+
+    def test_combined_stats_from_all_attempts(self):
+        """Testa que as estatísticas de todas as tentativas são somadas"""
+        self.launcher.attempts = {0: 2}
+        for attempt, itens in ((1, 4), (2, 6)):
+            with open(self._path(f'shard_0.stats_{attempt}.json'), 'w') as f:
+                json.dump({'item_scraped_count': itens}, f)
+
+        stats = self.launcher.combined_stats()
+
+        self.assertEqual(stats['item_scraped_count'], 10)
+        with open(self._path('stats.json')) as f:
+            self.assertEqual(json.load(f)['restarts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
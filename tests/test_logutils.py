@@ -0,0 +1,126 @@
+"""
+Testes unitários para o logging com fila e amostragem
+"""
+import io
+import json
+import logging
+import unittest
+from unittest.mock import Mock
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.logutils import JsonFormatter, LazyQueueHandler, QueueLogging, SamplingFilter
+
+
+def make_record(msg, *args, level=logging.INFO, name='processo'):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestSamplingFilter(unittest.TestCase):
+    """Testa a amostragem por tipo de mensagem"""
+
+    def setUp(self):
+        """Cria o filtro com relógio controlado"""
+        self.now = 100.0
+        self.stats = Mock()
+        self.filter = SamplingFilter(rate=2, stats=self.stats, clock=lambda: self.now)
+
+    def test_limits_per_message_type(self):
+        """Testa que cada template tem sua própria cota por segundo"""
+        passed = [self.filter.filter(make_record("Processo inserido: %s", i)) for i in range(5)]
+        outro = self.filter.filter(make_record("Processo atualizado: %s", 1))
+
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(outro)
+        self.stats.inc_value.assert_called_with('log_sampled/processo')
+
+    def test_quota_resets_every_second(self):
+        """Testa que a cota volta na janela seguinte"""
+        for i in range(3):
+            self.filter.filter(make_record("msg %s", i))
+
+        self.now = 101.0
+
+        self.assertTrue(self.filter.filter(make_record("msg %s", 9)))
+
+    def test_formatted_messages_share_template(self):
+        """Testa que mensagens já formatadas que só mudam nos números dividem a cota"""
+        passed = [self.filter.filter(make_record(f"Processo {i:020d} inserido")) for i in range(4)]
+
+        self.assertEqual(passed, [True, True, False, False])
+        self.assertEqual(len(self.filter.counts), 1)
+
+    def test_old_windows_are_dropped(self):
+        """Testa que as contagens de segundos anteriores não ficam em memória"""
+        self.filter.filter(make_record("msg a"))
+        self.filter.filter(make_record("msg b"))
+
+        self.now = 101.0
+        self.filter.filter(make_record("msg c"))
+
+        self.assertEqual(list(self.filter.counts), [('processo', logging.INFO, 'msg c')])
+
+    def test_errors_never_sampled(self):
+        """Testa que erros sempre passam"""
+        records = [make_record("falha %s", i, level=logging.ERROR) for i in range(10)]
+
+        self.assertTrue(all(self.filter.filter(r) for r in records))
+
+
+class TestJsonFormatter(unittest.TestCase):
+    """Testa a saída em JSON"""
+
+    def test_format_record(self):
+        """Testa campos básicos e mensagem formatada"""
+        record = make_record("Processo %s", '0015648-78.1999.4.05.0000')
+        record.spider = Mock()
+        record.spider.name = 'processo'
+
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data['message'], 'Processo 0015648-78.1999.4.05.0000')
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual(data['spider'], 'processo')
+
+
+class TestQueueLogging(unittest.TestCase):
+    """Testa a troca dos handlers pela fila durante o crawl"""
+
+    def setUp(self):
+        """Cria um logger raiz isolado com um handler de arquivo em memória"""
+        self.root = logging.getLogger('test_queue_logging')
+        self.root.propagate = False
+        self.root.setLevel(logging.DEBUG)
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.root.addHandler(self.handler)
+        self.addCleanup(self.root.removeHandler, self.handler)
+
+    def test_disabled_raises_not_configured(self):
+        """Testa que a extensão pode ser desligada"""
+        crawler = get_crawler(settings_dict={'LOG_QUEUE_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            QueueLogging.from_crawler(crawler)
+
+    def test_install_and_uninstall(self):
+        """Testa que os registros passam pela fila e nada se perde no fechamento"""
+        ext = QueueLogging(Mock(), sampling_rate=0, json_format=True)
+
+        ext.install(self.root)
+        self.assertNotIn(self.handler, self.root.handlers)
+        for i in range(50):
+            self.root.info("Processo %d", i)
+        ext.uninstall(self.root)
+
+        linhas = self.stream.getvalue().splitlines()
+        self.assertEqual(len(linhas), 50)
+        self.assertEqual(json.loads(linhas[-1])['message'], 'Processo 49')
+        self.assertIn(self.handler, self.root.handlers)
+        self.assertFalse(any(isinstance(h, LazyQueueHandler) for h in self.root.handlers))
+        self.assertNotIsInstance(self.handler.formatter, JsonFormatter)
+
+
+if __name__ == '__main__':
+    unittest.main()
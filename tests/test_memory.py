@@ -0,0 +1,111 @@
+"""
+Testes unitários para o diagnóstico de memória
+"""
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import Mock
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.items import Envolvido, Movimentacao, ProcessoItem
+from trf_scraper.memory import MemoryDiagnostics, current_rss, live_counts
+
+
+class TestMemoryHelpers(unittest.TestCase):
+    """Testa RSS e contagem de objetos vivos"""
+
+    def test_current_rss_positive(self):
+        """Testa leitura do RSS do processo"""
+        self.assertGreater(current_rss(), 0)
+
+    def test_live_counts(self):
+        """Testa contagem de itens, registros e respostas vivos"""
+        antes = live_counts()
+        item = ProcessoItem()
+        movimentacao = Movimentacao('01/01/2015', 'Conclusos')
+        envolvido = Envolvido('APTE', 'FULANO')
+        response = HtmlResponse(url='http://example.com', body=b'')
+
+        depois = live_counts()
+
+        self.assertEqual(depois['ProcessoItem'], antes['ProcessoItem'] + 1)
+        self.assertEqual(depois['Movimentacao'], antes['Movimentacao'] + 1)
+        self.assertEqual(depois['Envolvido'], antes['Envolvido'] + 1)
+        self.assertEqual(depois['Response'], antes['Response'] + 1)
+        del item, movimentacao, envolvido, response
+
+
+class TestMemoryDiagnostics(unittest.TestCase):
+    """Testa amostras, relatório e limite de RSS"""
+
+    def setUp(self):
+        """Cria a extensão com diretório temporário"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.crawler = Mock()
+        self.crawler.stats = MemoryStatsCollector(Mock())
+        self.spider = Mock()
+        self.spider.name = 'processo'
+        self.ext = MemoryDiagnostics(self.crawler, top=5, output_dir=self.tmpdir.name)
+        self.addCleanup(lambda: tracemalloc.is_tracing() and self.ext.started_tracing and tracemalloc.stop())
+
+    def _open(self):
+        tracemalloc.start()
+        self.ext.started_tracing = True
+        self.ext.baseline = self.ext.previous = self.ext._snapshot()
+
+    def test_disabled_by_default(self):
+        """Testa que a extensão não é carregada sem MEMDIAG_ENABLED"""
+        crawler = get_crawler(settings_dict={'MEMDIAG_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            MemoryDiagnostics.from_crawler(crawler)
+
+    def test_check_records_growth(self):
+        """Testa que a amostra aponta o crescimento de memória"""
+        self._open()
+        retido = [bytearray(1024) for _ in range(500)]
+
+        self.ext.check(self.spider)
+
+        sample = self.ext.samples[0]
+        self.assertTrue(sample['top_growth'])
+        self.assertIn('ProcessoItem', sample['live'])
+        self.assertGreater(self.crawler.stats.get_value('memdiag/rss_mb'), 0)
+        del retido
+
+    def test_rss_limit_closes_spider(self):
+        """Testa encerramento ordenado quando o RSS passa do limite"""
+        self._open()
+        self.ext.rss_limit = 1
+
+        self.ext.check(self.spider)
+        self.ext.check(self.spider)
+
+        self.crawler.engine.close_spider.assert_called_once_with(self.spider, 'memory_limit')
+
+    def test_report_written_on_close(self):
+        """Testa o relatório JSON no fechamento do spider"""
+        self._open()
+        self.ext.check(self.spider)
+
+        self.ext.spider_closed(self.spider, 'finished')
+
+        arquivos = os.listdir(self.tmpdir.name)
+        self.assertEqual(len(arquivos), 1)
+        with open(os.path.join(self.tmpdir.name, arquivos[0]), encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['reason'], 'finished')
+        self.assertEqual(len(report['samples']), 1)
+        self.assertIn('growth_since_start', report)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
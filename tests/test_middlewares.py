@@ -5,16 +5,34 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch
 from scrapy.http import HtmlResponse, Request
 from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, NotConfigured
+from scrapy.settings import Settings
+from twisted.internet.task import Clock
+import json
+import tempfile
 import time
 
 from trf_scraper.middlewares import (
     ResponseTimeMiddleware,
     CustomUserAgentMiddleware,
     ErrorLoggingMiddleware,
-    CaptchaDetectionMiddleware
+    CaptchaDetectionMiddleware,
+    AdaptiveConcurrencyMiddleware,
+    BackoffRetryMiddleware,
+    parse_retry_after,
+    percentile
 )
 
 
+def configured_downloader_middlewares():
+    """Middlewares de download na ordem das settings do projeto (process_request)."""
+    from scrapy.utils.conf import build_component_list
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    return build_component_list(settings.getwithbase('DOWNLOADER_MIDDLEWARES'))
+
+
 class TestResponseTimeMiddleware(unittest.TestCase):
     """Testa o middleware de tempo de resposta"""
     
@@ -77,6 +95,55 @@ class TestResponseTimeMiddleware(unittest.TestCase):
         
         self.assertEqual(result, response)
         self.spider.logger.debug.assert_not_called()
+    
+    def test_histograms_split_by_endpoint_and_phase(self):
+        """Testa separação entre tempo no servidor e tempo na fila"""
+        stats = Mock()
+        middleware = ResponseTimeMiddleware(stats=stats)
+        request = Request(
+            'https://cp.trf5.jus.br/processo/00156487819994050000',
+            meta={'start_time': time.time() - 3, 'download_latency': 1.0}
+        )
+        response = HtmlResponse(url=request.url, body=b'<html></html>', status=200)
+        
+        middleware.process_response(request, response, self.spider)
+        
+        summary = middleware.summary()
+        self.assertEqual(summary['processo/total']['count'], 1)
+        self.assertAlmostEqual(summary['processo/server']['p50'], 1.0, delta=0.1)
+        self.assertAlmostEqual(summary['processo/queue']['p50'], 2.0, delta=0.2)
+        stats.inc_value.assert_called_with('latency/processo/status/200')
+    
+    def test_publish_percentiles_to_stats(self):
+        """Testa publicação de p50/p95/p99 nas estatísticas"""
+        stats = Mock()
+        middleware = ResponseTimeMiddleware(stats=stats)
+        request = Request('https://cp.trf5.jus.br/cp/', meta={'start_time': time.time() - 1})
+        response = HtmlResponse(url=request.url, body=b'<html></html>')
+        middleware.process_response(request, response, self.spider)
+        
+        middleware.publish()
+        
+        published = {c.args[0] for c in stats.set_value.call_args_list}
+        self.assertIn('latency/cnpj_form/total/p95', published)
+        self.assertIn('latency/cnpj_form/total/p99', published)
+
+    def test_start_time_is_consumed(self):
+        """Testa que o start_time não é reaproveitado por um retry do cache"""
+        request = Request('http://example.com', meta={'start_time': time.time() - 1})
+        response = HtmlResponse(url='http://example.com', request=request, body=b'<html></html>')
+
+        self.middleware.process_response(request, response, self.spider)
+
+        self.assertNotIn('start_time', request.meta)
+        self.assertIn('response_time', request.meta)
+
+    def test_measured_after_rate_limit(self):
+        """Testa que a medição começa depois da espera do rate limit"""
+        ordem = configured_downloader_middlewares()
+        posicao = ordem.index('trf_scraper.middlewares.ResponseTimeMiddleware')
+
+        self.assertGreater(posicao, ordem.index('trf_scraper.middlewares.RateLimitMiddleware'))
 
 
 class TestCustomUserAgentMiddleware(unittest.TestCase):
@@ -148,19 +215,69 @@ class TestErrorLoggingMiddleware(unittest.TestCase):
         self.assertIn('exception', failed_url)
         self.assertIn('timestamp', failed_url)
     
-    @patch('os.makedirs')
-    @patch('builtins.open', new_callable=MagicMock)
-    def test_spider_closed_saves_failed_urls(self, mock_open, mock_makedirs):
-        """Testa salvamento de URLs falhadas"""
-        request = Request('http://example.com')
-        exception = Exception("Test error")
-        self.middleware.process_exception(request, exception, self.spider)
+    def test_process_exception_entry_fields(self):
+        """Testa número do processo, classe da exceção e tentativa na entrada"""
+        request = Request(
+            'https://cp.trf5.jus.br/processo/00156487819994050000',
+            meta={'numero_busca': '0015648-78.1999.4.05.0000', 'retry_times': 3}
+        )
         
-        self.middleware.spider_closed(self.spider)
+        self.middleware.process_exception(request, TimeoutError("timeout"), self.spider)
         
-        mock_makedirs.assert_called_once_with('logs', exist_ok=True)
-        mock_open.assert_called_once()
-        self.spider.logger.warning.assert_called()
+        entry = self.middleware.failed_urls[0]
+        self.assertEqual(entry['numero_processo'], '0015648-78.1999.4.05.0000')
+        self.assertEqual(entry['exception'], 'TimeoutError')
+        self.assertEqual(entry['attempt'], 4)
+    
+    def test_failed_urls_is_bounded(self):
+        """Testa que a memória guarda só as falhas mais recentes"""
+        middleware = ErrorLoggingMiddleware(recent_size=5)
+        
+        for i in range(20):
+            middleware.process_exception(Request(f'http://example.com/{i}'), Exception("x"), self.spider)
+        
+        self.assertEqual(len(middleware.failed_urls), 5)
+        self.assertEqual(middleware.failed_urls[0]['url'], 'http://example.com/15')
+    
+    def test_process_response_journals_final_server_error(self):
+        """Testa que 429/5xx que chegam ao middleware são registrados"""
+        request = Request('https://cp.trf5.jus.br/processo/00156487819994050000')
+        error = HtmlResponse(url=request.url, request=request, status=503, body=b'')
+        ok = HtmlResponse(url=request.url, request=request, status=200, body=b'')
+        
+        self.assertIs(self.middleware.process_response(request, ok, self.spider), ok)
+        self.assertIs(self.middleware.process_response(request, error, self.spider), error)
+        
+        self.assertEqual(len(self.middleware.failed_urls), 1)
+        self.assertEqual(self.middleware.failed_urls[0]['status'], 503)
+        self.assertEqual(self.middleware.failed_urls[0]['numero_processo'], '00156487819994050000')
+    
+    def test_deferred_retry_is_not_journaled(self):
+        """Testa que falhas adiadas para o fim do crawl não são registradas"""
+        request = Request('http://example.com', meta={'retry_deferred': True})
+        response = HtmlResponse(url=request.url, request=request, status=503, body=b'')
+        
+        self.middleware.process_response(request, response, self.spider)
+        self.middleware.process_exception(request, Exception("x"), self.spider)
+        
+        self.assertEqual(len(self.middleware.failed_urls), 0)
+    
+    def test_journal_written_as_failures_happen(self):
+        """Testa que cada falha é gravada no JSONL antes do fechamento do spider"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            middleware = ErrorLoggingMiddleware(journal_dir=tmpdir)
+            request = Request('https://cp.trf5.jus.br/processo/00156487819994050000')
+            
+            middleware.process_exception(request, Exception("Test error"), self.spider)
+            middleware.process_exception(request, Exception("Test error"), self.spider)
+            
+            with open(middleware.journal.path, encoding='utf-8') as f:
+                linhas = [json.loads(line) for line in f]
+            self.assertEqual(len(linhas), 2)
+            self.assertEqual(linhas[0]['exception'], 'Exception')
+            
+            middleware.spider_closed(self.spider)
+            self.spider.logger.warning.assert_called()
     
     @patch('os.makedirs')
     def test_spider_closed_no_failed_urls(self, mock_makedirs):
@@ -174,10 +291,12 @@ class TestErrorLoggingMiddleware(unittest.TestCase):
         """Testa criação do middleware a partir do crawler"""
         crawler = Mock()
         crawler.signals = Mock()
+        crawler.settings = Settings({'FAILED_RECENT_SIZE': 10})
         
         middleware = ErrorLoggingMiddleware.from_crawler(crawler)
         
         self.assertIsInstance(middleware, ErrorLoggingMiddleware)
+        self.assertEqual(middleware.failed_urls.maxlen, 10)
         crawler.signals.connect.assert_called_once()
 
 
@@ -248,5 +367,409 @@ class TestCaptchaDetectionMiddleware(unittest.TestCase):
         self.spider.crawler.engine.close_spider.assert_called()
 
 
+class TestCaptchaCircuitBreaker(unittest.TestCase):
+    """Testa o circuit breaker de CAPTCHA"""
+    
+    def setUp(self):
+        """Configura o middleware com reactor e engine mock"""
+        self.reactor = Mock()
+        self.middleware = CaptchaDetectionMiddleware(
+            max_trips=2,
+            cooldown=10,
+            reactor=self.reactor
+        )
+        self.slot = Mock()
+        self.slot.concurrency = 8
+        self.spider = Mock()
+        self.spider.crawler.engine.downloader.slots = {'cp.trf5.jus.br': self.slot}
+        # Sem AdaptiveConcurrencyMiddleware: ninguém trata o sinal
+        self.spider.crawler.signals.send_catch_log.return_value = []
+        self.request = Request('https://cp.trf5.jus.br/processo/1')
+    
+    def _captcha(self):
+        response = HtmlResponse(url=self.request.url, body=b'<html>captcha</html>')
+        return self.middleware.process_response(self.request, response, self.spider)
+    
+    def _normal(self):
+        response = HtmlResponse(url=self.request.url, body=b'<html>ok</html>')
+        return self.middleware.process_response(self.request, response, self.spider)
+    
+    def test_pauses_and_requeues(self):
+        """Testa que o engine é pausado e a requisição volta para a fila"""
+        result = self._captcha()
+        
+        self.assertIsInstance(result, Request)
+        self.assertTrue(result.dont_filter)
+        self.spider.crawler.engine.pause.assert_called_once()
+        self.spider.crawler.engine.close_spider.assert_not_called()
+        self.reactor.callLater.assert_called_once()
+        self.assertEqual(self.reactor.callLater.call_args.args[0], 10)
+    
+    def test_cooldown_is_exponential(self):
+        """Testa que o cooldown dobra em bloqueios seguidos"""
+        self._captcha()
+        self.middleware._half_open(self.spider)
+        self._captcha()
+        
+        self.assertEqual(self.reactor.callLater.call_args.args[0], 20)
+    
+    def test_half_open_probe_then_resume(self):
+        """Testa retomada com concorrência reduzida após resposta normal"""
+        self._captcha()
+        self.middleware._half_open(self.spider)
+        
+        self.assertEqual(self.slot.concurrency, 1)
+        self.spider.crawler.engine.unpause.assert_called_once()
+        
+        self._normal()
+        
+        self.assertEqual(self.middleware.state, CaptchaDetectionMiddleware.CLOSED)
+        self.assertEqual(self.slot.concurrency, 4)
+    
+    def test_second_trip_keeps_original_concurrency(self):
+        """Testa que a concorrência salva é a de antes da primeira pausa"""
+        self._captcha()
+        self.middleware._half_open(self.spider)
+        self._captcha()
+        self.middleware._half_open(self.spider)
+        self._normal()
+        
+        self.assertEqual(self.slot.concurrency, 4)
+    
+    def test_closes_spider_when_budget_exhausted(self):
+        """Testa que o spider fecha depois do orçamento de pausas"""
+        for _ in range(3):
+            self._captcha()
+            self.middleware._half_open(self.spider)
+        
+        self.spider.crawler.engine.close_spider.assert_called_once_with(
+            self.spider,
+            'captcha_detected'
+        )
+
+
+class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
+    """Testa o controle AIMD de concorrência"""
+    
+    def setUp(self):
+        """Configura o middleware com um slot de download mock"""
+        self.slot = Mock()
+        self.crawler = Mock()
+        self.crawler.settings = Settings({
+            'ADAPTIVE_CONCURRENCY_ENABLED': True,
+            'ADAPTIVE_CONCURRENCY_START': 4,
+            'ADAPTIVE_CONCURRENCY_MIN': 1,
+            'ADAPTIVE_CONCURRENCY_MAX': 6,
+            'ADAPTIVE_CONCURRENCY_TARGET_LATENCY': 2.0,
+            'ADAPTIVE_CONCURRENCY_WINDOW': 5,
+            'ADAPTIVE_CONCURRENCY_COOLDOWN': 0,
+            'DOWNLOAD_DELAY': 1,
+            'CONCURRENT_REQUESTS': 8,
+        })
+        self.crawler.engine.downloader.slots = {'cp.trf5.jus.br': self.slot}
+        self.middleware = AdaptiveConcurrencyMiddleware.from_crawler(self.crawler)
+        self.spider = Mock()
+    
+    def _respond(self, latency, status=200, body=b'<html>ok</html>'):
+        request = Request(
+            'https://cp.trf5.jus.br/processo/1',
+            meta={'download_slot': 'cp.trf5.jus.br', 'response_time': latency}
+        )
+        response = HtmlResponse(url=request.url, status=status, body=body)
+        return self.middleware.process_response(request, response, self.spider)
+    
+    def test_disabled_raises_not_configured(self):
+        """Testa que o middleware pode ser desligado"""
+        self.crawler.settings = Settings({'ADAPTIVE_CONCURRENCY_ENABLED': False})
+        
+        with self.assertRaises(NotConfigured):
+            AdaptiveConcurrencyMiddleware.from_crawler(self.crawler)
+    
+    def test_percentile(self):
+        """Testa cálculo de percentil"""
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertIsNone(percentile([], 95))
+    
+    def test_grows_when_latency_is_low(self):
+        """Testa aumento aditivo com latência abaixo do alvo"""
+        for _ in range(5):
+            self._respond(0.5)
+        
+        self.assertEqual(self.slot.concurrency, 5)
+    
+    def test_respects_max_concurrency(self):
+        """Testa que a concorrência não passa do máximo"""
+        for _ in range(50):
+            self._respond(0.5)
+        
+        self.assertEqual(self.slot.concurrency, 6)
+    
+    def test_shrinks_when_latency_is_high(self):
+        """Testa redução com p95 acima do alvo"""
+        for _ in range(5):
+            self._respond(5.0)
+        
+        self.assertEqual(self.slot.concurrency, 3)
+    
+    def test_cuts_on_429(self):
+        """Testa corte multiplicativo em 429"""
+        self._respond(0.5, status=429)
+        
+        self.assertEqual(self.slot.concurrency, 2)
+        self.assertEqual(self.slot.delay, 2)
+        self.crawler.stats.inc_value.assert_any_call(
+            'adaptive_concurrency/cp.trf5.jus.br/backoffs'
+        )
+    
+    def test_one_cut_per_cooldown(self):
+        """Testa que a rajada de 429 dentro do cooldown corta uma vez só"""
+        self.middleware.cooldown = 60
+        
+        for _ in range(3):
+            self._respond(0.5, status=429)
+        
+        self.assertEqual(self.slot.concurrency, 2)
+        self.assertEqual(self.slot.delay, 2)
+        self.crawler.stats.inc_value.assert_any_call(
+            'adaptive_concurrency/cp.trf5.jus.br/backoffs_skipped'
+        )
+        
+        self.middleware.controls['cp.trf5.jus.br'].cooldown_until = 0
+        self._respond(0.5, status=429)
+        self.assertEqual(self.slot.concurrency, 1)
+    
+    def test_cuts_on_captcha(self):
+        """Testa corte quando a página é de CAPTCHA"""
+        self._respond(0.5, body=b'<html>captcha</html>')
+        
+        self.assertEqual(self.slot.concurrency, 2)
+    
+    def test_speed_up_for_deadline(self):
+        """Testa aumento pedido pelo prazo, respeitando cooldown e máximo"""
+        self._respond(0.5)
+        
+        self.middleware.speed_up(self.spider)
+        self.assertEqual(self.slot.concurrency, 5)
+        
+        self._respond(0.5, status=429)
+        self.middleware.cooldown = 60
+        self.middleware.controls['cp.trf5.jus.br'].cooldown_until = float('inf')
+        self.middleware.speed_up(self.spider)
+        self.assertEqual(self.slot.concurrency, 2)
+    
+    def test_circuit_breaker_probe_and_resume_go_through_aimd(self):
+        """Testa que a sonda em 1 e a retomada reduzida resistem às decisões do AIMD"""
+        breaker = CaptchaDetectionMiddleware(max_trips=3, cooldown=10, reactor=Mock())
+        spider = Mock()
+        spider.crawler.engine.downloader.slots = self.crawler.engine.downloader.slots
+        spider.crawler.signals.send_catch_log.side_effect = (
+            lambda signal, **kwargs: [(None, self.middleware.circuit_concurrency(**kwargs))]
+        )
+        for _ in range(5):
+            self._respond(0.5)
+        self.assertEqual(self.slot.concurrency, 5)
+        request = Request('https://cp.trf5.jus.br/processo/1')
+        
+        breaker.process_response(request, HtmlResponse(url=request.url, body=b'captcha'), spider)
+        breaker._half_open(spider)
+        for _ in range(5):
+            self._respond(0.5)
+        self.assertEqual(self.slot.concurrency, 1)
+        
+        breaker.process_response(request, HtmlResponse(url=request.url, body=b'ok'), spider)
+        self._respond(0.5)
+        self.assertEqual(self.slot.concurrency, 2)
+    
+    def test_ignores_requests_without_slot(self):
+        """Testa respostas do cache (sem slot de download)"""
+        request = Request('https://cp.trf5.jus.br/processo/1')
+        response = HtmlResponse(url=request.url, body=b'')
+        
+        result = self.middleware.process_response(request, response, self.spider)
+        
+        self.assertIs(result, response)
+        self.assertEqual(self.middleware.controls, {})
+
+    def _configured_chain(self):
+        """AIMD e retry na ordem configurada em process_response (maior número antes)."""
+        from scrapy import Spider
+        from scrapy.utils.test import get_crawler
+
+        crawler = get_crawler(Spider, {'RETRY_TIMES': 2, 'RETRY_HTTP_CODES': [429, 503]})
+        self.retry = BackoffRetryMiddleware.from_crawler(crawler)
+        self.retry.reactor = Clock()
+        instancias = {
+            'trf_scraper.middlewares.AdaptiveConcurrencyMiddleware': self.middleware,
+            'trf_scraper.middlewares.BackoffRetryMiddleware': self.retry,
+        }
+        ordem = [path for path in configured_downloader_middlewares() if path in instancias]
+        return [instancias[path] for path in reversed(ordem)]
+
+    def test_sees_429_before_retry(self):
+        """Testa, na ordem configurada, que o AIMD corta antes de o retry consumir o 429"""
+        request = Request(
+            'https://cp.trf5.jus.br/processo/1',
+            meta={'download_slot': 'cp.trf5.jus.br', 'response_time': 0.5}
+        )
+        response = HtmlResponse(url=request.url, status=429, body=b'')
+
+        result = response
+        for mw in self._configured_chain():
+            result = mw.process_response(request, result, self.spider)
+
+        self.assertEqual(len(self.retry.waiting), 1)
+        self.assertEqual(self.slot.concurrency, 2)
+
+    def test_sees_exceptions_before_retry(self):
+        """Testa, na ordem configurada, que exceções entram na taxa de erro do AIMD"""
+        from twisted.internet.error import TimeoutError
+
+        request = Request('https://cp.trf5.jus.br/processo/1', meta={'download_slot': 'cp.trf5.jus.br'})
+        for mw in self._configured_chain():
+            self.assertIsNone(mw.process_exception(request, TimeoutError(), self.spider))
+
+        self.assertEqual(len(self.retry.waiting), 1)
+        self.assertEqual(list(self.middleware.controls['cp.trf5.jus.br'].errors), [True])
+
+
+class TestBackoffRetryMiddleware(unittest.TestCase):
+    """Testa o retry com backoff, Retry-After, orçamento e fila adiada"""
+    
+    def setUp(self):
+        """Configura o middleware com um crawler de teste"""
+        from scrapy import Spider
+        from scrapy.utils.test import get_crawler
+        
+        self.crawler = get_crawler(Spider, {
+            'RETRY_TIMES': 2,
+            'RETRY_HTTP_CODES': [429, 503],
+            'RETRY_BACKOFF_BASE': 2,
+            'RETRY_BACKOFF_MAX': 60,
+            'RETRY_BUDGET_PER_HOST': 0,
+        })
+        self.spider = Spider.from_crawler(self.crawler, name='test_spider')
+        self.crawler.engine = Mock()
+        self.middleware = BackoffRetryMiddleware.from_crawler(self.crawler)
+        self.middleware.reactor = Clock()
+        self.request = Request('https://cp.trf5.jus.br/processo/00156487819994050000')
+    
+    def _response(self, status, headers=None):
+        return HtmlResponse(
+            url=self.request.url,
+            request=self.request,
+            status=status,
+            headers=headers or {},
+            body=b''
+        )
+    
+    def test_backoff_grows_with_jitter(self):
+        """Testa backoff exponencial com jitter entre metade e o total"""
+        for attempt, limite in ((1, 2), (2, 4), (3, 8), (10, 60)):
+            with self.subTest(attempt=attempt):
+                delay = self.middleware.backoff(attempt)
+                self.assertGreaterEqual(delay, limite / 2)
+                self.assertLessEqual(delay, limite)
+    
+    def _released(self):
+        return [c.args[0] for c in self.crawler.engine.crawl.call_args_list]
+    
+    def test_retry_waits_outside_the_downloader(self):
+        """Testa que o retry espera no reactor e só depois volta ao engine"""
+        response = self._response(503)
+        result = self.middleware.process_response(self.request, response, self.spider)
+        
+        self.assertIs(result, response)
+        self.assertTrue(self.request.meta['retry_deferred'])
+        self.assertEqual(len(self.middleware.waiting), 1)
+        self.crawler.engine.crawl.assert_not_called()
+        
+        self.middleware.reactor.advance(60)
+        
+        self.assertEqual([r.meta['retry_times'] for r in self._released()], [1])
+        self.assertEqual(self.middleware.waiting, {})
+        self.assertEqual(self.crawler.stats.get_value('retry/count'), 1)
+    
+    def test_no_wait_in_process_request(self):
+        """Testa que o middleware não segura requisições no downloader"""
+        self.assertFalse(hasattr(BackoffRetryMiddleware, 'process_request'))
+    
+    def test_retry_after_is_honoured(self):
+        """Testa que Retry-After maior que o backoff é respeitado"""
+        response = self._response(429, headers={'Retry-After': '120'})
+        
+        self.middleware.process_response(self.request, response, self.spider)
+        self.middleware.reactor.advance(119)
+        self.crawler.engine.crawl.assert_not_called()
+        self.middleware.reactor.advance(1)
+        
+        self.assertEqual(len(self._released()), 1)
+        self.assertEqual(self.crawler.stats.get_value('retry/retry_after'), 1)
+    
+    def test_parse_retry_after_http_date(self):
+        """Testa Retry-After em segundos e como data HTTP"""
+        self.assertEqual(parse_retry_after(b'30'), 30.0)
+        self.assertAlmostEqual(
+            parse_retry_after('Thu, 01 Jan 2099 00:01:00 GMT', now=4070908800),
+            60,
+            delta=1
+        )
+        self.assertIsNone(parse_retry_after('invalido'))
+    
+    def test_exhausted_request_is_deferred_once(self):
+        """Testa que retries esgotados vão para a fila adiada uma única vez"""
+        self.request.meta['retry_times'] = 2
+        response = self._response(503)
+        
+        result = self.middleware.process_response(self.request, response, self.spider)
+        
+        self.assertIs(result, response)
+        self.assertTrue(self.request.meta['retry_deferred'])
+        self.assertEqual(len(self.middleware.deferred), 1)
+        deferred = self.middleware.deferred[0]
+        self.assertEqual(deferred.meta['retry_times'], 0)
+        
+        deferred.meta['retry_times'] = 2
+        self.middleware.process_response(deferred, response, self.spider)
+        self.assertEqual(len(self.middleware.deferred), 1)
+    
+    def test_host_budget(self):
+        """Testa que o orçamento do host limita os retries"""
+        self.middleware.budget = 1
+        
+        self.middleware.process_response(self.request, self._response(503), self.spider)
+        self.middleware.reactor.advance(60)
+        first = self._released()[0]
+        self.middleware.process_response(first, self._response(503), self.spider)
+        
+        self.assertEqual(len(self.middleware.waiting), 0)
+        self.assertEqual(len(self.middleware.deferred), 1)
+        self.assertEqual(
+            self.crawler.stats.get_value('retry/budget_exhausted/cp.trf5.jus.br'), 1
+        )
+    
+    def test_spider_idle_reschedules_deferred(self):
+        """Testa que a fila adiada volta ao engine quando o spider fica ocioso"""
+        self.middleware.deferred = [self.request]
+        
+        with self.assertRaises(DontCloseSpider):
+            self.middleware.spider_idle(self.spider)
+        self.crawler.engine.crawl.assert_not_called()
+        
+        self.middleware.reactor.advance(120)
+        
+        self.crawler.engine.crawl.assert_called_once_with(self.request)
+        self.middleware.spider_idle(self.spider)
+    
+    def test_spider_closed_cancels_waiting(self):
+        """Testa que tentativas ainda esperando são canceladas no fechamento"""
+        self.middleware.process_response(self.request, self._response(503), self.spider)
+        
+        self.middleware.spider_closed(self.spider)
+        self.middleware.reactor.advance(60)
+        
+        self.crawler.engine.crawl.assert_not_called()
+        self.assertEqual(self.middleware.reactor.getDelayedCalls(), [])
+
+
 if __name__ == '__main__':
     unittest.main()
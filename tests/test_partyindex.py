@@ -0,0 +1,124 @@
+"""
+Testes unitários para o índice de partes
+"""
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from trf_scraper.partyindex import PartyIndex, documents_in, normalize_name
+
+
+AGORA = datetime(2024, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+
+class TestNormalizacao(unittest.TestCase):
+    """Testa normalização de nomes e documentos"""
+
+    def test_normalize_name(self):
+        """Testa remoção de acentos, espaços repetidos e OAB"""
+        self.assertEqual(normalize_name('  José  da Conceição '), 'JOSE DA CONCEICAO')
+        self.assertEqual(normalize_name('JALES DE SENA RIBEIRO - CE006397'), 'JALES DE SENA RIBEIRO')
+        self.assertEqual(normalize_name('ÓRGÃO - EMPRESA LTDA'), 'ORGAO - EMPRESA LTDA')
+        self.assertEqual(normalize_name(None), '')
+
+    def test_documents_in(self):
+        """Testa CNPJ e CPF citados no nome da parte"""
+        self.assertEqual(
+            documents_in('EMPRESA X LTDA (CNPJ 12.345.678/0001-90)'),
+            [('cnpj', '12345678000190')]
+        )
+        self.assertEqual(documents_in('FULANO - CPF 123.456.789-09'), [('cpf', '12345678909')])
+        self.assertEqual(documents_in('FULANO - CE006397'), [])
+
+
+class TestPartyIndex(unittest.TestCase):
+    """Testa a manutenção e a consulta do índice"""
+
+    def setUp(self):
+        """Configura o índice com coleção mock e relógio fixo"""
+        self.collection = MagicMock()
+        self.searches = MagicMock()
+        self.index = PartyIndex(self.collection, self.searches, ttl=86400, clock=lambda: AGORA)
+
+    def _vinculos(self, *numeros):
+        self.collection.find.return_value = [{'numero': n} for n in numeros]
+
+    def test_index_processo(self):
+        """Testa um vínculo (parte, processo) por parte, documento e CNPJ da busca, em um bulk_write"""
+        envolvidos = [
+            {'papel': 'APTE', 'nome': 'EMPRESA X LTDA (CNPJ 12.345.678/0001-90)'},
+            {'papel': 'RELATOR', 'nome': 'DESEMBARGADOR FEDERAL FULANO'},
+        ]
+
+        total = self.index.index_processo('0015648-78.1999.4.05.0000', envolvidos, cnpj='12345678000190')
+
+        self.assertEqual(total, 3)
+        operacoes = self.collection.bulk_write.call_args.args[0]
+        chaves = [op._filter['chave'] for op in operacoes]
+        self.assertIn('nome:DESEMBARGADOR FEDERAL FULANO', chaves)
+        self.assertIn('cnpj:12345678000190', chaves)
+        self.assertTrue(all(op._filter['numero'] == '00156487819994050000' for op in operacoes))
+        self.assertEqual(operacoes[0]._doc['$addToSet'], {'papeis': 'APTE'})
+        self.assertNotIn('processos', operacoes[0]._doc['$set'])
+        self.assertFalse(self.collection.bulk_write.call_args.kwargs['ordered'])
+
+    def test_index_processo_without_numero(self):
+        """Testa que processo sem número não é indexado"""
+        self.assertEqual(self.index.index_processo(None, [{'nome': 'X'}]), 0)
+        self.collection.bulk_write.assert_not_called()
+
+    def test_record_search(self):
+        """Testa registro da busca no formulário"""
+        self.index.record_search('12.345.678/0001-90', 2)
+
+        filtro, update = self.searches.update_one.call_args.args
+        self.assertEqual(filtro, {'_id': 'cnpj:12345678000190'})
+        self.assertEqual(update['$set']['total_busca'], 2)
+        self.assertEqual(update['$set']['buscado_em'], AGORA)
+        # Os vínculos só vêm dos processos gravados, não da própria lista
+        self.collection.bulk_write.assert_not_called()
+
+    def test_ensure_indexes_unique_edge(self):
+        """Testa o índice único por (chave, processo)"""
+        self.index.ensure_indexes()
+
+        args, kwargs = self.collection.create_index.call_args_list[0]
+        self.assertEqual(args[0], [('chave', 1), ('numero', 1)])
+        self.assertTrue(kwargs['unique'])
+
+    def test_resolve_fresh_and_complete(self):
+        """Testa resolução pelo índice quando a busca é recente e completa"""
+        self.searches.find_one.return_value = {
+            'buscado_em': (AGORA - timedelta(hours=1)).replace(tzinfo=None),
+            'total_busca': 2,
+        }
+        self._vinculos('1', '2')
+
+        self.assertEqual(self.index.resolve('12345678000190'), ['1', '2'])
+        self.assertEqual(self.collection.find.call_args.args[0], {'chave': 'cnpj:12345678000190'})
+
+    def test_resolve_stale(self):
+        """Testa que busca antiga exige o formulário"""
+        self.searches.find_one.return_value = {
+            'buscado_em': AGORA - timedelta(days=2),
+            'total_busca': 1,
+        }
+        self._vinculos('1')
+
+        self.assertIsNone(self.index.resolve('12345678000190'))
+
+    def test_resolve_incomplete_or_never_searched(self):
+        """Testa que faltam processos da lista ou que o CNPJ nunca foi buscado"""
+        self.searches.find_one.return_value = {'buscado_em': AGORA, 'total_busca': 3}
+        self._vinculos('1', '2')
+        self.assertIsNone(self.index.resolve('12345678000190'))
+
+        self.searches.find_one.return_value = {'total_busca': 1}
+        self.assertIsNone(self.index.resolve('12345678000190'))
+
+        self.searches.find_one.return_value = None
+        self.assertIsNone(self.index.resolve('12345678000190'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Testes unitários para a instrumentação de tempo por etapa
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from scrapy.exceptions import NotConfigured
+from scrapy.loader import ItemLoader
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.items import ProcessoItem
+from trf_scraper.profiling import CallbackProfiler
+
+
+class FakePipeline:
+    def process_item(self, item, spider):
+        return item
+
+
+class TestCallbackProfiler(unittest.TestCase):
+    """Testa a coleta de tempos nas estatísticas"""
+
+    def setUp(self):
+        """Cria o profiler com estatísticas em memória"""
+        self.stats = MemoryStatsCollector(Mock())
+        self.profiler = CallbackProfiler(self.stats)
+        self.addCleanup(self.profiler.restore)
+
+    def test_disabled_by_default(self):
+        """Testa que a extensão não é carregada sem PROFILING_ENABLED"""
+        crawler = get_crawler(settings_dict={'PROFILING_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            CallbackProfiler.from_crawler(crawler)
+
+    def test_wrap_function(self):
+        """Testa contagem de chamadas e tempos acumulados"""
+        wrapped = self.profiler.wrap(lambda x: x * 2, 'spider/dobro')
+
+        self.assertEqual(wrapped(2), 4)
+        self.assertEqual(wrapped(3), 6)
+
+        self.assertEqual(self.stats.get_value('profiling/spider/dobro/calls'), 2)
+        self.assertGreaterEqual(self.stats.get_value('profiling/spider/dobro/wall'), 0)
+        self.assertGreaterEqual(self.stats.get_value('profiling/spider/dobro/cpu'), 0)
+
+    def test_wrap_generator_measures_iteration(self):
+        """Testa que callbacks geradores são medidos durante a iteração"""
+        consumido = []
+
+        def callback():
+            for i in range(3):
+                consumido.append(i)
+                yield i
+
+        wrapped = self.profiler.wrap(callback, 'spider/parse')
+        result = wrapped()
+
+        self.assertEqual(consumido, [])
+        self.assertEqual(list(result), [0, 1, 2])
+        self.assertEqual(self.stats.get_value('profiling/spider/parse/calls'), 1)
+
+    def test_spider_methods_wrapped_and_averages_published(self):
+        """Testa o embrulho dos métodos do spider e as médias no fechamento"""
+        spider = Mock(spec=['parse_processo', 'name', 'logger'])
+        spider.name = 'processo'
+        spider.parse_processo = Mock(return_value=None)
+
+        self.profiler.spider_opened(spider)
+        spider.parse_processo()
+        spider.parse_processo()
+        self.stats.set_value('item_scraped_count', 2)
+        self.profiler.spider_closed(spider)
+
+        self.assertEqual(self.stats.get_value('profiling/spider/parse_processo/calls'), 2)
+        self.assertIsNotNone(self.stats.get_value('profiling/spider/parse_processo/wall_avg'))
+        self.assertIsNotNone(self.stats.get_value('profiling/spider/parse_processo/cpu_per_item'))
+
+    def test_class_patches_restored(self):
+        """Testa que ItemLoader e pipelines voltam ao original no fechamento"""
+        original_pipeline = FakePipeline.process_item
+        self.profiler._patch(FakePipeline, 'process_item', 'pipeline/FakePipeline')
+        self.profiler.spider_opened(Mock(spec=['name']))
+
+        self.assertEqual(FakePipeline().process_item({'a': 1}, None), {'a': 1})
+        loader = ItemLoader(item=ProcessoItem())
+        loader.add_value('url', 'http://example.com')
+        loader.load_item()
+        self.assertEqual(self.stats.get_value('profiling/loader/load_item/calls'), 1)
+        self.assertEqual(self.stats.get_value('profiling/pipeline/FakePipeline/calls'), 1)
+
+        self.profiler.restore()
+
+        self.assertIs(FakePipeline.process_item, original_pipeline)
+        self.assertNotIn('load_item', ItemLoader.__dict__)
+
+    def test_sampled_profile_dump(self):
+        """Testa o cProfile de páginas sorteadas gravado no fechamento"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profiler = CallbackProfiler(self.stats, sample_pages=2, sample_rate=1.0, output_dir=tmpdir)
+            spider = Mock(spec=['parse_processo', 'name', 'logger'])
+            spider.name = 'processo'
+            spider.parse_processo = lambda: sum(range(100))
+
+            profiler.spider_opened(spider)
+            for _ in range(5):
+                spider.parse_processo()
+            profiler.spider_closed(spider)
+
+            self.assertEqual(profiler.sampled, 2)
+            self.assertEqual(len([f for f in os.listdir(tmpdir) if f.endswith('.pstats')]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
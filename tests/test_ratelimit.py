@@ -0,0 +1,136 @@
+"""
+Testes unitários para o rate limiter compartilhado
+"""
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from scrapy.http import Request
+
+from trf_scraper.middlewares import RateLimitMiddleware
+from trf_scraper.ratelimit import SqliteTokenBucket
+
+
+class TestSqliteTokenBucket(unittest.TestCase):
+    """Testa o token bucket em SQLite"""
+
+    def setUp(self):
+        """Cria o banco em um diretório temporário com relógio controlado"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ratelimit.sqlite')
+        self.now = 1000.0
+        self.bucket = self._bucket()
+
+    def tearDown(self):
+        self.bucket.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _bucket(self):
+        return SqliteTokenBucket(
+            self.path,
+            rates={'cp.trf5.jus.br': 2.0},
+            burst=2,
+            clock=lambda: self.now
+        )
+
+    def test_burst_is_free(self):
+        """Testa que o burst inicial não espera"""
+        self.assertEqual(self.bucket.acquire('cp.trf5.jus.br'), 0)
+        self.assertEqual(self.bucket.acquire('cp.trf5.jus.br'), 0)
+
+    def test_reservations_queue_up(self):
+        """Testa que sem saldo as esperas crescem com a taxa"""
+        self.bucket.acquire('cp.trf5.jus.br')
+        self.bucket.acquire('cp.trf5.jus.br')
+
+        self.assertAlmostEqual(self.bucket.acquire('cp.trf5.jus.br'), 0.5)
+        self.assertAlmostEqual(self.bucket.acquire('cp.trf5.jus.br'), 1.0)
+
+    def test_tokens_refill_over_time(self):
+        """Testa reposição de tokens com o tempo"""
+        self.bucket.acquire('cp.trf5.jus.br')
+        self.bucket.acquire('cp.trf5.jus.br')
+        self.now += 0.5
+
+        self.assertEqual(self.bucket.acquire('cp.trf5.jus.br'), 0)
+
+    def test_budget_shared_between_processes(self):
+        """Testa que duas instâncias no mesmo arquivo dividem o orçamento"""
+        other = self._bucket()
+        try:
+            self.bucket.acquire('cp.trf5.jus.br')
+            other.acquire('cp.trf5.jus.br')
+
+            self.assertAlmostEqual(other.acquire('cp.trf5.jus.br'), 0.5)
+        finally:
+            other.close()
+
+    def test_locked_database_returns_none(self):
+        """Testa que, com o banco travado por outro processo, a reserva desiste logo"""
+        other = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+
+            self.assertIsNone(self.bucket.acquire('cp.trf5.jus.br'))
+
+            other.execute('ROLLBACK')
+            self.assertEqual(self.bucket.acquire('cp.trf5.jus.br'), 0)
+        finally:
+            other.close()
+
+    def test_unlimited_host(self):
+        """Testa host sem limite configurado"""
+        for _ in range(10):
+            self.assertEqual(self.bucket.acquire('example.com'), 0)
+
+
+class TestRateLimitMiddleware(unittest.TestCase):
+    """Testa o middleware de rate limit"""
+
+    def setUp(self):
+        """Configura o middleware com bucket mock"""
+        self.bucket = Mock()
+        self.stats = Mock()
+        self.middleware = RateLimitMiddleware(self.bucket, self.stats)
+        self.request = Request('https://cp.trf5.jus.br/processo/1')
+
+    @patch('trf_scraper.middlewares.sleep', new_callable=AsyncMock)
+    def test_no_wait_when_token_available(self, mock_sleep):
+        """Testa que a requisição segue direto com token disponível"""
+        self.bucket.acquire.return_value = 0
+
+        result = asyncio.run(self.middleware.process_request(self.request, Mock()))
+
+        self.assertIsNone(result)
+        self.bucket.acquire.assert_called_once_with('cp.trf5.jus.br')
+        mock_sleep.assert_not_called()
+
+    @patch('trf_scraper.middlewares.sleep', new_callable=AsyncMock)
+    def test_waits_for_reserved_token(self, mock_sleep):
+        """Testa espera quando o token foi reservado para depois"""
+        self.bucket.acquire.return_value = 0.75
+
+        asyncio.run(self.middleware.process_request(self.request, Mock()))
+
+        mock_sleep.assert_awaited_once_with(0.75)
+        self.stats.inc_value.assert_any_call('ratelimit/cp.trf5.jus.br/delayed')
+
+    @patch('trf_scraper.middlewares.sleep', new_callable=AsyncMock)
+    def test_retries_while_database_locked(self, mock_sleep):
+        """Testa que o lock ocupado vira nova tentativa com espera assíncrona"""
+        self.bucket.acquire.side_effect = [None, None, 0]
+
+        asyncio.run(self.middleware.process_request(self.request, Mock()))
+
+        self.assertEqual(self.bucket.acquire.call_count, 3)
+        self.assertEqual(mock_sleep.await_count, 2)
+        mock_sleep.assert_awaited_with(0.02)
+        self.stats.inc_value.assert_any_call('ratelimit/cp.trf5.jus.br/lock_retries')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Testes unitários para o histórico de execuções
+"""
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from trf_scraper.runs import (
+    RunReport,
+    build_run_record,
+    find_regressions,
+    format_runs,
+    load_jsonl_runs
+)
+
+
+def _stats(**extra):
+    stats = {
+        'start_time': datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc),
+        'finish_time': datetime(2024, 1, 1, 12, 10, tzinfo=timezone.utc),
+        'elapsed_time_seconds': 600.0,
+        'finish_reason': 'finished',
+        'item_scraped_count': 300,
+        'response_received_count': 1200,
+        'input/discovered': 290,
+        'latency/processo/total/p95': 2.5,
+        'retry/count': 12,
+        'mongodb/items_inserted': 100,
+        'mongodb/items_updated': 50,
+        'mongodb/items_unchanged': 150,
+        'memusage/max': 300 * 1048576,
+    }
+    stats.update(extra)
+    return stats
+
+
+class TestBuildRunRecord(unittest.TestCase):
+    """Testa o resumo das estatísticas"""
+
+    def setUp(self):
+        """Cria um spider mock"""
+        self.spider = Mock(spec=['name', 'processos', 'cnpj'])
+        self.spider.name = 'processo'
+        self.spider.processos = ['1', '2']
+        self.spider.cnpj = '00000000000191'
+
+    def test_record_fields(self):
+        """Testa taxas, entrada e contadores do registro"""
+        record = build_run_record(self.spider, _stats())
+
+        self.assertEqual(record['input_total'], 292)
+        self.assertEqual(record['pages_per_second'], 2.0)
+        self.assertEqual(record['items_per_second'], 0.5)
+        self.assertEqual(record['latency_p95'], 2.5)
+        self.assertEqual(record['retries'], 12)
+        self.assertEqual(record['mongodb_unchanged'], 150)
+        self.assertEqual(record['peak_memory_mb'], 300.0)
+        self.assertEqual(record['started_at'], '2024-01-01T12:00:00+00:00')
+        json.dumps(record)
+
+    def test_peak_memory_from_memdiag(self):
+        """Testa pico de memória vindo do diagnóstico de memória"""
+        stats = _stats(**{'memusage/max': None, 'memdiag/rss_max_mb': 512.3})
+
+        self.assertEqual(build_run_record(self.spider, stats)['peak_memory_mb'], 512.3)
+
+    def test_zero_duration(self):
+        """Testa execução sem duração registrada"""
+        record = build_run_record(self.spider, {'finish_reason': 'shutdown'})
+
+        self.assertEqual(record['pages_per_second'], 0.0)
+        self.assertIsNone(record['started_at'])
+
+
+class TestRegressions(unittest.TestCase):
+    """Testa a comparação entre execuções"""
+
+    def _runs(self, *rates):
+        return [
+            {'started_at': f'2024-01-0{i + 1}', 'reason': 'finished', 'pages_per_second': rate}
+            for i, rate in enumerate(rates)
+        ]
+
+    def test_flags_drop_below_median(self):
+        """Testa que uma queda acima da tolerância é marcada"""
+        regressions = find_regressions(self._runs(2.0, 2.1, 1.9, 1.2), tolerance=0.2)
+
+        self.assertEqual(list(regressions), [3])
+        self.assertEqual(regressions[3], 2.0)
+
+    def test_small_variation_ignored(self):
+        """Testa que variações dentro da tolerância não são marcadas"""
+        self.assertEqual(find_regressions(self._runs(2.0, 2.1, 1.8)), {})
+
+    def test_interrupted_runs_not_used_as_baseline(self):
+        """Testa que execuções interrompidas não entram na mediana"""
+        runs = self._runs(0.5, 1.0)
+        runs[0]['reason'] = 'shutdown'
+
+        self.assertEqual(find_regressions(runs), {})
+
+    def test_format_marks_regression(self):
+        """Testa a tabela com a regressão marcada"""
+        runs = self._runs(2.0, 1.0)
+
+        tabela = format_runs(runs, find_regressions(runs))
+
+        linhas = tabela.splitlines()
+        self.assertEqual(len(linhas), 3)
+        self.assertIn('regressão', linhas[2])
+        self.assertNotIn('regressão', linhas[1])
+
+
+class TestRunReport(unittest.TestCase):
+    """Testa a gravação do registro ao fim do crawl"""
+
+    def setUp(self):
+        """Cria a extensão com arquivo temporário"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'runs.jsonl')
+        self.crawler = Mock()
+        self.crawler.stats.get_stats.return_value = _stats()
+        self.ext = RunReport(self.crawler, fallback_path=self.path)
+        self.ext.spider = Mock()
+        self.ext.spider.name = 'processo'
+        self.ext.spider.processos = []
+        self.ext.spider.cnpj = None
+
+    def test_disabled_by_setting(self):
+        """Testa que a extensão não é carregada com RUN_REPORT_ENABLED desligado"""
+        crawler = get_crawler(settings_dict={'RUN_REPORT_ENABLED': False})
+
+        with self.assertRaises(NotConfigured):
+            RunReport.from_crawler(crawler)
+
+    def test_saves_to_mongodb(self):
+        """Testa gravação na coleção runs"""
+        with patch.object(RunReport, '_insert_mongo') as insert:
+            self.ext.engine_stopped()
+
+        insert.assert_called_once()
+        self.assertEqual(insert.call_args.args[0]['items'], 300)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_falls_back_to_jsonl(self):
+        """Testa gravação no arquivo local quando o MongoDB falha"""
+        with patch.object(RunReport, '_insert_mongo', side_effect=Exception('timeout')):
+            self.ext.engine_stopped()
+            self.ext.engine_stopped()
+
+        runs = load_jsonl_runs(self.path, spider='processo')
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(runs[0]['pages_per_second'], 2.0)
+        self.assertEqual(load_jsonl_runs(self.path, spider='outro'), [])
+
+    def test_nothing_saved_without_spider(self):
+        """Testa que nada é gravado se o spider não chegou a abrir"""
+        self.ext.spider = None
+
+        with patch.object(RunReport, '_insert_mongo') as insert:
+            self.ext.engine_stopped()
+
+        insert.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Testes unitários para o conjunto persistente de processos vistos
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from scrapy.http import Request
+
+from trf_scraper.seen import BloomFilter, SeenDupeFilter, SeenSet, normalize
+
+
+class FakeClock:
+    """Relógio controlado pelo teste"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Testa o filtro de Bloom"""
+
+    def test_no_false_negatives_and_few_false_positives(self):
+        """Testa que tudo que entrou é encontrado e falsos positivos são raros"""
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(f'{i:020d}')
+
+        self.assertTrue(all(f'{i:020d}' in bloom for i in range(10000)))
+        falsos = sum(f'{i:020d}' in bloom for i in range(10000, 20000))
+        self.assertLess(falsos, 300)
+
+    def test_roundtrip(self):
+        """Testa que o filtro salvo e carregado mantém bits e último rowid"""
+        bloom = BloomFilter(100)
+        bloom.add('00156487819994050000')
+
+        carregado, last_rowid = BloomFilter.from_bytes(bloom.to_bytes(42))
+
+        self.assertIn('00156487819994050000', carregado)
+        self.assertEqual(last_rowid, 42)
+        self.assertEqual(carregado.k, bloom.k)
+        with self.assertRaises(ValueError):
+            BloomFilter.from_bytes(b'x' * 40)
+
+
+class TestSeenSet(unittest.TestCase):
+    """Testa a deduplicação na execução e entre execuções"""
+
+    def setUp(self):
+        """Cria o banco em diretório temporário"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'seen.sqlite')
+        self.clock = FakeClock()
+
+    def _open(self):
+        seen = SeenSet(self.path, ttl=100, capacity=1000, clock=self.clock)
+        self.addCleanup(seen.conn.close)
+        return seen
+
+    def test_duplicate_in_same_run(self):
+        """Testa que o segundo agendamento na mesma execução é duplicado"""
+        seen = self._open()
+
+        self.assertFalse(seen.check_and_add('00156487819994050000', 'processos'))
+        self.assertTrue(seen.check_and_add('00156487819994050000', 'cnpj'))
+
+    def test_across_runs_respects_ttl_and_completion(self):
+        """Testa que só o processo gravado dentro do TTL é pulado na execução seguinte"""
+        seen = self._open()
+        seen.check_and_add('00000000000000000001')
+        seen.check_and_add('00000000000000000002')
+        seen.mark_done(['00000000000000000001'])
+        seen.close()
+
+        self.clock.now += 10
+        seen = self._open()
+        self.assertTrue(seen.check_and_add('00000000000000000001'))
+        # Agendado mas nunca gravado (falhou): busca de novo
+        self.assertFalse(seen.check_and_add('00000000000000000002'))
+        seen.close()
+
+        self.clock.now += 200
+        seen = self._open()
+        self.assertFalse(seen.check_and_add('00000000000000000001'))
+
+    def test_bloom_catches_up_with_rows_written_after_save(self):
+        """Testa que linhas gravadas depois do último Bloom salvo entram na abertura"""
+        seen = self._open()
+        seen.check_and_add('00000000000000000001')
+        seen.close()
+        outro = self._open()
+        outro.check_and_add('00000000000000000002')
+        outro.conn.close()
+
+        seen = self._open()
+
+        self.assertIn('00000000000000000002', seen.bloom)
+
+
+class TestSeenDupeFilter(unittest.TestCase):
+    """Testa o dupefilter pelo número do processo"""
+
+    def setUp(self):
+        """Cria o dupefilter com conjunto mock"""
+        self.seen = Mock()
+        self.stats = Mock()
+        self.dupefilter = SeenDupeFilter(seen=self.seen, stats=self.stats)
+
+    def test_counts_by_source(self):
+        """Testa chave normalizada e contagem por fonte"""
+        self.seen.check_and_add.return_value = True
+        request = Request(
+            'https://cp.trf5.jus.br/processo/00156487819994050000',
+            meta={'numero_busca': '0015648-78.1999.4.05.0000', 'fonte': 'cnpj'}
+        )
+
+        self.assertTrue(self.dupefilter.request_seen(request))
+        self.seen.check_and_add.assert_called_once_with('00156487819994050000', 'cnpj')
+        self.stats.inc_value.assert_called_once_with('seen/duplicate/cnpj')
+
+    def test_request_without_numero_uses_fingerprint(self):
+        """Testa que formulário e listas ficam no filtro por impressão digital"""
+        request = Request('https://cp.trf5.jus.br/cp/cp.do')
+
+        self.assertFalse(self.dupefilter.request_seen(request))
+        self.assertTrue(self.dupefilter.request_seen(request))
+        self.seen.check_and_add.assert_not_called()
+
+    def test_item_scraped_marks_done(self):
+        """Testa que o processo gravado é marcado como concluído"""
+        response = Mock()
+        response.meta = {'numero_busca': '00156487819994050000'}
+
+        self.dupefilter.item_scraped({'numero_processo': '0015648-78.1999.4.05.0000'}, response, Mock())
+
+        self.assertEqual(list(self.seen.mark_done.call_args.args[0]), ['00156487819994050000'])
+
+    def test_item_not_stored_is_not_marked(self):
+        """Testa que item com falha no MongoDB não entra no TTL de vistos"""
+        from trf_scraper.items import ProcessoItem
+        from trf_scraper.pipelines import _mark_stored
+
+        self.dupefilter.require_stored = True
+        response = Mock()
+        response.meta = {'numero_busca': '00156487819994050000'}
+        item = ProcessoItem(numero_processo='0015648-78.1999.4.05.0000')
+
+        self.dupefilter.item_scraped(item, response, Mock())
+        self.seen.mark_done.assert_not_called()
+
+        _mark_stored(item)
+        self.dupefilter.item_scraped(item, response, Mock())
+        self.seen.mark_done.assert_called_once()
+
+
+class TestNormalize(unittest.TestCase):
+    """Testa a normalização do número"""
+
+    def test_normalize(self):
+        """Testa que só números de 20 dígitos viram chave"""
+        self.assertEqual(normalize('0015648-78.1999.4.05.0000'), '00156487819994050000')
+        self.assertIsNone(normalize('123'))
+        self.assertIsNone(normalize(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,16 @@
 """
 Testes unitários para o ProcessoSpider
 """
+import json
+import os
+import tempfile
 import unittest
+from datetime import datetime
 from unittest.mock import Mock, patch, MagicMock
 from scrapy.http import HtmlResponse, Request
 from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.settings import Settings
 
 from trf_scraper.spiders.processo_spider import ProcessoSpider
 from trf_scraper.items import ProcessoItem
@@ -41,6 +47,60 @@ class TestProcessoSpider(unittest.TestCase):
         with self.assertRaises(ValueError):
             ProcessoSpider()
     
+    def test_spider_initialization_with_retry_from(self):
+        """Testa que o diário de falhas vira entrada, sem processos repetidos"""
+        linhas = [
+            {'numero_processo': '0015648-78.1999.4.05.0000', 'url': 'u1'},
+            {'numero_processo': '00156487819994050000', 'url': 'u1'},
+            {'numero_processo': '0000001-02.2020.4.05.0000', 'url': 'u2'},
+            {'numero_processo': None, 'cnpj': '12345678000190', 'url': 'u3'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for linha in linhas:
+                f.write(json.dumps(linha) + '\n')
+            f.write('linha corrompida\n')
+        self.addCleanup(os.remove, f.name)
+        
+        spider = ProcessoSpider(processos="0000001-02.2020.4.05.0000", retry_from=f.name)
+        
+        self.assertEqual(
+            spider.processos,
+            ['0000001-02.2020.4.05.0000', '0015648-78.1999.4.05.0000']
+        )
+        self.assertEqual(spider.cnpj, '12345678000190')
+    
+    def test_spider_initialization_with_arquivo_processos(self):
+        """Testa leitura de processos de arquivo, ignorando linhas vazias e comentários"""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('# shard 0\n00156487819994050000\n\n0000001-02.2020.4.05.0000  # antigo\n')
+        self.addCleanup(os.remove, f.name)
+        
+        spider = ProcessoSpider(arquivo_processos=f.name)
+        
+        self.assertEqual(spider.processos, ['00156487819994050000', '0000001-02.2020.4.05.0000'])
+    
+    def test_start_requests_multiple_cnpjs(self):
+        """Testa uma busca no formulário por CNPJ da lista"""
+        spider = ProcessoSpider(cnpj="12.345.678/0001-90, 98765432000110")
+        spider.crawler = Mock()
+        
+        requests = list(spider.start_requests())
+        
+        self.assertEqual(spider.cnpjs, ['12.345.678/0001-90', '98765432000110'])
+        self.assertEqual([r.meta['cnpj'] for r in requests], spider.cnpjs)
+        self.assertTrue(all(r.dont_filter for r in requests))
+    
+    def test_start_yields_start_requests(self):
+        """Testa que start() (Scrapy >= 2.13) entrega as mesmas requisições"""
+        import asyncio
+        
+        async def coletar():
+            return [r async for r in self.spider.start()]
+        
+        requests = asyncio.run(coletar())
+        
+        self.assertEqual([r.url for r in requests], [r.url for r in self.spider.start_requests()])
+    
     def test_clean_cnpj(self):
         """Testa limpeza de CNPJ"""
         test_cases = [
@@ -174,6 +234,25 @@ class TestProcessoSpider(unittest.TestCase):
         self.assertIn('envolvidos', item)
         self.assertIn('movimentacoes', item)
     
+    def test_parse_processo_with_cnpj(self):
+        """Testa que o CNPJ da busca é propagado para o item"""
+        html = """
+        <html>
+            <body>
+                <p>PROCESSO Nº 0015648-78.1999.4.05.0000</p>
+            </body>
+        </html>
+        """
+        response = HtmlResponse(
+            url='https://cp.trf5.jus.br/processo/00156487819994050000',
+            body=html.encode('utf-8'),
+            encoding='utf-8'
+        )
+        
+        item = list(self.spider.parse_processo(response, cnpj='12345678000190'))[0]
+        
+        self.assertEqual(item['cnpj_busca'], '12345678000190')
+    
     def test_parse_lista_processos(self):
         """Testa parsing de lista de processos (busca por CNPJ)"""
         html = """
@@ -196,6 +275,64 @@ class TestProcessoSpider(unittest.TestCase):
         for request in results:
             self.assertIsInstance(request, Request)
     
+    def test_parse_lista_records_search_in_party_index(self):
+        """Testa que a busca no formulário é registrada no índice de partes"""
+        self.spider._party_index = Mock()
+        response = HtmlResponse(
+            url='https://cp.trf5.jus.br/cp/cp.do',
+            body=b'<a class="linkar" href="/processo/00156487819994050000">1</a>'
+                 b'<a class="linkar" href="/cp/processo2">2</a>',
+            encoding='utf-8'
+        )
+        
+        list(self.spider.parse_lista_processos(response, cnpj='12345678000190'))
+        
+        self.spider._party_index.record_search.assert_called_once_with('12345678000190', 2)
+    
+    def test_party_index_disabled_after_failure(self):
+        """Testa que o índice de partes é desligado na primeira falha do MongoDB"""
+        self.spider.crawler = Mock()
+        index = self.spider._party_index = Mock()
+        index.resolve.side_effect = Exception('timeout')
+        
+        self.assertIsNone(self.spider._resolve_from_party_index('12345678000190'))
+        self.assertIsNone(self.spider._resolve_from_party_index('98765432000110'))
+        self.spider._record_cnpj_search('98765432000110', ['/processo/00156487819994050000'])
+        
+        index.resolve.assert_called_once()
+        index.record_search.assert_not_called()
+        self.assertIsNone(self.spider._get_party_index())
+    
+    def test_start_requests_cnpj_from_party_index(self):
+        """Testa CNPJ resolvido pelo índice, sem o formulário"""
+        spider = ProcessoSpider(cnpj="12.345.678/0001-90")
+        spider.crawler = Mock()
+        spider._party_index = Mock()
+        spider._party_index.resolve.return_value = ['00156487819994050000', '00156487819994050001']
+        
+        requests = list(spider.start_requests())
+        
+        self.assertEqual(len(requests), 2)
+        self.assertTrue(all(r.callback == spider.parse_processo for r in requests))
+        self.assertEqual(requests[0].cb_kwargs, {'cnpj': '12345678000190'})
+        spider._party_index.resolve.assert_called_once_with('12345678000190')
+    
+    def test_start_requests_cnpj_index_miss_uses_form(self):
+        """Testa que índice desatualizado ou indisponível mantém a busca no formulário"""
+        spider = ProcessoSpider(cnpj="12.345.678/0001-90")
+        spider.crawler = Mock()
+        spider._party_index = Mock()
+        
+        for resultado in (None, Exception('timeout')):
+            with self.subTest(resultado=resultado):
+                spider._party_index.resolve.side_effect = [resultado] if resultado else None
+                spider._party_index.resolve.return_value = None
+                
+                requests = list(spider.start_requests())
+                
+                self.assertEqual(len(requests), 1)
+                self.assertEqual(requests[0].callback, spider.parse_form_cnpj)
+    
     def test_parse_lista_processos_empty(self):
         """Testa parsing de lista vazia"""
         html = """
@@ -270,6 +407,224 @@ class TestProcessoSpider(unittest.TestCase):
         
         self.assertIsInstance(movimentacoes, list)
         self.assertEqual(len(movimentacoes), 2)
+        self.assertEqual(movimentacoes[0]['data'], datetime(2025, 11, 11, 14, 30))
+        self.assertEqual(movimentacoes[1]['texto'], 'Processo distribuído')
+    
+    def test_requests_carry_source(self):
+        """Testa que cada requisição de processo informa a fonte do número"""
+        requests = list(self.spider.start_requests())
+        response = HtmlResponse(
+            url='https://cp.trf5.jus.br/cp/cp.do',
+            body=b'<a class="linkar" href="/processo/00156487819994050002">1</a>',
+            encoding='utf-8'
+        )
+        seguidos = list(self.spider.parse_lista_processos(response))
+        
+        self.assertEqual(requests[0].meta['fonte'], 'processos')
+        self.assertEqual(seguidos[0].meta['fonte'], 'cnpj')
+    
+    def test_start_requests_freshness_order_and_budget(self):
+        """Testa ordem por nota de frescor e orçamento de processos"""
+        spider = ProcessoSpider(
+            processos="00156487819994050000,00156487819994050001,00156487819994050002",
+            prioridade='freshness', orcamento='2'
+        )
+        spider.crawler = Mock()
+        spider._freshness = Mock()
+        spider._freshness.rank.return_value = [
+            ('00156487819994050002', 1.0), ('00156487819994050000', 0.4), ('00156487819994050001', 0.1)
+        ]
+        
+        requests = list(spider.start_requests())
+        
+        self.assertEqual(
+            [r.meta['numero_busca'] for r in requests],
+            ['00156487819994050002', '00156487819994050000']
+        )
+        self.assertEqual([r.priority for r in requests], [101, 41])
+        spider.crawler.stats.inc_value.assert_any_call('freshness/over_budget', 1)
+    
+    def test_freshness_unavailable_keeps_input_order(self):
+        """Testa que sem MongoDB a ordem da entrada é mantida"""
+        spider = ProcessoSpider(processos="00156487819994050000,00156487819994050001", prioridade='freshness')
+        spider.crawler = Mock()
+        spider._freshness = Mock()
+        spider._freshness.rank.side_effect = Exception('timeout')
+        
+        requests = list(spider.start_requests())
+        
+        self.assertEqual([r.priority for r in requests], [1, 1])
+        self.assertEqual(spider.prioridade, 'fixa')
+    
+    def test_deadline_defaults_to_freshness(self):
+        """Testa que com prazo a prioridade padrão passa a ser por frescor"""
+        spider = ProcessoSpider(processos="00156487819994050000", deadline='2h')
+        
+        self.assertEqual(spider.prioridade, 'freshness')
+        self.assertIsNotNone(spider.deadline)
+        self.assertEqual(
+            ProcessoSpider(processos="00156487819994050000", deadline='2h', prioridade='fixa').prioridade,
+            'fixa'
+        )
+    
+    def test_invalid_prioridade(self):
+        """Testa que só 'fixa' e 'freshness' são aceitas"""
+        with self.assertRaises(ValueError):
+            ProcessoSpider(processos="00156487819994050000", prioridade='aleatoria')
+    
+    def _frontier_spider(self):
+        spider = ProcessoSpider(processos="00156487819994050000", frontier='frontier.sqlite')
+        spider.crawler = Mock()
+        spider.settings = Settings({'FRONTIER_BATCH': 10, 'FRONTIER_RETRY_DELAY': 60})
+        spider.frontier = Mock()
+        return spider
+    
+    def test_start_requests_with_frontier(self):
+        """Testa que os processos informados entram no frontier e o worker arrenda um lote"""
+        spider = self._frontier_spider()
+        spider.frontier.lease.return_value = ['00156487819994050000']
+        
+        requests = list(spider.start_requests())
+        
+        self.assertEqual(list(spider.frontier.add.call_args.args[0]), ['00156487819994050000'])
+        self.assertEqual(spider.frontier.lease.call_args.args[1], 10)
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(spider._leased, {'00156487819994050000'})
+    
+    def test_frontier_idle(self):
+        """Testa que o worker ocioso pega outro lote ou espera os demais workers"""
+        spider = self._frontier_spider()
+        spider.frontier.lease.return_value = ['00156487819994050001']
+        
+        with self.assertRaises(DontCloseSpider):
+            spider.frontier_idle(spider)
+        spider.crawler.engine.crawl.assert_called_once()
+        
+        spider.frontier.lease.return_value = []
+        spider.frontier.has_work.return_value = True
+        with self.assertRaises(DontCloseSpider):
+            spider.frontier_idle(spider)
+        
+        spider.frontier.has_work.return_value = False
+        spider.frontier_idle(spider)
+    
+    def test_frontier_ack_and_nack(self):
+        """Testa confirmação após o parse e devolução com atraso no erro"""
+        spider = self._frontier_spider()
+        spider._leased = {'00156487819994050000', '00156487819994050001'}
+        request = Request('http://example.com', meta={'numero_busca': '0015648-78.1999.4.05.0000'})
+        response = HtmlResponse(url='http://example.com', body=b'<html></html>', request=request)
+        
+        spider._frontier_ack(response)
+        failure = Mock()
+        failure.request = Request('http://example.com', meta={'numero_busca': '00156487819994050001'})
+        spider.handle_error(failure)
+        
+        spider.frontier.ack.assert_called_once_with(['00156487819994050000'])
+        spider.frontier.nack.assert_called_once_with(['00156487819994050001'], delay=60.0)
+        self.assertEqual(spider._leased, set())
+    
+    def test_frontier_ack_only_when_stored(self):
+        """Testa que o processo só é confirmado no frontier depois de gravado"""
+        from trf_scraper.pipelines import _mark_stored
+
+        spider = self._frontier_spider()
+        spider._require_stored = True
+        spider._leased = {'00156487819994050000'}
+        request = Request('http://example.com', meta={'numero_busca': '00156487819994050000'})
+        response = HtmlResponse(url='http://example.com', body=b'<html></html>', request=request)
+        item = ProcessoItem(numero_processo='0015648-78.1999.4.05.0000')
+
+        spider.frontier_item(item, response, spider)
+        spider.frontier.ack.assert_not_called()
+        self.assertEqual(spider._leased, {'00156487819994050000'})
+
+        _mark_stored(item)
+        spider.frontier_item(item, response, spider)
+        spider.frontier.ack.assert_called_once_with(['00156487819994050000'])
+
+    def test_scheduled_retry_is_not_a_failure(self):
+        """Testa que requisição com retry agendado não devolve o processo ao frontier"""
+        spider = self._frontier_spider()
+        spider._leased = {'00156487819994050000'}
+        failure = Mock()
+        failure.request = Request(
+            'http://example.com', meta={'numero_busca': '00156487819994050000', 'retry_deferred': True}
+        )
+
+        spider.handle_error(failure)
+
+        spider.frontier.nack.assert_not_called()
+        self.assertEqual(spider._leased, {'00156487819994050000'})
+
+    def test_resume_skips_checkpointed_processos(self):
+        """Testa que a retomada não baixa de novo processos do checkpoint"""
+        spider = ProcessoSpider(processos="00156487819994050000,00156487819994050001", resume='ck')
+        spider.crawler = Mock()
+        spider.checkpoint = MagicMock()
+        spider.checkpoint.entrada = spider.processos
+        spider.checkpoint.pending_input.return_value = iter(['00156487819994050001'])
+        spider.checkpoint.__contains__.side_effect = lambda n: n == '00156487819994050002'
+        
+        requests = list(spider.start_requests())
+        response = HtmlResponse(
+            url='https://cp.trf5.jus.br/cp/cp.do',
+            body=b'<a class="linkar" href="/processo/00156487819994050002">1</a>'
+                 b'<a class="linkar" href="/processo/00156487819994050003">2</a>',
+            encoding='utf-8'
+        )
+        seguidos = list(spider.parse_lista_processos(response, cnpj='12345678000190'))
+        
+        self.assertTrue(spider.resume)
+        self.assertEqual([r.meta['numero_busca'] for r in requests], ['00156487819994050001'])
+        self.assertEqual([r.url for r in seguidos], ['https://cp.trf5.jus.br/processo/00156487819994050003'])
+    
+    def test_concluidos_are_skipped(self):
+        """Testa que processos do arquivo de concluídos não são buscados, nem nas listas de CNPJ"""
+        with tempfile.NamedTemporaryFile('w', suffix='.done', delete=False) as f:
+            f.write('00156487819994050000\n00156487819994050002\n')
+        self.addCleanup(os.unlink, f.name)
+        spider = ProcessoSpider(processos="0015648-78.1999.4.05.0000,00156487819994050001", concluidos=f.name)
+        spider.crawler = Mock()
+
+        requests = list(spider.start_requests())
+        response = HtmlResponse(
+            url='https://cp.trf5.jus.br/cp/cp.do',
+            body=b'<a class="linkar" href="/processo/00156487819994050002">1</a>'
+                 b'<a class="linkar" href="/processo/00156487819994050003">2</a>',
+            encoding='utf-8'
+        )
+        seguidos = list(spider.parse_lista_processos(response, cnpj='12345678000190'))
+
+        self.assertEqual([r.meta['numero_busca'] for r in requests], ['00156487819994050001'])
+        self.assertEqual([r.url for r in seguidos], ['https://cp.trf5.jus.br/processo/00156487819994050003'])
+
+    def test_checkpoint_item(self):
+        """Testa que o item gravado anota número extraído e número buscado"""
+        self.spider.checkpoint = Mock()
+        response = Mock()
+        response.meta = {'numero_busca': '00156487819994050000'}
+        
+        self.spider.checkpoint_item({'numero_processo': '0015648-78.1999.4.05.0000'}, response, self.spider)
+        
+        self.assertEqual(list(self.spider.checkpoint.mark.call_args.args[0]), ['00156487819994050000'])
+
+    def test_checkpoint_item_only_when_stored(self):
+        """Testa que item não gravado no MongoDB não entra no checkpoint"""
+        from trf_scraper.pipelines import _mark_stored
+
+        self.spider.checkpoint = Mock()
+        self.spider._require_stored = True
+        response = Mock()
+        response.meta = {'numero_busca': '00156487819994050000'}
+        item = ProcessoItem(numero_processo='0015648-78.1999.4.05.0000')
+
+        self.spider.checkpoint_item(item, response, self.spider)
+        self.spider.checkpoint.mark.assert_not_called()
+
+        _mark_stored(item)
+        self.spider.checkpoint_item(item, response, self.spider)
+        self.spider.checkpoint.mark.assert_called_once()
     
     @patch('builtins.open', new_callable=MagicMock)
     @patch('os.makedirs')
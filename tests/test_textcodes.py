@@ -0,0 +1,141 @@
+"""
+Testes unitários para interning e codificação dos textos de movimentação
+"""
+import unittest
+from unittest.mock import MagicMock
+
+from pymongo.errors import DuplicateKeyError
+
+from trf_scraper.items import Envolvido, Movimentacao
+from trf_scraper.textcodes import TextDecoder, TextDictionary, TextPool
+
+
+class TestTextPool(unittest.TestCase):
+    """Testa a tabela de interning"""
+
+    def test_same_object_for_equal_texts(self):
+        """Testa que textos iguais passam a ser o mesmo objeto"""
+        pool = TextPool()
+        a = ''.join(['Conclusos ', 'para decisão'])
+        b = ''.join(['Conclusos para ', 'decisão'])
+
+        self.assertIsNot(a, b)
+        self.assertIs(pool.intern(a), pool.intern(b))
+
+    def test_long_texts_and_limit(self):
+        """Testa que textos longos não entram e a tabela não passa do limite"""
+        pool = TextPool(maxsize=2, maxlen=10)
+
+        pool.intern('x' * 11)
+        for texto in ('a', 'b', 'c'):
+            pool.intern(texto)
+
+        self.assertEqual(len(pool), 2)
+        self.assertIsNone(pool.intern(None))
+
+    def test_clear(self):
+        """Testa que clear esvazia a tabela"""
+        pool = TextPool()
+        pool.intern('RELATOR')
+
+        pool.clear()
+
+        self.assertEqual(len(pool), 0)
+
+    def test_records_share_repeated_texts(self):
+        """Testa que registros extraídos de páginas diferentes compartilham textos"""
+        a = Movimentacao.extract('01/01/2020', ' '.join(['Juntada', 'de', 'Petição']))
+        b = Movimentacao.extract('02/01/2020', ' '.join(['Juntada', 'de', 'Petição']))
+        c = Envolvido.extract(''.join(['REL', 'ATOR']), 'FULANO')
+        d = Envolvido.extract(''.join(['RELA', 'TOR']), 'CICLANO')
+
+        self.assertIs(a.texto, b.texto)
+        self.assertIs(c.papel, d.papel)
+
+
+class TestTextDictionary(unittest.TestCase):
+    """Testa a atribuição de códigos aos textos frequentes"""
+
+    def setUp(self):
+        """Configura coleções mock"""
+        self.collection = MagicMock()
+        self.collection.name = 'movimentacao_textos'
+        self.counters = MagicMock()
+        self.seq = 0
+
+        def next_seq(*args, **kwargs):
+            self.seq += 1
+            return {'_id': 'movimentacao_textos', 'seq': self.seq}
+
+        self.counters.find_one_and_update.side_effect = next_seq
+        self.dictionary = TextDictionary(self.collection, self.counters, min_count=2)
+
+    def test_code_after_min_count(self):
+        """Testa que o texto só ganha código a partir de min_count aparições"""
+        self.assertIsNone(self.dictionary.code('Conclusos'))
+        self.assertEqual(self.dictionary.code('Conclusos'), 1)
+        self.assertEqual(self.dictionary.code('Conclusos'), 1)
+
+        self.collection.insert_one.assert_called_once_with({'_id': 1, 'texto': 'Conclusos'})
+
+    def test_load_existing_codes(self):
+        """Testa que códigos já gravados são usados desde a primeira aparição"""
+        self.collection.find.return_value = [{'_id': 7, 'texto': 'Conclusos'}]
+
+        self.assertEqual(self.dictionary.load(), 1)
+        self.assertEqual(self.dictionary.code('Conclusos'), 7)
+        self.counters.find_one_and_update.assert_not_called()
+
+    def test_concurrent_insert_uses_existing_code(self):
+        """Testa texto gravado por outro processo ao mesmo tempo"""
+        self.collection.insert_one.side_effect = DuplicateKeyError('dup')
+        self.collection.find_one.return_value = {'_id': 3, 'texto': 'Conclusos'}
+
+        self.dictionary.code('Conclusos')
+
+        self.assertEqual(self.dictionary.code('Conclusos'), 3)
+
+    def test_encode_movimentacoes(self):
+        """Testa troca de texto por texto_cod nas movimentações"""
+        self.dictionary.codes['Conclusos'] = 5
+        movimentacoes = [
+            {'data': '2020-01-01T00:00:00', 'texto': 'Conclusos'},
+            {'data': '2020-01-02T00:00:00', 'texto': 'Texto único do processo 123'},
+        ]
+
+        encoded, count = self.dictionary.encode(movimentacoes)
+
+        self.assertEqual(count, 1)
+        self.assertEqual(encoded[0], {'data': '2020-01-01T00:00:00', 'texto_cod': 5})
+        self.assertEqual(encoded[1], movimentacoes[1])
+        self.assertEqual(movimentacoes[0]['texto'], 'Conclusos')
+
+
+class TestTextDecoder(unittest.TestCase):
+    """Testa a tradução dos códigos na leitura"""
+
+    def test_decode(self):
+        """Testa que os códigos voltam a ser texto e ficam em cache"""
+        collection = MagicMock()
+        collection.find.return_value = [{'_id': 5, 'texto': 'Conclusos'}]
+        decoder = TextDecoder(collection)
+
+        documento = decoder.decode({
+            'movimentacoes': [{'data': 'd1', 'texto_cod': 5}, {'data': 'd2', 'texto': 'Outro'}]
+        })
+        decoder.decode({'movimentacoes': [{'texto_cod': 5}]})
+
+        self.assertEqual(documento['movimentacoes'][0], {'data': 'd1', 'texto': 'Conclusos'})
+        self.assertEqual(documento['movimentacoes'][1]['texto'], 'Outro')
+        collection.find.assert_called_once()
+
+    def test_decode_without_movimentacoes(self):
+        """Testa documento sem movimentações ou inexistente"""
+        decoder = TextDecoder(MagicMock())
+
+        self.assertIsNone(decoder.decode(None))
+        self.assertEqual(decoder.decode({'numero_processo': '1'}), {'numero_processo': '1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+"""
+Serviço HTTP de consulta aos processos armazenados no MongoDB.
+
+Rotas:
+- GET /processo/{numero}         -> documento do processo
+- GET /cnpj/{cnpj}/processos     -> processos encontrados na busca pelo CNPJ
+
+As movimentações só são retornadas com ``?movimentacoes=1``. As respostas
+ficam em um cache LRU com TTL em memória e levam ``ETag``, então clientes
+que repetem a consulta recebem ``304 Not Modified``.
+
+Uso:
+    python -m trf_scraper.api --port 8080 [--crawl-on-miss]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from trf_scraper.items import clean_cnpj, format_numero_processo
+from trf_scraper.textcodes import TEXT_COLLECTION, TextDecoder
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Cache LRU com expiração por TTL, seguro para uso entre threads."""
+
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < self.clock():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CrawlEnqueuer:
+    """
+    Agenda crawls dos processos e CNPJs não encontrados, sem repetir pendentes.
+
+    No máximo ``max_running`` subprocessos rodam ao mesmo tempo. As faltas que
+    chegam com todos ocupados esperam na fila e saem em lotes de até
+    ``batch_size`` (``-a processos=a,b,...``) quando um subprocesso termina.
+    """
+
+    def __init__(self, command=None, max_running=2, batch_size=50):
+        self.command = command or [sys.executable, '-m', 'scrapy', 'crawl', 'processo']
+        self.max_running = max_running
+        self.batch_size = batch_size
+        # (arg, valor) -> subprocesso que o busca, ou None enquanto na fila
+        self.pending = {}
+        self.running = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, valor, arg='processos'):
+        """Agenda ``scrapy crawl processo -a <arg>=<valor>`` (``processos`` ou ``cnpj``)."""
+        with self._lock:
+            self._reap()
+            if (arg, valor) in self.pending:
+                return False
+
+            self.pending[(arg, valor)] = None
+            self._start_batches()
+            return True
+
+    def drain(self):
+        """Recolhe subprocessos encerrados e inicia os lotes que couberem."""
+        with self._lock:
+            self._reap()
+            self._start_batches()
+
+    def _reap(self):
+        self.running = [proc for proc in self.running if proc.poll() is None]
+        for key, proc in list(self.pending.items()):
+            if proc is not None and proc.poll() is not None:
+                del self.pending[key]
+
+    def _start_batches(self):
+        while len(self.running) < self.max_running:
+            fila = [key for key, proc in self.pending.items() if proc is None]
+            if not fila:
+                return
+            arg = fila[0][0]
+            lote = [valor for tipo, valor in fila if tipo == arg][:self.batch_size]
+            proc = subprocess.Popen(
+                self.command + ['-a', f"{arg}={','.join(lote)}"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            self.running.append(proc)
+            for valor in lote:
+                self.pending[(arg, valor)] = proc
+            logger.info(f"Crawl agendado: {arg}={','.join(lote)}")
+
+
+class LookupService:
+    """Resolve as rotas da API; independente do servidor HTTP."""
+
+    def __init__(self, db, cache=None, enqueuer=None):
+        self.db = db
+        self.cache = cache or LRUCache()
+        self.enqueuer = enqueuer
+        self.decoder = TextDecoder(db[TEXT_COLLECTION])
+
+    def handle(self, path, if_none_match=None):
+        """Retorna ``(status, headers, body)`` para um GET em ``path``."""
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        segmentos = [unquote(s) for s in parts.path.split('/') if s]
+        com_movimentacoes = query.get('movimentacoes', ['0'])[0] in ('1', 'true')
+
+        if len(segmentos) == 2 and segmentos[0] == 'processo':
+            key = ('processo', segmentos[1], com_movimentacoes)
+            loader = lambda: self._find_processo(segmentos[1], com_movimentacoes)
+            miss = lambda: self._not_found(segmentos[1], 'processos')
+        elif len(segmentos) == 3 and segmentos[0] == 'cnpj' and segmentos[2] == 'processos':
+            key = ('cnpj', clean_cnpj(segmentos[1]), com_movimentacoes)
+            loader = lambda: self._find_by_cnpj(segmentos[1], com_movimentacoes)
+            miss = lambda: self._not_found(clean_cnpj(segmentos[1]), 'cnpj')
+        else:
+            return self._json(404, {'erro': 'rota não encontrada'})
+
+        cached = self.cache.get(key)
+        if cached is None:
+            data = loader()
+            if data is None:
+                return miss()
+            body = json.dumps(data, default=str, ensure_ascii=False).encode('utf-8')
+            cached = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+            self.cache.set(key, cached)
+
+        body, etag = cached
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'max-age={self.cache.ttl}',
+        }
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(',')]:
+            return 304, headers, b''
+
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+        return 200, headers, body
+
+    def _projection(self, com_movimentacoes):
+        projection = {'_id': False}
+        if not com_movimentacoes:
+            projection['movimentacoes'] = False
+        return projection
+
+    def _find_processo(self, numero, com_movimentacoes):
+        candidatos = list({numero, format_numero_processo(numero)})
+        processo = self.db.processos.find_one(
+            {'numero_processo': {'$in': candidatos}},
+            self._projection(com_movimentacoes)
+        )
+        return self.decoder.decode(processo)
+
+    def _find_by_cnpj(self, cnpj, com_movimentacoes):
+        processos = [
+            self.decoder.decode(processo)
+            for processo in self.db.processos.find(
+                {'cnpjs': clean_cnpj(cnpj)},
+                self._projection(com_movimentacoes)
+            )
+        ]
+        if not processos:
+            return None
+        return {'cnpj': clean_cnpj(cnpj), 'total': len(processos), 'processos': processos}
+
+    def _not_found(self, chave, arg):
+        """404, ou 202 com o crawl agendado pelo argumento do spider da rota."""
+        if self.enqueuer and chave.replace('-', '').replace('.', '').isdigit():
+            agendado = self.enqueuer.enqueue(chave, arg)
+            return self._json(202, {'status': 'crawl agendado' if agendado else 'crawl em andamento'})
+        return self._json(404, {'erro': 'não encontrado'})
+
+    def _json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        return status, {'Content-Type': 'application/json; charset=utf-8'}, body
+
+
+class LookupServer(ThreadingHTTPServer):
+    enqueuer = None
+
+    def service_actions(self):
+        # Chamado pelo serve_forever a cada volta: libera a fila de crawls
+        if self.enqueuer is not None:
+            self.enqueuer.drain()
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        status, headers, body = self.service.handle(
+            self.path,
+            if_none_match=self.headers.get('If-None-Match')
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def build_server(settings, host, port, crawl_on_miss=False):
+    from pymongo import MongoClient
+
+    client = MongoClient(settings.get('MONGO_URI'), maxPoolSize=50)
+    db = client[settings.get('MONGO_DATABASE')]
+
+    enqueuer = None
+    if crawl_on_miss:
+        enqueuer = CrawlEnqueuer(
+            max_running=settings.getint('API_CRAWL_MAX_RUNNING', 2),
+            batch_size=settings.getint('API_CRAWL_BATCH_SIZE', 50)
+        )
+    service = LookupService(
+        db,
+        cache=LRUCache(
+            maxsize=settings.getint('API_CACHE_SIZE', 1024),
+            ttl=settings.getint('API_CACHE_TTL', 60)
+        ),
+        enqueuer=enqueuer
+    )
+    handler = type('Handler', (LookupRequestHandler,), {'service': service})
+    server = LookupServer((host, port), handler)
+    server.enqueuer = enqueuer
+    return server
+
+
+def main(argv=None):
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+
+    parser = argparse.ArgumentParser(description="API de consulta aos processos do TRF5")
+    parser.add_argument('--host', default=settings.get('API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=settings.getint('API_PORT', 8080))
+    parser.add_argument(
+        '--crawl-on-miss',
+        action='store_true',
+        default=settings.getbool('API_CRAWL_ON_MISS'),
+        help="agenda um crawl quando o processo não está no banco"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.get('LOG_LEVEL'), format=settings.get('LOG_FORMAT'))
+    server = build_server(settings, args.host, args.port, args.crawl_on_miss)
+    logger.info(f"API escutando em http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Checkpoint de crawls interrompidos.
+
+Com ``-a checkpoint=logs/checkpoint`` o spider anota os processos já
+gravados (sinal ``item_scraped``, depois dos pipelines). Se o crawl cair,
+``-a resume=logs/checkpoint`` retoma: os processos já concluídos não são
+baixados de novo, nem os informados na entrada nem os das listas de CNPJ.
+
+O diretório guarda arquivos ordenados (``run_<n>.bin``), um por gravação
+periódica: números de processo em ordem crescente, codificados como
+diferenças em varint. Cada arquivo é escrito em um temporário, com fsync, e
+renomeado, então um crash nunca deixa um arquivo pela metade. Quando os
+arquivos passam de ``max_runs`` eles são intercalados em um só. No
+``state.json`` fica a posição na entrada: quantos processos do início da
+lista já estão concluídos.
+
+Para caber em 64 bits a chave de um número CNJ (20 dígitos) descarta os
+dígitos verificadores, que são calculados a partir dos outros 18; a chave
+continua única para números válidos. Em memória cada arquivo corresponde a
+um ``array('Q')`` ordenado (8 bytes por processo); só os processos ainda não
+gravados ficam em um ``set``, no máximo ``batch`` deles.
+"""
+import glob
+import heapq
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TRFCK1\n'
+MAX_KEY = 2 ** 64 - 1
+
+
+def key_of(numero):
+    """Chave inteira de um número de processo; None se não couber em 64 bits."""
+    numero = ''.join(filter(str.isdigit, str(numero or '')))
+    if not numero:
+        return None
+    if len(numero) == 20:
+        # NNNNNNN-DD.AAAA.J.TR.OOOO sem o DD
+        numero = numero[:7] + numero[9:]
+    key = int(numero)
+    return key if key <= MAX_KEY else None
+
+
+def encode_run(keys):
+    """Chaves ordenadas e sem repetição -> bytes (diferenças em varint)."""
+    out = bytearray(MAGIC)
+    anterior = 0
+    for key in keys:
+        delta = key - anterior
+        anterior = key
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_run(data):
+    if not data.startswith(MAGIC):
+        raise ValueError("arquivo de checkpoint inválido")
+    keys = array('Q')
+    atual = delta = shift = 0
+    for byte in memoryview(data)[len(MAGIC):]:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        atual += delta
+        keys.append(atual)
+        delta = shift = 0
+    return keys
+
+
+def write_atomic(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    def __init__(self, path, resume=False, batch=1000, interval=30, max_runs=16, clock=time.monotonic):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self.max_runs = max_runs
+        self.clock = clock
+        self.entrada = []
+        self.posicao = 0
+        # Um array ordenado por arquivo run_*.bin; o set guarda só o que ainda
+        # não foi gravado
+        self._done = []
+        self._pending = set()
+        self._last_flush = clock()
+        self._seq = 0
+
+        os.makedirs(path, exist_ok=True)
+        if resume:
+            self._load()
+        else:
+            # Execução nova: nem os arquivos nem a posição da anterior valem
+            for arquivo in self._runs() + [self._state_path()]:
+                if os.path.exists(arquivo):
+                    os.remove(arquivo)
+
+    @classmethod
+    def from_settings(cls, path, settings, resume=False):
+        return cls(
+            path,
+            resume=resume,
+            batch=settings.getint('CHECKPOINT_BATCH', 1000),
+            interval=settings.getfloat('CHECKPOINT_INTERVAL', 30),
+            max_runs=settings.getint('CHECKPOINT_MAX_RUNS', 16),
+        )
+
+    def _runs(self):
+        return sorted(glob.glob(os.path.join(self.path, 'run_*.bin')))
+
+    def _state_path(self):
+        return os.path.join(self.path, 'state.json')
+
+    def _load(self):
+        runs = []
+        for arquivo in self._runs():
+            with open(arquivo, 'rb') as f:
+                runs.append(decode_run(f.read()))
+            self._seq = max(self._seq, int(os.path.basename(arquivo)[4:-4]))
+        self._done = [self._merge(runs)] if runs else []
+
+        if os.path.exists(self._state_path()):
+            with open(self._state_path(), encoding='utf-8') as f:
+                self.posicao = json.load(f).get('posicao', 0)
+
+        logger.info(
+            f"Checkpoint {self.path}: {len(self)} processos concluídos, "
+            f"posição {self.posicao} na entrada"
+        )
+
+    @staticmethod
+    def _merge(runs):
+        merged = array('Q')
+        anterior = None
+        for key in heapq.merge(*runs):
+            if key != anterior:
+                merged.append(key)
+                anterior = key
+        return merged
+
+    def __len__(self):
+        return sum(len(run) for run in self._done) + len(self._pending)
+
+    def __contains__(self, numero):
+        key = key_of(numero)
+        return key is not None and self._has(key)
+
+    def _has(self, key):
+        if key in self._pending:
+            return True
+        for run in self._done:
+            i = bisect_left(run, key)
+            if i < len(run) and run[i] == key:
+                return True
+        return False
+
+    def mark(self, numeros):
+        """Anota processos concluídos; grava a cada ``batch`` ou ``interval`` segundos."""
+        for numero in numeros:
+            key = key_of(numero)
+            if key is not None and not self._has(key):
+                self._pending.add(key)
+        if len(self._pending) >= self.batch or self.clock() - self._last_flush >= self.interval:
+            self.flush()
+
+    def pending_input(self):
+        """Processos da entrada a partir da posição salva, sem os já concluídos."""
+        for processo in self.entrada[self.posicao:]:
+            if processo not in self:
+                yield processo
+
+    def _advance(self):
+        while self.posicao < len(self.entrada) and self.entrada[self.posicao] in self:
+            self.posicao += 1
+
+    def flush(self):
+        self._last_flush = self.clock()
+        if self._pending:
+            run = array('Q', sorted(self._pending))
+            self._seq += 1
+            write_atomic(os.path.join(self.path, f'run_{self._seq:06d}.bin'), encode_run(run))
+            self._done.append(run)
+            self._pending = set()
+            if len(self._runs()) > self.max_runs:
+                self.compact()
+
+        self._advance()
+        write_atomic(self._state_path(), json.dumps({
+            'posicao': self.posicao,
+            'concluidos': len(self),
+            'atualizado_em': time.time(),
+        }).encode('utf-8'))
+
+    def compact(self):
+        """Intercala todos os arquivos (e os arrays em memória) em um só."""
+        runs = self._runs()
+        merged = self._merge(self._done)
+        self._seq += 1
+        write_atomic(os.path.join(self.path, f'run_{self._seq:06d}.bin'), encode_run(merged))
+        for arquivo in runs:
+            os.remove(arquivo)
+        self._done = [merged]
+
+    def close(self):
+        self.flush()
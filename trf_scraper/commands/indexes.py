@@ -0,0 +1,63 @@
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from trf_scraper.indexes import declared_indexes, ensure_indexes, index_stats
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+    default_settings = {'LOG_ENABLED': False}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Cria os índices da coleção de processos e mostra tamanho e uso"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            '--texto',
+            action='store_true',
+            help="inclui o índice de texto em movimentacoes.texto"
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help="apenas mostra tamanho e uso dos índices, sem criar nada"
+        )
+
+    def run(self, args, opts):
+        try:
+            from pymongo import MongoClient
+            from pymongo.errors import PyMongoError
+        except ImportError:
+            raise UsageError("pymongo não instalado. Use: pip install pymongo")
+
+        client = MongoClient(
+            self.settings.get('MONGO_URI'),
+            serverSelectionTimeoutMS=5000
+        )
+        db = client[self.settings.get('MONGO_DATABASE')]
+        text_index = opts.texto or self.settings.getbool('MONGO_TEXT_INDEX')
+
+        try:
+            if not opts.stats:
+                criados = ensure_indexes(db.processos, text_index=text_index)
+                declarados = len(declared_indexes(text_index))
+                print(f"Índices declarados: {declarados} - criados agora: {len(criados)}")
+                for name in criados:
+                    print(f"  + {name}")
+
+            print(f"{'índice':<30} {'tamanho (KB)':>14} {'operações':>12}  desde")
+            for stat in index_stats(db):
+                print(
+                    f"{stat['name']:<30} {stat['size_bytes'] / 1024:>14.1f} "
+                    f"{stat['ops']:>12}  {stat['since'] or '-'}"
+                )
+        except PyMongoError as e:
+            self.exitcode = 1
+            print(f"Erro do MongoDB: {e}")
+        finally:
+            client.close()
@@ -0,0 +1,78 @@
+from scrapy.commands import ScrapyCommand
+
+from trf_scraper.runs import find_regressions, format_runs, load_jsonl_runs, load_mongo_runs
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    requires_crawler_process = False
+    default_settings = {'LOG_ENABLED': False}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Compara as últimas execuções e aponta quedas de vazão"
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            '-n',
+            dest='limit',
+            type=int,
+            default=10,
+            help="quantidade de execuções mostradas (padrão: 10)"
+        )
+        parser.add_argument(
+            '--spider',
+            default=None,
+            help="apenas execuções deste spider"
+        )
+        parser.add_argument(
+            '--arquivo',
+            action='store_true',
+            help="lê o arquivo local (RUN_REPORT_FILE) em vez do MongoDB"
+        )
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=0.2,
+            help="queda de páginas/s em relação à mediana que conta como regressão (padrão: 0.2)"
+        )
+
+    def run(self, args, opts):
+        runs = None
+        if not opts.arquivo:
+            runs = self._mongo_runs(opts)
+        if runs is None:
+            path = self.settings.get('RUN_REPORT_FILE', 'logs/runs.jsonl')
+            runs = load_jsonl_runs(path, spider=opts.spider)[-opts.limit:]
+
+        if not runs:
+            print("Nenhuma execução registrada.")
+            return
+
+        regressions = find_regressions(runs, tolerance=opts.tolerancia)
+        print(format_runs(runs, regressions))
+        if regressions:
+            self.exitcode = 1
+
+    def _mongo_runs(self, opts):
+        try:
+            from pymongo import MongoClient
+            from pymongo.errors import PyMongoError
+        except ImportError:
+            return None
+
+        client = MongoClient(
+            self.settings.get('MONGO_URI'),
+            serverSelectionTimeoutMS=5000
+        )
+        try:
+            collection = client[self.settings.get('MONGO_DATABASE')].runs
+            return load_mongo_runs(collection, spider=opts.spider, limit=opts.limit)
+        except PyMongoError as e:
+            print(f"MongoDB indisponível ({e}), lendo o arquivo local")
+            return None
+        finally:
+            client.close()
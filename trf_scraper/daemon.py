@@ -0,0 +1,464 @@
+"""
+Serviço residente de crawl (daemon).
+
+Cada ``scrapy crawl processo`` paga a partida do Scrapy/Twisted, os efeitos
+de importar as settings (diretório e arquivo de log), a conexão com o
+MongoDB e a verificação dos índices; numa consulta de poucos processos isso
+domina o tempo. O daemon mantém um crawler aberto (spider
+``processo_daemon``), com o pool do MongoDB do pipeline e o pool de conexões
+HTTP do downloader já aquecidos, e recebe jobs por HTTP (e, com
+``DAEMON_SOCKET``, também por socket Unix):
+
+- POST /jobs       -> ``{"processos": [...], "cnpj": "..."}``; responde 202
+                      com o id do job (``?wait=30`` espera até 30 s o fim)
+- GET /jobs/{id}   -> andamento do job e latência de cada processo gravado
+- GET /jobs        -> jobs recentes
+- GET /status      -> jobs, fila do scheduler e percentis da latência
+
+A latência vai da submissão do job até o item passar por todos os
+pipelines (sinal ``item_scraped``), ou seja, até estar gravado. Um job
+termina quando todas as suas requisições (inclusive retries, redirects e as
+páginas encontradas nas listas de CNPJ) foram processadas e os itens
+gravados ou descartados.
+
+Uso:
+    python -m trf_scraper.daemon --port 9420 [--socket logs/daemon.sock]
+
+    curl -X POST 'http://127.0.0.1:9420/jobs?wait=30' \\
+         -d '{"processos": ["0015648-78.1999.4.05.0000"]}'
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
+
+from trf_scraper.extensions import _engine_scheduler
+from trf_scraper.frontier import digits
+from trf_scraper.histogram import LogHistogram
+from trf_scraper.spiders.processo_spider import ProcessoSpider
+
+
+logger = logging.getLogger(__name__)
+
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+
+# Requisições que continuam outra já contada no job: o callback só roda
+# para a última da cadeia
+CONTINUATION_KEYS = ('retry_times', 'redirect_times', 'circuit_breaker_requeued', 'deferred_retry')
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+class Job:
+    def __init__(self, job_id, processos, cnpjs, started):
+        self.id = job_id
+        self.processos = processos
+        self.cnpjs = cnpjs
+        self.submetido_em = datetime.now()
+        self.started = started
+        self.finished = None
+        # Requisições ainda sem callback/errback e itens ainda nos pipelines
+        self.outstanding = 0
+        self.pending_items = 0
+        self.itens = []
+        self.erros = 0
+        self.waiters = []
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def to_dict(self, detalhes=True):
+        latencias = [latencia for _, latencia in self.itens]
+        data = {
+            'id': self.id,
+            'status': CONCLUIDO if self.done else EM_ANDAMENTO,
+            'submetido_em': self.submetido_em.isoformat(timespec='seconds'),
+            'processos': len(self.processos),
+            'cnpjs': self.cnpjs,
+            'itens': len(self.itens),
+            'erros': self.erros,
+            'pendentes': self.outstanding + self.pending_items,
+            'latencia': {
+                'primeiro_item': _round(min(latencias)) if latencias else None,
+                'ultimo_item': _round(max(latencias)) if latencias else None,
+                'total': _round(self.finished - self.started) if self.done else None,
+            },
+        }
+        if detalhes:
+            data['gravados'] = [
+                {'numero_processo': numero, 'latencia': _round(latencia)}
+                for numero, latencia in self.itens
+            ]
+        return data
+
+
+class JobTracker:
+    """Acompanha as requisições e itens de cada job e a latência até a gravação."""
+
+    def __init__(self, stats=None, max_jobs=1000, clock=time.monotonic):
+        self.stats = stats
+        self.max_jobs = max_jobs
+        self.clock = clock
+        self.jobs = OrderedDict()
+        self.latency = LogHistogram()
+
+    def create(self, processos=(), cnpjs=()):
+        job = Job(uuid.uuid4().hex[:12], list(processos), list(cnpjs), self.clock())
+        self.jobs[job.id] = job
+        self._inc('daemon/jobs_submitted')
+        self._evict()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _evict(self):
+        """Esquece os jobs concluídos mais antigos além de ``max_jobs``."""
+        excedentes = len(self.jobs) - self.max_jobs
+        for job_id in [j.id for j in self.jobs.values() if j.done][:max(excedentes, 0)]:
+            del self.jobs[job_id]
+
+    def _inc(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _job_of(self, request_or_response):
+        job = self.jobs.get(request_or_response.meta.get('job'))
+        return job if job is not None and not job.done else None
+
+    def request_scheduled(self, request, spider=None):
+        job = self._job_of(request)
+        if job is not None and not any(request.meta.get(k) for k in CONTINUATION_KEYS):
+            job.outstanding += 1
+
+    def request_dropped(self, request, spider=None):
+        # Descartada pelo scheduler: nem ela nem uma continuação vai ter callback
+        self.request_done(request)
+
+    def request_done(self, request, failed=False):
+        """Callback ou errback da requisição terminou."""
+        job = self._job_of(request)
+        if job is None or request.meta.get('job_concluido'):
+            return
+        request.meta['job_concluido'] = True
+        job.outstanding -= 1
+        if failed:
+            job.erros += 1
+        self.check(job)
+
+    def item_pending(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.done:
+            job.pending_items += 1
+
+    def item_scraped(self, item, response, spider=None):
+        job = self._job_of(response)
+        if job is None:
+            return
+        latencia = self.clock() - job.started
+        self.latency.record(latencia)
+        job.itens.append((item.get('numero_processo'), latencia))
+        job.pending_items -= 1
+        self.check(job)
+
+    def item_dropped(self, item, response, exception=None, spider=None):
+        self._item_lost(response)
+
+    def item_error(self, item, response, spider=None, failure=None):
+        self._item_lost(response, failed=True)
+
+    def _item_lost(self, response, failed=False):
+        job = self._job_of(response)
+        if job is None:
+            return
+        job.pending_items -= 1
+        if failed:
+            job.erros += 1
+        self.check(job)
+
+    def check(self, job):
+        if job.done or job.outstanding > 0 or job.pending_items > 0:
+            return
+        job.finished = self.clock()
+        self._inc('daemon/jobs_finished')
+        logger.info(
+            f"Job {job.id} concluído: {len(job.itens)} itens, {job.erros} erros "
+            f"em {job.finished - job.started:.2f}s"
+        )
+        waiters, job.waiters = job.waiters, []
+        for waiter in waiters:
+            waiter()
+        self._evict()
+
+    def summary(self):
+        em_andamento = sum(1 for job in self.jobs.values() if not job.done)
+        return {
+            'jobs': {EM_ANDAMENTO: em_andamento, CONCLUIDO: len(self.jobs) - em_andamento},
+            'latencia': self.latency.summary(),
+        }
+
+
+class JobsResource(Resource):
+    """Rotas HTTP do daemon; a submissão roda no reactor, junto do crawler."""
+
+    isLeaf = True
+
+    def __init__(self, spider, max_wait=300, reactor=None):
+        super().__init__()
+        self.spider = spider
+        self.max_wait = max_wait
+        self._reactor = reactor
+
+    @property
+    def reactor(self):
+        if self._reactor is None:
+            from twisted.internet import reactor
+            self._reactor = reactor
+        return self._reactor
+
+    def _segments(self, request):
+        return [s.decode('utf-8') for s in request.postpath if s]
+
+    def _json(self, request, status, data):
+        request.setResponseCode(status)
+        request.setHeader(b'Content-Type', b'application/json; charset=utf-8')
+        return json.dumps(data, default=str, ensure_ascii=False).encode('utf-8')
+
+    def render_GET(self, request):
+        segmentos = self._segments(request)
+        tracker = self.spider.tracker
+        if segmentos == ['status']:
+            return self._json(request, 200, self.spider.status())
+        if segmentos == ['jobs']:
+            jobs = [job.to_dict(detalhes=False) for job in reversed(tracker.jobs.values())]
+            return self._json(request, 200, {'total': len(jobs), 'jobs': jobs})
+        if len(segmentos) == 2 and segmentos[0] == 'jobs':
+            job = tracker.get(segmentos[1])
+            if job is None:
+                return self._json(request, 404, {'erro': 'job não encontrado'})
+            return self._json(request, 200, job.to_dict())
+        return self._json(request, 404, {'erro': 'rota não encontrada'})
+
+    def render_POST(self, request):
+        if self._segments(request) != ['jobs']:
+            return self._json(request, 404, {'erro': 'rota não encontrada'})
+        try:
+            processos, cnpjs = self._parse_job(request.content.read())
+            wait = min(float(request.args.get(b'wait', [b'0'])[0]), self.max_wait)
+        except ValueError as e:
+            return self._json(request, 400, {'erro': str(e)})
+
+        job = self.spider.submit(processos, cnpjs)
+        if wait <= 0 or job.done:
+            return self._json(request, 200 if job.done else 202, job.to_dict())
+        return self._wait(request, job, wait)
+
+    @staticmethod
+    def _as_list(value):
+        if isinstance(value, str):
+            value = value.split(',')
+        return [str(v).strip() for v in value or () if str(v).strip()]
+
+    def _parse_job(self, body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise ValueError("corpo deve ser JSON")
+        if not isinstance(data, dict):
+            raise ValueError("corpo deve ser um objeto JSON")
+
+        processos = self._as_list(data.get('processos'))
+        cnpjs = self._as_list(data.get('cnpj') or data.get('cnpjs'))
+        invalidos = [p for p in processos if not digits(p)]
+        if invalidos:
+            raise ValueError(f"número de processo inválido: {invalidos[0]}")
+        if not processos and not cnpjs:
+            raise ValueError("informe processos ou cnpj")
+        return processos, cnpjs
+
+    def _wait(self, request, job, timeout):
+        """Responde quando o job terminar ou após ``timeout`` segundos."""
+        respondido = []
+
+        def responder():
+            if respondido:
+                return
+            respondido.append(True)
+            if timer.active():
+                timer.cancel()
+            if responder in job.waiters:
+                job.waiters.remove(responder)
+            request.write(self._json(request, 200 if job.done else 202, job.to_dict()))
+            request.finish()
+
+        def desconectado(_):
+            # Cliente foi embora antes da resposta
+            respondido.append(True)
+            if timer.active():
+                timer.cancel()
+            if responder in job.waiters:
+                job.waiters.remove(responder)
+
+        timer = self.reactor.callLater(timeout, responder)
+        job.waiters.append(responder)
+        request.notifyFinish().addErrback(desconectado)
+        return NOT_DONE_YET
+
+
+class DaemonSpider(ProcessoSpider):
+    """Spider sempre aberto que recebe processos e CNPJs pela API do daemon."""
+
+    name = "processo_daemon"
+    requires_input = False
+    custom_settings = dict(
+        ProcessoSpider.custom_settings,
+        # Um job pode pedir de novo um processo (ou lista) de um job anterior
+        DUPEFILTER_CLASS='scrapy.dupefilters.BaseDupeFilter',
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tracker = None
+        self.listeners = []
+        self.started_at = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.tracker = JobTracker(max_jobs=crawler.settings.getint('DAEMON_MAX_JOBS', 1000))
+        tracker = spider.tracker
+        crawler.signals.connect(tracker.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(tracker.request_dropped, signal=signals.request_dropped)
+        crawler.signals.connect(tracker.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(tracker.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(tracker.item_error, signal=signals.item_error)
+        crawler.signals.connect(spider.daemon_opened, signal=signals.spider_opened)
+        crawler.signals.connect(spider.daemon_idle, signal=signals.spider_idle)
+        return spider
+
+    def daemon_opened(self, spider):
+        from twisted.internet import reactor
+
+        self.started_at = time.time()
+        # crawler.stats só existe depois que o crawl começa
+        self.tracker.stats = self.crawler.stats
+        settings = self.settings
+        site = Site(JobsResource(self, max_wait=settings.getfloat('DAEMON_MAX_WAIT', 300)))
+        host = settings.get('DAEMON_HOST', '127.0.0.1')
+        port = settings.getint('DAEMON_PORT', 9420)
+        self.listeners.append(reactor.listenTCP(port, site, interface=host))
+        self.logger.info(f"Daemon aceitando jobs em http://{host}:{port}/jobs")
+
+        socket_path = settings.get('DAEMON_SOCKET')
+        if socket_path:
+            if os.path.exists(socket_path):
+                # Socket de uma execução anterior que não foi encerrada
+                os.remove(socket_path)
+            self.listeners.append(reactor.listenUNIX(socket_path, site))
+            self.logger.info(f"Daemon aceitando jobs no socket {socket_path}")
+
+    def daemon_idle(self, spider):
+        """Sem jobs em andamento: continua aberto esperando os próximos."""
+        raise DontCloseSpider
+
+    def submit(self, processos=(), cnpjs=()):
+        """Agenda um job no crawler aberto e o retorna."""
+        processos = list(dict.fromkeys(p.strip() for p in processos if p.strip()))
+        cnpjs = list(dict.fromkeys(c.strip() for c in cnpjs if c.strip()))
+        job = self.tracker.create(processos, cnpjs)
+
+        requests = [self._processo_request(p, fonte='daemon') for p in processos]
+        for cnpj in cnpjs:
+            requests.extend(self._cnpj_requests(cnpj))
+        for request in requests:
+            request.meta['job'] = job.id
+            self.crawler.engine.crawl(request)
+
+        self.logger.info(f"Job {job.id}: {len(processos)} processos, {len(cnpjs)} CNPJs")
+        # CNPJ resolvido pelo índice sem processos: nada a esperar
+        self.tracker.check(job)
+        return job
+
+    def status(self):
+        scheduler = _engine_scheduler(self.crawler.engine)
+        data = self.tracker.summary()
+        data.update({
+            'uptime': round(time.time() - self.started_at, 1) if self.started_at else None,
+            'fila': len(scheduler) if scheduler is not None else None,
+            'itens': self.crawler.stats.get_value('item_scraped_count', 0),
+        })
+        return data
+
+    def _job_output(self, response, output):
+        """Repassa o job às requisições filhas e conta os itens ainda nos pipelines."""
+        job_id = response.meta.get('job')
+        try:
+            for result in output or ():
+                if job_id:
+                    if isinstance(result, scrapy.Request):
+                        result.meta.setdefault('job', job_id)
+                    else:
+                        self.tracker.item_pending(job_id)
+                yield result
+        finally:
+            self.tracker.request_done(response.request)
+
+    def parse_form_cnpj(self, response):
+        return self._job_output(response, super().parse_form_cnpj(response))
+
+    def parse_lista_processos(self, response, cnpj=None):
+        return self._job_output(response, super().parse_lista_processos(response, cnpj=cnpj))
+
+    def parse_processo(self, response, cnpj=None):
+        return self._job_output(response, super().parse_processo(response, cnpj=cnpj))
+
+    def handle_error(self, failure):
+        super().handle_error(failure)
+        # Requisição adiada pelo BackoffRetryMiddleware: a cópia continua o job
+        if not failure.request.meta.get('retry_deferred'):
+            self.tracker.request_done(failure.request, failed=True)
+
+    def closed(self, reason):
+        super().closed(reason)
+        for listener in self.listeners:
+            listener.stopListening()
+        self.crawler.stats.set_value('daemon/latency', self.tracker.latency.summary())
+
+
+def main(argv=None):
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+
+    parser = argparse.ArgumentParser(description="Serviço residente de crawl do TRF5")
+    parser.add_argument('--host', default=settings.get('DAEMON_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=settings.getint('DAEMON_PORT', 9420))
+    parser.add_argument('--socket', default=settings.get('DAEMON_SOCKET'), help="socket Unix adicional")
+    args = parser.parse_args(argv)
+
+    settings.set('DAEMON_HOST', args.host, priority='cmdline')
+    settings.set('DAEMON_PORT', args.port, priority='cmdline')
+    settings.set('DAEMON_SOCKET', args.socket, priority='cmdline')
+
+    process = CrawlerProcess(settings)
+    process.crawl(DaemonSpider)
+    process.start()
+
+
+if __name__ == '__main__':
+    main()
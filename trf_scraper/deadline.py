@@ -0,0 +1,241 @@
+"""
+Crawl com prazo (``-a deadline=...``).
+
+O prazo pode ser uma duração (``2h``, ``90m``, ``1h30m``), um horário
+(``06:00``, o próximo) ou uma data ISO (``2024-01-02T06:00``). Com prazo,
+o spider usa ``prioridade=freshness`` se outra não for informada, para que
+o que couber na janela seja o de maior valor.
+
+``CrawlDeadline`` acompanha a vazão real (itens/s nas últimas amostras) e a
+cada ``DEADLINE_CHECK_INTERVAL`` segundos estima quantos processos ainda
+cabem no prazo. Se a previsão passa do prazo, emite ``behind_schedule``: o
+``AdaptiveConcurrencyMiddleware`` sobe a concorrência dos slots saudáveis,
+sem passar de ``ADAPTIVE_CONCURRENCY_MAX`` (o rate limit por host continua
+valendo). No prazo, o spider é encerrado com o motivo ``deadline`` e os
+processos não concluídos são gravados em ``logs/restante_<spider>_<data>.txt``,
+pronto para ``-a arquivo_processos=`` na próxima execução.
+"""
+import logging
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from trf_scraper.journal import numero_from_request
+from trf_scraper.pipelines import persists_items, was_stored
+
+
+logger = logging.getLogger(__name__)
+
+# Sinal: a previsão de término passou do prazo
+behind_schedule = object()
+
+DURATION_RE = re.compile(r'^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$')
+CLOCK_RE = re.compile(r'^(\d{1,2}):(\d{2})$')
+
+
+def digits(value):
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+def parse_deadline(value, now=None):
+    """Prazo em segundos desde a época; None se não informado."""
+    if not value:
+        return None
+    value = str(value).strip()
+    now = time.time() if now is None else now
+
+    match = DURATION_RE.match(value)
+    if match and any(match.groups()):
+        horas, minutos, segundos = (int(g or 0) for g in match.groups())
+        return now + horas * 3600 + minutos * 60 + segundos
+
+    match = CLOCK_RE.match(value)
+    if match:
+        hoje = datetime.fromtimestamp(now)
+        prazo = hoje.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+        if prazo.timestamp() <= now:
+            prazo += timedelta(days=1)
+        return prazo.timestamp()
+
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Prazo inválido: {value!r} (use 2h, 90m, 06:00 ou uma data ISO)")
+
+
+class CrawlDeadline:
+    def __init__(self, crawler, interval=30, window=10, output_dir='logs', clock=time.time):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.output_dir = output_dir
+        self.clock = clock
+        self.samples = deque(maxlen=window + 1)
+        self.deadline = None
+        self.spider = None
+        self.task = None
+        self.timer = None
+        self.closing = False
+        # Com o MongoDBPipeline ativo, só o que ele gravou conta como concluído
+        self.require_stored = False
+        self.done = set()
+        self.discovered = {}
+        self.cnpjs_done = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DEADLINE_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            interval=settings.getfloat('DEADLINE_CHECK_INTERVAL', 30),
+            output_dir=settings.get('DEADLINE_DIR', 'logs')
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        self.deadline = getattr(spider, 'deadline', None) or parse_deadline(
+            self.crawler.settings.get('DEADLINE')
+        )
+        if self.deadline is None:
+            return
+
+        # Só com prazo vale acompanhar os processos (no daemon, os conjuntos
+        # cresceriam sem limite)
+        self.require_stored = persists_items(self.crawler.settings)
+        self.crawler.signals.connect(self.request_scheduled, signal=signals.request_scheduled)
+        self.crawler.signals.connect(self.response_received, signal=signals.response_received)
+        self.crawler.signals.connect(self.item_scraped, signal=signals.item_scraped)
+
+        restante = self.deadline - self.clock()
+        spider.logger.info(
+            f"Prazo do crawl: {datetime.fromtimestamp(self.deadline):%Y-%m-%d %H:%M:%S} "
+            f"({restante / 60:.0f} min)"
+        )
+        from twisted.internet import reactor
+
+        self.sample()
+        self.task = task.LoopingCall(self.check)
+        self.task.start(self.interval, now=False)
+        self.timer = reactor.callLater(max(restante, 0), self.expire)
+
+    def request_scheduled(self, request, spider):
+        numero = digits(numero_from_request(request))
+        if numero:
+            self.discovered.setdefault(numero, None)
+        if request.meta.get('fonte') == 'indice_partes' and request.cb_kwargs.get('cnpj'):
+            # CNPJ resolvido pelo índice: a lista já está toda agendada
+            self.cnpjs_done.add(digits(request.cb_kwargs['cnpj']))
+
+    def response_received(self, response, request, spider):
+        if getattr(request.callback, '__name__', None) == 'parse_lista_processos':
+            self.cnpjs_done.add(digits(request.cb_kwargs.get('cnpj')))
+
+    def item_scraped(self, item, response, spider):
+        if self.require_stored and not was_stored(item):
+            # Falha no MongoDB: o processo continua no arquivo de restante
+            return
+        for numero in (item.get('numero_processo'), response.meta.get('numero_busca')):
+            if digits(numero):
+                self.done.add(digits(numero))
+
+    def sample(self):
+        self.samples.append((self.clock(), self.stats.get_value('item_scraped_count', 0)))
+
+    def rate(self):
+        """Itens por segundo nas últimas amostras."""
+        if len(self.samples) < 2:
+            return 0.0
+        (t0, itens0), (t1, itens1) = self.samples[0], self.samples[-1]
+        return (itens1 - itens0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def pending(self):
+        """Processos não concluídos: primeiro os da entrada, na ordem dela."""
+        entrada = list(dict.fromkeys(
+            digits(p) for p in getattr(self.spider, 'processos', None) or () if digits(p)
+        ))
+        vistos = set(entrada)
+        pendentes = [n for n in entrada if n not in self.done]
+        pendentes += [n for n in self.discovered if n not in self.done and n not in vistos]
+        return pendentes
+
+    def pending_cnpjs(self):
+        cnpjs = getattr(self.spider, 'cnpjs', None) or []
+        return [c for c in cnpjs if digits(c) not in self.cnpjs_done]
+
+    def in_flight(self):
+        downloader = getattr(self.crawler.engine, 'downloader', None)
+        return len(getattr(downloader, 'active', ()))
+
+    def expire(self):
+        if self.closing:
+            return
+        self.closing = True
+        self.spider.logger.warning("Encerrando o crawl para terminar dentro do prazo")
+        if self.task and self.task.running:
+            self.task.stop()
+        self.crawler.engine.close_spider(self.spider, 'deadline')
+
+    def check(self):
+        self.sample()
+        agora = self.clock()
+        vazao = self.rate()
+        # As requisições já no downloader terminam depois do close_spider:
+        # encerra antes se elas não couberem no tempo que falta
+        if vazao > 0 and agora + self.in_flight() / vazao >= self.deadline:
+            self.expire()
+            return
+
+        restantes = len(self.pending())
+        cabem = int(vazao * (self.deadline - agora))
+        self.stats.set_value('deadline/remaining', restantes)
+        self.stats.set_value('deadline/items_per_second', round(vazao, 3))
+        self.stats.set_value('deadline/projected_unfinished', max(restantes - cabem, 0))
+
+        if restantes > cabem:
+            self.spider.logger.info(
+                f"Prazo: {restantes} processos pendentes, cabem ~{cabem} a {vazao:.2f} itens/s; "
+                f"aumentando a concorrência"
+            )
+            self.stats.inc_value('deadline/behind_schedule')
+            self.crawler.signals.send_catch_log(behind_schedule, spider=self.spider)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        if self.timer and self.timer.active():
+            self.timer.cancel()
+        if reason == 'deadline':
+            self.write_remainder(spider)
+
+    def write_remainder(self, spider):
+        pendentes = self.pending()
+        cnpjs = self.pending_cnpjs()
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"restante_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# Processos não concluídos até o prazo ({len(pendentes)})\n")
+            if cnpjs:
+                f.write(f"# CNPJs sem lista recebida: -a cnpj={','.join(cnpjs)}\n")
+            for numero in pendentes:
+                f.write(numero + '\n')
+
+        self.stats.set_value('deadline/unfinished', len(pendentes))
+        spider.logger.warning(
+            f"{len(pendentes)} processos não concluídos gravados em {path} "
+            f"(use -a arquivo_processos={path})"
+        )
+        if cnpjs:
+            spider.logger.warning(f"CNPJs sem lista recebida: {','.join(cnpjs)}")
+        return path
@@ -0,0 +1,75 @@
+"""
+Download handler com pool de conexões persistentes instrumentado.
+
+Mantém conexões keep-alive por host dimensionadas para a concorrência do
+crawl e publica nas estatísticas quantas conexões (e handshakes TLS)
+foram abertas e quantas requisições reaproveitaram uma conexão.
+"""
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from twisted.web.client import HTTPConnectionPool
+
+
+def _to_str(value):
+    return value.decode('ascii', 'replace') if isinstance(value, bytes) else str(value)
+
+
+class CountingConnectionPool(HTTPConnectionPool):
+    """Pool do Twisted que conta conexões pedidas e conexões novas."""
+
+    def __init__(self, reactor, stats, persistent=True):
+        super().__init__(reactor, persistent=persistent)
+        self.stats = stats
+        self.requested = 0
+        self.opened = 0
+
+    def getConnection(self, key, endpoint):
+        self.requested += 1
+        d = super().getConnection(key, endpoint)
+        self.stats.set_value('connections/reused', self.requested - self.opened)
+        self.stats.set_value(
+            'connections/reuse_ratio',
+            round((self.requested - self.opened) / self.requested, 3)
+        )
+        return d
+
+    def _newConnection(self, key, endpoint):
+        self.opened += 1
+        self.stats.inc_value('connections/opened')
+
+        try:
+            scheme, host, _port = key
+        except (TypeError, ValueError):
+            scheme, host = None, None
+        if host is not None:
+            self.stats.inc_value(f'connections/opened/{_to_str(host)}')
+        if _to_str(scheme) == 'https':
+            self.stats.inc_value('connections/tls_handshakes')
+
+        return super()._newConnection(key, endpoint)
+
+
+class PersistentHTTPDownloadHandler(HTTP11DownloadHandler):
+    @classmethod
+    def from_crawler(cls, crawler):
+        handler = super().from_crawler(crawler)
+        handler._install_pool(crawler)
+        return handler
+
+    def _install_pool(self, crawler):
+        from twisted.internet import reactor
+
+        settings = crawler.settings
+        old_pool = self._pool
+
+        pool = CountingConnectionPool(reactor, crawler.stats, persistent=True)
+        pool._factory = old_pool._factory
+        pool.maxPersistentPerHost = settings.getint(
+            'CONNECTION_POOL_SIZE',
+            max(
+                settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'),
+                settings.getint('CONCURRENT_REQUESTS')
+            )
+        )
+        pool.cachedConnectionTimeout = settings.getint('CONNECTION_IDLE_TIMEOUT', 240)
+
+        self._pool = pool
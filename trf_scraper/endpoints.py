@@ -0,0 +1,28 @@
+"""
+Classificação das requisições feitas ao site do TRF5.
+
+Cache, métricas e controle de concorrência tratam de forma diferente a
+página de um processo, o formulário de busca e a lista de processos de
+um CNPJ.
+"""
+from urllib.parse import urlsplit
+
+
+PROCESSO = 'processo'
+CNPJ_FORM = 'cnpj_form'
+CNPJ_LISTA = 'cnpj_lista'
+OUTRO = 'outro'
+
+ENDPOINT_TYPES = (PROCESSO, CNPJ_FORM, CNPJ_LISTA, OUTRO)
+
+
+def endpoint_type(request):
+    path = urlsplit(request.url).path.rstrip('/')
+
+    if path.startswith('/processo/'):
+        return PROCESSO
+    if path.endswith('/cp.do'):
+        return CNPJ_LISTA if request.method == 'POST' else OUTRO
+    if path == '/cp':
+        return CNPJ_FORM
+    return OUTRO
@@ -0,0 +1,220 @@
+"""
+Extensões do projeto.
+
+MetricsServer: servidor HTTP embutido no crawler com as métricas do crawl
+em andamento, sem precisar acompanhar o arquivo de log.
+
+- GET /metrics   -> texto no formato OpenMetrics/Prometheus
+- GET /progress  -> visão de progresso em JSON (taxas, fila, ETA)
+
+Ativação: ``METRICS_ENABLED = True`` (ou ``-s METRICS_ENABLED=1``).
+"""
+import json
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+
+def _engine_scheduler(engine):
+    # Scrapy >= 2.13 guarda o slot do engine em ``_slot``
+    slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+    return getattr(slot, 'scheduler', None)
+
+
+class _TextResource(Resource):
+    isLeaf = True
+
+    def __init__(self, render, content_type):
+        super().__init__()
+        self._render = render
+        self.content_type = content_type
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', self.content_type)
+        return self._render()
+
+
+class MetricsServer:
+    """Publica estatísticas, taxas e ETA do crawl via HTTP."""
+
+    def __init__(self, crawler, host='127.0.0.1', port=9410, interval=5, window=12):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.samples = deque(maxlen=window + 1)
+        self.started_at = None
+        self.spider = None
+        self.listener = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            host=settings.get('METRICS_HOST', '127.0.0.1'),
+            port=settings.getint('METRICS_PORT', 9410),
+            interval=settings.getfloat('METRICS_INTERVAL', 5),
+            window=settings.getint('METRICS_WINDOW', 12)
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import reactor
+
+        self.spider = spider
+        self.started_at = time.time()
+        self.sample()
+
+        root = Resource()
+        root.putChild(b'metrics', _TextResource(
+            self.render_metrics,
+            b'application/openmetrics-text; version=1.0.0; charset=utf-8'
+        ))
+        root.putChild(b'progress', _TextResource(
+            self.render_progress,
+            b'application/json; charset=utf-8'
+        ))
+        self.listener = reactor.listenTCP(self.port, Site(root), interface=self.host)
+        spider.logger.info(f"Métricas disponíveis em http://{self.host}:{self.port}/metrics")
+
+        self.task = task.LoopingCall(self.sample)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        if self.listener:
+            return self.listener.stopListening()
+
+    def sample(self, now=None):
+        """Guarda uma amostra dos contadores para o cálculo das taxas."""
+        self.samples.append((
+            now if now is not None else time.time(),
+            self.stats.get_value('item_scraped_count', 0),
+            self.stats.get_value('response_received_count', 0),
+        ))
+
+    def _rates(self):
+        if len(self.samples) < 2:
+            return 0.0, 0.0
+        (t0, items0, pages0), (t1, items1, pages1) = self.samples[0], self.samples[-1]
+        elapsed = t1 - t0
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (items1 - items0) / elapsed, (pages1 - pages0) / elapsed
+
+    def _queue_depth(self):
+        engine = getattr(self.crawler, 'engine', None)
+        scheduler = _engine_scheduler(engine) if engine else None
+        try:
+            return len(scheduler) if scheduler is not None else 0
+        except TypeError:
+            return 0
+
+    def _in_flight(self):
+        engine = getattr(self.crawler, 'engine', None)
+        downloader = getattr(engine, 'downloader', None)
+        return len(getattr(downloader, 'active', ()))
+
+    def _input_total(self):
+        processos = getattr(self.spider, 'processos', None) or []
+        return len(processos) + self.stats.get_value('input/discovered', 0)
+
+    def snapshot(self):
+        get = self.stats.get_value
+        items_rate, pages_rate = self._rates()
+
+        pages = get('response_received_count', 0)
+        requests = get('downloader/request_count', 0)
+        exceptions = get('downloader/exception_count', 0)
+        server_errors = sum(
+            get(f'downloader/response_status_count/{code}', 0)
+            for code in (429, 500, 502, 503, 504)
+        )
+
+        writes = get('mongodb/writes', 0)
+        write_time = get('mongodb/write_time', 0.0)
+
+        total = self._input_total()
+        done = (
+            get('item_scraped_count', 0)
+            + get('validation/invalid_numero_processo', 0)
+            + get('processo/pagina_erro', 0)
+        )
+        remaining = max(total - done, 0)
+        if not remaining:
+            eta = 0.0
+        elif items_rate > 0:
+            eta = remaining / items_rate
+        else:
+            eta = None
+
+        return {
+            'uptime': round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            'items_scraped': get('item_scraped_count', 0),
+            'pages_crawled': pages,
+            'items_per_second': round(items_rate, 3),
+            'pages_per_second': round(pages_rate, 3),
+            'queue_depth': self._queue_depth(),
+            'in_flight': self._in_flight(),
+            'mongodb_writes': writes,
+            'mongodb_write_latency_avg': round(write_time / writes, 4) if writes else None,
+            'mongodb_write_latency_max': get('mongodb/write_time_max'),
+            'mongodb_errors': get('mongodb/errors', 0),
+            'download_exceptions': exceptions,
+            'http_errors': server_errors,
+            'error_rate': round((exceptions + server_errors) / requests, 4) if requests else 0.0,
+            'input_total': total,
+            'input_done': min(done, total) if total else done,
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+        }
+
+    def render_progress(self):
+        return json.dumps(self.snapshot()).encode('utf-8')
+
+    def render_metrics(self):
+        data = self.snapshot()
+        linhas = []
+
+        def metric(name, kind, help_text, value):
+            if value is None:
+                return
+            linhas.append(f'# TYPE trf5_{name} {kind}')
+            linhas.append(f'# HELP trf5_{name} {help_text}')
+            suffix = '_total' if kind == 'counter' else ''
+            linhas.append(f'trf5_{name}{suffix} {value}')
+
+        metric('items_scraped', 'counter', 'Itens extraídos.', data['items_scraped'])
+        metric('pages_crawled', 'counter', 'Respostas recebidas.', data['pages_crawled'])
+        metric('items_per_second', 'gauge', 'Itens por segundo na janela recente.', data['items_per_second'])
+        metric('pages_per_second', 'gauge', 'Páginas por segundo na janela recente.', data['pages_per_second'])
+        metric('queue_depth', 'gauge', 'Requisições aguardando no scheduler.', data['queue_depth'])
+        metric('in_flight', 'gauge', 'Requisições em download.', data['in_flight'])
+        metric('mongodb_writes', 'counter', 'Escritas no MongoDB.', data['mongodb_writes'])
+        metric('mongodb_write_latency_avg_seconds', 'gauge', 'Latência média de escrita no MongoDB.',
+               data['mongodb_write_latency_avg'])
+        metric('mongodb_write_latency_max_seconds', 'gauge', 'Maior latência de escrita no MongoDB.',
+               data['mongodb_write_latency_max'])
+        metric('mongodb_errors', 'counter', 'Erros de escrita no MongoDB.', data['mongodb_errors'])
+        metric('download_exceptions', 'counter', 'Exceções de download.', data['download_exceptions'])
+        metric('http_errors', 'counter', 'Respostas 429/5xx.', data['http_errors'])
+        metric('error_rate', 'gauge', 'Fração de requisições com erro.', data['error_rate'])
+        metric('input_total', 'gauge', 'Processos a coletar (entrada + descobertos).', data['input_total'])
+        metric('input_done', 'gauge', 'Processos já resolvidos.', data['input_done'])
+        metric('eta_seconds', 'gauge', 'Estimativa de tempo restante.', data['eta_seconds'])
+
+        linhas.append('# EOF')
+        return ('\n'.join(linhas) + '\n').encode('utf-8')
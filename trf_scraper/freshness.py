@@ -0,0 +1,119 @@
+"""
+Prioridade por frescor: primeiro os processos com mais chance de ter
+movimentações novas.
+
+Com ``-a prioridade=freshness`` o spider consulta os documentos já gravados
+e estima, para cada processo, a taxa de mudança (mudanças por dia) a partir
+de:
+
+- histórico: ``change_count`` ao longo do tempo entre ``created_at`` e a
+  última verificação (``checked_at``), com uma mudança a cada
+  ``PRIOR_DAYS`` dias como ponto de partida para processos pouco observados;
+- atividade: quanto mais recente a última movimentação, mais ativo o
+  processo (``1 / (dias desde a última movimentação + RECENCY_DAYS)``).
+
+A taxa ``lam`` é a média das duas. Supondo mudanças como um processo de
+Poisson, a chance de haver novidade desde a última verificação, ``t`` dias
+atrás, é ``1 - exp(-lam * t)``. Processos que nunca foram gravados têm
+nota 1. A nota vira a prioridade da requisição no Scheduler, e com
+``-a orcamento=N`` só os N processos de maior nota são buscados.
+"""
+import math
+from datetime import datetime, timezone
+
+from trf_scraper.items import format_numero_processo
+
+
+PRIOR_DAYS = 30
+RECENCY_DAYS = 7
+BATCH_SIZE = 1000
+PRIORITY_LEVELS = 100
+
+
+def digits(value):
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+def _as_datetime(value):
+    """Datas dos documentos: datetime do pymongo ou ISO das movimentações."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value if isinstance(value, datetime) else None
+
+
+def _days(delta):
+    return max(delta.total_seconds() / 86400, 0.0)
+
+
+def change_rate(doc, now):
+    """Taxa estimada de mudanças por dia de um processo gravado."""
+    created = _as_datetime(doc.get('created_at'))
+    checked = _as_datetime(doc.get('checked_at')) or _as_datetime(doc.get('updated_at'))
+    observado = _days(checked - created) if created and checked else 0.0
+    # A primeira gravação conta em change_count, mas não é uma mudança
+    mudancas = max((doc.get('change_count') or 1) - 1, 0)
+    historico = (mudancas + 1) / (observado + PRIOR_DAYS)
+
+    ultima = _as_datetime(doc.get('ultima_movimentacao'))
+    if ultima is None:
+        return historico
+    atividade = 1 / (_days(now - ultima) + RECENCY_DAYS)
+    return (historico + atividade) / 2
+
+
+def freshness_score(doc, now):
+    """Chance (0 a 1) de o processo ter mudado desde a última verificação."""
+    if not doc:
+        return 1.0
+    checked = _as_datetime(doc.get('checked_at')) or _as_datetime(doc.get('updated_at'))
+    if checked is None:
+        return 1.0
+    return 1 - math.exp(-change_rate(doc, now) * _days(now - checked))
+
+
+def score_priority(score):
+    """Nota -> prioridade do Scrapy (maior sai antes)."""
+    return 1 + round(score * PRIORITY_LEVELS)
+
+
+class FreshnessScorer:
+    PROJECTION = {
+        'numero_processo': 1,
+        'change_count': 1,
+        'created_at': 1,
+        'checked_at': 1,
+        'updated_at': 1,
+        # Datas em ISO: a maior string é a movimentação mais recente
+        'ultima_movimentacao': {'$max': '$movimentacoes.data'},
+    }
+
+    def __init__(self, collection, clock=None):
+        self.collection = collection
+        self.clock = clock or (lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    def _documents(self, numeros):
+        formatados = [format_numero_processo(n) for n in numeros]
+        for i in range(0, len(formatados), BATCH_SIZE):
+            lote = formatados[i:i + BATCH_SIZE]
+            yield from self.collection.aggregate([
+                {'$match': {'numero_processo': {'$in': lote}}},
+                {'$project': self.PROJECTION},
+            ])
+
+    def scores(self, numeros):
+        """``{dígitos: nota}`` para cada número informado."""
+        numeros = list(dict.fromkeys(digits(n) for n in numeros if digits(n)))
+        agora = self.clock()
+        docs = {digits(doc.get('numero_processo')): doc for doc in self._documents(numeros)}
+        return {n: freshness_score(docs.get(n), agora) for n in numeros}
+
+    def rank(self, numeros):
+        """Números em ordem decrescente de nota, como ``(numero, nota)``."""
+        scores = self.scores(numeros)
+        ordenados = sorted(numeros, key=lambda n: scores.get(digits(n), 1.0), reverse=True)
+        return [(n, scores.get(digits(n), 1.0)) for n in ordenados]
@@ -0,0 +1,204 @@
+"""
+Fila de trabalho compartilhada entre workers (frontier).
+
+Os números de processo ficam em um armazenamento durável e cada worker
+(``scrapy crawl processo -a frontier=logs/frontier.sqlite``) pega lotes
+com ``lease``. Um número arrendado fica invisível para os outros workers
+até ``ack`` (concluído), ``nack`` (volta para a fila, com atraso) ou até o
+prazo do arrendamento vencer, o que cobre workers que morreram. Workers
+podem entrar e sair durante o crawl: quem fica ocioso pede mais.
+
+``Frontier`` define a interface; ``SqliteFrontier`` implementa com SQLite
+em modo WAL, suficiente para vários processos na mesma máquina. Outra
+implementação (Redis, por exemplo) entra por ``FRONTIER_CLASS``.
+
+Para alimentar e acompanhar a fila:
+
+    python -m trf_scraper.frontier add processos.txt --db logs/frontier.sqlite
+    python -m trf_scraper.frontier status --db logs/frontier.sqlite
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import time
+
+
+PENDENTE = 'pendente'
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+FALHOU = 'falhou'
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def digits(value):
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+class Frontier:
+    """Interface da fila de trabalho."""
+
+    def add(self, numeros):
+        """Enfileira números ainda não conhecidos; retorna quantos entraram."""
+        raise NotImplementedError
+
+    def lease(self, worker, limit, timeout):
+        """Arrenda até ``limit`` números por ``timeout`` segundos."""
+        raise NotImplementedError
+
+    def ack(self, numeros):
+        raise NotImplementedError
+
+    def nack(self, numeros, delay=0):
+        raise NotImplementedError
+
+    def has_work(self):
+        """Se ainda há números pendentes ou arrendados (por qualquer worker)."""
+        raise NotImplementedError
+
+    def counts(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SqliteFrontier(Frontier):
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS frontier (
+            numero TEXT PRIMARY KEY,
+            estado TEXT NOT NULL,
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            disponivel_em REAL NOT NULL DEFAULT 0,
+            lease_ate REAL,
+            worker TEXT,
+            atualizado_em REAL
+        );
+        CREATE INDEX IF NOT EXISTS frontier_estado ON frontier (estado, disponivel_em);
+    '''
+
+    def __init__(self, path, max_attempts=5, clock=time.time):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def from_settings(cls, path, settings):
+        return cls(path, max_attempts=settings.getint('FRONTIER_MAX_ATTEMPTS', 5))
+
+    def add(self, numeros):
+        agora = self.clock()
+        linhas = [(n, PENDENTE, agora) for n in dict.fromkeys(digits(n) for n in numeros) if n]
+        antes = self.conn.total_changes
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO frontier (numero, estado, atualizado_em) VALUES (?, ?, ?)',
+                linhas
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return self.conn.total_changes - antes
+
+    def lease(self, worker, limit, timeout):
+        agora = self.clock()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Arrendamento vencido de quem já esgotou as tentativas (worker que
+            # morreu nesse processo toda vez) não volta à fila
+            self.conn.execute(
+                '''UPDATE frontier SET estado = ?, lease_ate = NULL, atualizado_em = ?
+                   WHERE estado = ? AND lease_ate < ? AND tentativas >= ?''',
+                (FALHOU, agora, EM_ANDAMENTO, agora, self.max_attempts)
+            )
+            numeros = [row[0] for row in self.conn.execute(
+                '''SELECT numero FROM frontier
+                   WHERE (estado = ? AND disponivel_em <= ?) OR (estado = ? AND lease_ate < ?)
+                   ORDER BY disponivel_em, numero LIMIT ?''',
+                (PENDENTE, agora, EM_ANDAMENTO, agora, limit)
+            )]
+            self.conn.executemany(
+                '''UPDATE frontier SET estado = ?, lease_ate = ?, worker = ?,
+                   tentativas = tentativas + 1, atualizado_em = ? WHERE numero = ?''',
+                [(EM_ANDAMENTO, agora + timeout, worker, agora, n) for n in numeros]
+            )
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return numeros
+
+    def ack(self, numeros):
+        self.conn.executemany(
+            'UPDATE frontier SET estado = ?, lease_ate = NULL, atualizado_em = ? WHERE numero = ?',
+            [(CONCLUIDO, self.clock(), digits(n)) for n in numeros]
+        )
+
+    def nack(self, numeros, delay=0):
+        """Devolve os números à fila; quem já esgotou as tentativas vira ``falhou``."""
+        agora = self.clock()
+        self.conn.executemany(
+            '''UPDATE frontier SET
+                   estado = CASE WHEN tentativas >= ? THEN ? ELSE ? END,
+                   disponivel_em = ?, lease_ate = NULL, atualizado_em = ?
+               WHERE numero = ? AND estado = ?''',
+            [(self.max_attempts, FALHOU, PENDENTE, agora + delay, agora, digits(n), EM_ANDAMENTO)
+             for n in numeros]
+        )
+
+    def has_work(self):
+        row = self.conn.execute(
+            'SELECT 1 FROM frontier WHERE estado IN (?, ?) LIMIT 1',
+            (PENDENTE, EM_ANDAMENTO)
+        ).fetchone()
+        return row is not None
+
+    def counts(self):
+        counts = {estado: 0 for estado in (PENDENTE, EM_ANDAMENTO, CONCLUIDO, FALHOU)}
+        counts.update(self.conn.execute('SELECT estado, COUNT(*) FROM frontier GROUP BY estado'))
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+def main(argv=None):
+    from scrapy.utils.misc import load_object
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+
+    parser = argparse.ArgumentParser(description="Fila de processos compartilhada entre workers")
+    parser.add_argument('comando', choices=('add', 'status'))
+    parser.add_argument('arquivo', nargs='?', help="arquivo com um número de processo por linha (add)")
+    parser.add_argument('--db', default=settings.get('FRONTIER_DB', 'logs/frontier.sqlite'))
+    args = parser.parse_args(argv)
+
+    frontier = load_object(settings.get('FRONTIER_CLASS')).from_settings(args.db, settings)
+    try:
+        if args.comando == 'add':
+            if not args.arquivo:
+                parser.error("informe o arquivo com os processos")
+            with open(args.arquivo, encoding='utf-8') as f:
+                novos = frontier.add(linha.split('#', 1)[0] for linha in f)
+            print(f"{novos} processos adicionados")
+        for estado, total in frontier.counts().items():
+            print(f"{estado:<14} {total:>10}")
+    finally:
+        frontier.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Histograma de latências com buckets logarítmicos e memória fixa.
+
+Cada bucket cobre um intervalo ``growth`` vezes maior que o anterior, a
+partir de ``min_value``. Com os valores padrão (1 ms, crescimento de 10%,
+até 10 minutos) são cerca de 140 contadores por histograma, e o erro
+relativo de qualquer percentil fica abaixo de 10%, não importa quantas
+amostras foram registradas.
+"""
+import math
+
+
+class LogHistogram:
+    def __init__(self, min_value=0.001, max_value=600.0, growth=1.1):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets = [0] * (self._index(max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value):
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_growth) + 1
+
+    def _upper_bound(self, index):
+        return self.min_value * self.growth ** index
+
+    def record(self, value):
+        value = max(0.0, value)
+        index = min(self._index(value), len(self.buckets) - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+
+        rank = math.ceil(pct / 100 * self.count)
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                if index == len(self.buckets) - 1:
+                    return self.max
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self._round(self.mean()),
+            'p50': self._round(self.percentile(50)),
+            'p95': self._round(self.percentile(95)),
+            'p99': self._round(self.percentile(99)),
+            'max': self._round(self.max if self.count else None),
+        }
+
+    @staticmethod
+    def _round(value):
+        return round(value, 4) if value is not None else None
@@ -0,0 +1,156 @@
+"""
+Cache HTTP do projeto: política por tipo de página e armazenamento SQLite.
+
+A política define um TTL para cada tipo de requisição (ver
+``trf_scraper.endpoints``) e nunca guarda páginas de erro nem de
+CAPTCHA/bloqueio. O armazenamento guarda os corpos comprimidos com zlib
+em um único arquivo SQLite, o que é bem mais leve que o cache em
+diretórios do Scrapy para dezenas de milhares de páginas. Ao abrir, apaga
+as entradas mais velhas que o maior TTL, que nunca mais seriam usadas.
+"""
+import os
+import sqlite3
+import zlib
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from trf_scraper.endpoints import CNPJ_FORM, CNPJ_LISTA, PROCESSO, endpoint_type
+from trf_scraper.middlewares import is_captcha_response
+
+
+class TRF5CachePolicy:
+    def __init__(self, settings):
+        self.ttls = {
+            PROCESSO: settings.getint('HTTPCACHE_PROCESSO_TTL', 3600),
+            CNPJ_LISTA: settings.getint('HTTPCACHE_LISTA_TTL', 3600),
+            CNPJ_FORM: settings.getint('HTTPCACHE_FORM_TTL', 86400),
+        }
+
+    def should_cache_request(self, request):
+        return endpoint_type(request) in self.ttls
+
+    def should_cache_response(self, response, request):
+        if response.status != 200 or is_captcha_response(response):
+            return False
+
+        kind = endpoint_type(request)
+        if kind == PROCESSO:
+            return b'PROCESSO N' in response.body
+        if kind == CNPJ_LISTA:
+            return b'linkar' in response.body
+        return True
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        stored_at = request.meta.get('cache_timestamp')
+        if stored_at is None:
+            return False
+        return time() - stored_at < self.ttls.get(endpoint_type(request), 0)
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        # O site não envia ETag/Last-Modified: sem revalidação, vale a resposta nova
+        return False
+
+
+class SqliteCacheStorage:
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        # A mesma política do HttpCacheMiddleware: só resposta fresca conta como economia
+        self.policy = load_object(settings['HTTPCACHE_POLICY'])(settings)
+        self.db = None
+        self.stats = None
+
+    def open_spider(self, spider):
+        dbpath = os.path.join(self.cachedir, f'{spider.name}.sqlite')
+        self.db = sqlite3.connect(dbpath, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' fingerprint TEXT PRIMARY KEY,'
+            ' url TEXT NOT NULL,'
+            ' status INTEGER NOT NULL,'
+            ' headers BLOB NOT NULL,'
+            ' body BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' stored_at REAL NOT NULL)'
+        )
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+        spider.logger.debug(f"Cache HTTP em SQLite: {dbpath}")
+        self.purge_expired()
+
+    def max_age(self):
+        """Idade a partir da qual nenhuma entrada é usada (0: sem limite)."""
+        idades = list(getattr(self.policy, 'ttls', {}).values())
+        if self.expiration_secs > 0:
+            idades = [min(i, self.expiration_secs) for i in idades] or [self.expiration_secs]
+        return max(idades, default=0)
+
+    def purge_expired(self):
+        max_age = self.max_age()
+        if max_age <= 0:
+            return 0
+        apagadas = self.db.execute(
+            'DELETE FROM responses WHERE stored_at < ?', (time() - max_age,)
+        ).rowcount
+        if apagadas:
+            self.stats.inc_value('httpcache/purged', apagadas)
+        return apagadas
+
+    def close_spider(self, spider):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def retrieve_response(self, spider, request):
+        row = self.db.execute(
+            'SELECT url, status, headers, body, size, stored_at '
+            'FROM responses WHERE fingerprint = ?',
+            (self._key(request),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        url, status, raw_headers, compressed, size, stored_at = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None
+
+        body = zlib.decompress(compressed)
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+
+        request.meta['cache_timestamp'] = stored_at
+        response = respcls(url=url, headers=headers, status=status, body=body)
+        if not self.policy.is_cached_response_fresh(response, request):
+            return None
+        self.stats.inc_value('httpcache/bytes_saved', size)
+        return response
+
+    def store_response(self, spider, request, response):
+        compressed = zlib.compress(response.body, self.compression_level)
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses '
+            '(fingerprint, url, status, headers, body, size, stored_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                self._key(request),
+                response.url,
+                response.status,
+                headers_dict_to_raw(response.headers),
+                compressed,
+                len(response.body),
+                time(),
+            )
+        )
+        self.stats.inc_value('httpcache/bytes_stored', len(compressed))
+        self.stats.inc_value('httpcache/bytes_uncompressed', len(response.body))
+
+    def _key(self, request):
+        return self._fingerprinter.fingerprint(request).hex()
@@ -0,0 +1,117 @@
+"""
+Gerenciamento dos índices da coleção de processos.
+
+Os índices declarados aqui cobrem as consultas feitas pela API e pelos
+times que leem o banco: busca por parte, por faixa de datas de
+movimentação, por CNPJ, por relator e por data de autuação/atualização.
+"""
+
+
+INDEXES = [
+    {
+        'name': 'numero_processo_1',
+        'keys': [('numero_processo', 1)],
+        'options': {'unique': True},
+    },
+    {
+        'name': 'envolvidos_nome_1',
+        'keys': [('envolvidos.nome', 1)],
+        'options': {},
+    },
+    {
+        'name': 'movimentacoes_data_1',
+        'keys': [('movimentacoes.data', 1)],
+        'options': {},
+    },
+    {
+        'name': 'cnpjs_1',
+        'keys': [('cnpjs', 1)],
+        'options': {},
+    },
+    {
+        # Relator (e demais papéis) ficam em ``envolvidos``: papel = 'RELATOR'
+        # com $elemMatch no mesmo envolvido
+        'name': 'envolvidos_papel_1_nome_1',
+        'keys': [('envolvidos.papel', 1), ('envolvidos.nome', 1)],
+        'options': {},
+    },
+    {
+        'name': 'data_autuacao_1',
+        'keys': [('data_autuacao', 1)],
+        'options': {},
+    },
+    {
+        'name': 'updated_at_1',
+        'keys': [('updated_at', 1)],
+        'options': {},
+    },
+]
+
+TEXT_INDEX = {
+    'name': 'movimentacoes_texto_text',
+    'keys': [('movimentacoes.texto', 'text')],
+    'options': {'default_language': 'portuguese'},
+}
+
+
+def declared_indexes(text_index=False):
+    indexes = list(INDEXES)
+    if text_index:
+        indexes.append(TEXT_INDEX)
+    return indexes
+
+
+def ensure_indexes(collection, text_index=False, logger=None):
+    """
+    Cria os índices que ainda não existem na coleção.
+
+    A criação é feita em background para não travar escritas em coleções
+    grandes. Retorna a lista com os nomes dos índices criados.
+    """
+    existentes = collection.index_information()
+    criados = []
+
+    for spec in declared_indexes(text_index):
+        if spec['name'] in existentes:
+            continue
+
+        collection.create_index(
+            spec['keys'],
+            name=spec['name'],
+            background=True,
+            **spec['options']
+        )
+        criados.append(spec['name'])
+
+        if logger:
+            logger.info(f"Índice '{spec['name']}' criado no MongoDB.")
+
+    return criados
+
+
+def index_stats(db, collection_name='processos'):
+    """
+    Retorna tamanho e uso de cada índice da coleção.
+
+    O uso vem de ``$indexStats`` e conta as operações desde o último
+    restart do servidor.
+    """
+    collection = db[collection_name]
+
+    sizes = db.command('collStats', collection_name).get('indexSizes', {})
+    usage = {
+        stat['name']: stat.get('accesses', {})
+        for stat in collection.aggregate([{'$indexStats': {}}])
+    }
+
+    stats = []
+    for name in sorted(set(sizes) | set(usage)):
+        accesses = usage.get(name, {})
+        stats.append({
+            'name': name,
+            'size_bytes': sizes.get(name, 0),
+            'ops': accesses.get('ops', 0),
+            'since': accesses.get('since'),
+        })
+
+    return stats
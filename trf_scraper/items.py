@@ -1,9 +1,12 @@
 import scrapy
 import re
-from datetime import datetime
+from datetime import date, datetime, time
 from itemloaders.processors import MapCompose, TakeFirst, Identity
+from scrapy.utils.trackref import object_ref
 from w3lib.html import remove_tags
 
+from trf_scraper.textcodes import intern_text
+
 
 def clean_cnpj(cnpj):
     if not cnpj:
@@ -11,6 +14,17 @@ def clean_cnpj(cnpj):
     return ''.join(filter(str.isdigit, str(cnpj)))
 
 
+def format_numero_processo(numero):
+    """Formata um número de 20 dígitos no padrão CNJ (NNNNNNN-DD.AAAA.J.TR.OOOO)."""
+    digitos = ''.join(filter(str.isdigit, str(numero or '')))
+    if len(digitos) != 20:
+        return numero
+    return (
+        f"{digitos[:7]}-{digitos[7:9]}.{digitos[9:13]}."
+        f"{digitos[13]}.{digitos[14:16]}.{digitos[16:]}"
+    )
+
+
 def clean_numero_processo(text):
     if not text:
         return None
@@ -62,14 +76,103 @@ def clean_text(text):
         return None
     return ' '.join(text.split())
 
+
+def to_document(value):
+    """
+    Converte um valor extraído em tipos aceitos pelo MongoDB/JSON.
+
+    Itens e registros viram dicts e datas viram texto ISO, como na
+    serialização do ``ScrapyJSONEncoder``.
+    """
+    if isinstance(value, Record):
+        return {k: to_document(v) for k, v in value.items()}
+    if isinstance(value, (dict, scrapy.Item)):
+        return {k: to_document(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_document(v) for v in value]
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def serialize_records(records):
+    """Serializer dos campos com registros, usado pelos exportadores (-o)."""
+    return [to_document(record) for record in records or ()]
+
+
+class Record(object_ref):
+    """
+    Registro compacto com ``__slots__`` para as listas grandes de cada
+    processo (movimentações e envolvidos), sem o dict e os metadados de um
+    ``scrapy.Item``. Aceita leitura como dict (``r['texto']``, ``r.get``) e
+    vira o Item equivalente com ``to_item()`` quando for preciso.
+
+    Campos ``None`` contam como ausentes, como no ItemLoader. Como os Items,
+    as instâncias vivas são contadas pelo ``scrapy.utils.trackref`` (por
+    isso o slot ``__weakref__``); ``__slots__`` das subclasses lista só os
+    campos.
+    """
+    __slots__ = ('__weakref__',)
+    item_class = None
+
+    def __init__(self, *args, **kwargs):
+        values = dict(zip(self.__slots__, args), **kwargs)
+        for field in self.__slots__:
+            setattr(self, field, values.get(field))
+
+    def items(self):
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                yield field, value
+
+    def keys(self):
+        return [field for field, _ in self.items()]
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def to_item(self):
+        return self.item_class(**self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, (dict, scrapy.Item)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    # Por identidade, como ``scrapy.Item``: o trackref guarda as instâncias
+    # num WeakKeyDictionary
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
 class EnvolvidoItem(scrapy.Item):
     papel = scrapy.Field(
-        input_processor = MapCompose(remove_tags, clean_text),
+        input_processor = MapCompose(remove_tags, clean_text, intern_text),
         output_processor = TakeFirst()
     )
 
     nome = scrapy.Field(
-        input_processor = MapCompose(remove_tags, clean_text),
+        input_processor = MapCompose(remove_tags, clean_text, intern_text),
         output_processor = TakeFirst()
     )
 
@@ -80,10 +183,37 @@ class MovimentacaoItem(scrapy.Item):
     )
 
     texto = scrapy.Field(
-        input_processor = MapCompose(remove_tags, clean_text),
+        input_processor = MapCompose(remove_tags, clean_text, intern_text),
         output_processor = TakeFirst()
     )
 
+class Envolvido(Record):
+    __slots__ = ('papel', 'nome')
+    item_class = EnvolvidoItem
+
+    @classmethod
+    def extract(cls, papel, nome):
+        """Aplica os mesmos processadores do ``EnvolvidoItem``."""
+        return cls(
+            intern_text(clean_text(remove_tags(papel))),
+            intern_text(clean_text(remove_tags(nome)))
+        )
+
+
+class Movimentacao(Record):
+    __slots__ = ('data', 'texto')
+    item_class = MovimentacaoItem
+
+    @classmethod
+    def extract(cls, data, texto):
+        """Aplica os mesmos processadores do ``MovimentacaoItem``."""
+        data = clean_text(remove_tags(data))
+        return cls(
+            parse_date(data) if data else None,
+            intern_text(clean_text(remove_tags(texto)))
+        )
+
+
 class ProcessoItem(scrapy.Item):
     numero_processo = scrapy.Field(
         input_processor = MapCompose(remove_tags, clean_text, clean_numero_processo),
@@ -102,19 +232,25 @@ class ProcessoItem(scrapy.Item):
 
     envolvidos = scrapy.Field(
         input_processor = Identity(),
-        output_processor = TakeFirst()
+        output_processor = TakeFirst(),
+        serializer = serialize_records
     )
 
     relator = scrapy.Field(
-        input_processor = MapCompose(remove_tags, clean_text),
+        input_processor = MapCompose(remove_tags, clean_text, intern_text),
         output_processor = TakeFirst()
     )
 
     movimentacoes = scrapy.Field(
-        input_processor = Identity()
+        input_processor = Identity(),
+        serializer = serialize_records
     )
 
     url = scrapy.Field(output_processor = TakeFirst())
     data_extracao = scrapy.Field(output_processor = TakeFirst())
+    cnpj_busca = scrapy.Field(
+        input_processor = MapCompose(clean_cnpj),
+        output_processor = TakeFirst()
+    )
     
 
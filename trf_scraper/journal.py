@@ -0,0 +1,92 @@
+"""
+Diário de falhas em JSONL.
+
+Cada requisição que falhou de vez (exceção depois dos retries ou resposta
+429/5xx final) vira uma linha no arquivo assim que acontece, então nada se
+perde se o processo for interrompido. O mesmo arquivo serve de entrada para
+uma nova execução:
+
+    scrapy crawl processo -a retry_from=logs/failed_processo_20240101_120000.jsonl
+"""
+import json
+import os
+import re
+from datetime import datetime
+
+
+PROCESSO_URL_RE = re.compile(r'/processo/(\d+)')
+
+
+def numero_from_request(request):
+    """Número do processo buscado pela requisição, se houver."""
+    numero = request.meta.get('numero_busca')
+    if numero:
+        return numero
+    match = PROCESSO_URL_RE.search(request.url)
+    return match.group(1) if match else None
+
+
+class FailureJournal:
+    """Arquivo JSONL aberto sob demanda e gravado linha a linha."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, entry):
+        if self._file is None:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def failure_entry(request, exception=None, status=None):
+    entry = {
+        'numero_processo': numero_from_request(request),
+        'cnpj': request.cb_kwargs.get('cnpj') or request.meta.get('cnpj'),
+        'url': request.url,
+        'attempt': request.meta.get('retry_times', 0) + 1,
+        'timestamp': datetime.now().isoformat(),
+    }
+    if exception is not None:
+        entry['exception'] = type(exception).__name__
+        entry['message'] = str(exception)
+    if status is not None:
+        entry['status'] = status
+    return entry
+
+
+def read_failures(path):
+    """
+    Lê um diário de falhas e retorna ``(processos, cnpjs)`` sem repetições,
+    na ordem em que apareceram. Linhas inválidas são ignoradas.
+    """
+    processos = {}
+    cnpjs = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+
+            numero = entry.get('numero_processo')
+            if numero:
+                chave = ''.join(filter(str.isdigit, str(numero)))
+                processos.setdefault(chave, str(numero))
+            elif entry.get('cnpj'):
+                cnpjs.setdefault(entry['cnpj'], entry['cnpj'])
+    return list(processos.values()), list(cnpjs.values())
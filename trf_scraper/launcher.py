@@ -0,0 +1,344 @@
+"""
+Crawl dividido em vários processos.
+
+Uma entrada grande (arquivo com números de processo e/ou lista de CNPJs) é
+dividida em N shards por um hash estável do número (ou do CNPJ), e cada
+shard roda ``scrapy crawl processo`` em um processo próprio. Os workers já
+compartilham o rate limit pelo SQLite do ``RateLimitMiddleware``
+(``RATE_LIMIT_DB``).
+
+Cada worker anota em ``shard_<i>.done`` os processos gravados
+(``ShardCheckpoint``). Se um worker morrer, o shard é reiniciado só com o
+que falta, até ``--max-restarts`` vezes; o ``.done`` vai para o spider
+(``-a concluidos``), que também pula os processos das listas de CNPJ já
+concluídos. Um shard encerrado por bloqueio do site (captcha) não é
+reiniciado, nem um que chegou ao prazo (``DEADLINE``): o arquivo de
+restante em ``shard_<i>.restante/`` é a entrega para a próxima execução. Ao final, as estatísticas de todas as tentativas são somadas em
+``stats.json``.
+
+Uso:
+    python -m trf_scraper.launcher --workers 4 --arquivo processos.txt
+    python -m trf_scraper.launcher --workers 2 --cnpjs 12345678000190,98765432000110
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from trf_scraper.pipelines import persists_items, was_stored
+
+
+logger = logging.getLogger(__name__)
+
+# Estatísticas combinadas pelo maior valor entre os workers, e não pela soma
+MAX_SUFFIXES = ('_max', '/max', '_max_mb', '/p50', '/p95', '/p99', '_avg', '_per_item',
+                '/concurrency', '/delay', '/error_rate', 'rss_mb', 'traced_mb')
+
+# Motivos de encerramento em que o site está bloqueando: reiniciar na hora só
+# insiste no bloqueio
+BLOCKED_REASONS = ('captcha_detected',)
+EXIT_BLOCKED = 4
+# Encerrado no prazo: reiniciar recalcularia o prazo (06:00 vira o de amanhã)
+EXIT_DEADLINE = 5
+
+
+def digits(value):
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+def shard_of(value, shards):
+    """Shard de um número de processo ou CNPJ; estável entre execuções."""
+    chave = digits(value) or str(value)
+    return int(hashlib.md5(chave.encode('utf-8')).hexdigest(), 16) % shards
+
+
+def split_input(processos, cnpjs, shards):
+    """Distribui processos e CNPJs em ``shards`` listas, sem repetições."""
+    divisao = [{'processos': [], 'cnpjs': []} for _ in range(shards)]
+    vistos = set()
+    for tipo, valores in (('processos', processos), ('cnpjs', cnpjs)):
+        for valor in valores:
+            valor = valor.strip()
+            chave = (tipo, digits(valor))
+            if not valor or chave in vistos:
+                continue
+            vistos.add(chave)
+            divisao[shard_of(valor, shards)][tipo].append(valor)
+    return divisao
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [linha.split('#', 1)[0].strip() for linha in f if linha.split('#', 1)[0].strip()]
+
+
+def read_done(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {linha.strip() for linha in f if linha.strip()}
+
+
+def merge_stats(stats_list):
+    """Soma os contadores de vários workers (máximo para picos e percentis)."""
+    combinado = {}
+    motivos = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key == 'finish_reason':
+                motivos[value] = motivos.get(value, 0) + 1
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                if key == 'start_time':
+                    combinado[key] = min(combinado.get(key, value), value)
+                elif key == 'finish_time':
+                    combinado[key] = max(combinado.get(key, value), value)
+            elif key.endswith(MAX_SUFFIXES):
+                combinado[key] = max(combinado.get(key, value), value)
+            else:
+                combinado[key] = combinado.get(key, 0) + value
+    if motivos:
+        combinado['finish_reasons'] = motivos
+    return combinado
+
+
+class ShardCheckpoint:
+    """Anota, linha a linha, os processos concluídos pelo worker."""
+
+    def __init__(self, path, require_stored=False):
+        self.path = path
+        # Com o MongoDBPipeline ativo, só o que ele gravou conta como concluído
+        self.require_stored = require_stored
+        self._file = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('SHARD_CHECKPOINT_FILE')
+        if not path:
+            raise NotConfigured
+
+        ext = cls(path, require_stored=persists_items(crawler.settings))
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def item_scraped(self, item, response, spider):
+        if self.require_stored and not was_stored(item):
+            return
+        numeros = {digits(item.get('numero_processo')), digits(response.meta.get('numero_busca'))}
+        self.mark(n for n in numeros if n)
+
+    def mark(self, numeros):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        for numero in numeros:
+            self._file.write(numero + '\n')
+        self._file.flush()
+
+    def spider_closed(self, spider):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_shard(workdir, index, attempt, overrides=None):
+    """Corpo do processo worker: um CrawlerProcess para o shard."""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    prefixo = os.path.join(workdir, f'shard_{index}')
+    settings = get_project_settings()
+    settings.set('LOG_FILE', f'{prefixo}.log')
+    settings.set('SHARD_CHECKPOINT_FILE', f'{prefixo}.done')
+    settings.set('DEADLINE_DIR', f'{prefixo}.restante')
+    if settings.getbool('METRICS_ENABLED'):
+        settings.set('METRICS_PORT', settings.getint('METRICS_PORT') + index)
+    for key, value in (overrides or {}).items():
+        settings.set(key, value)
+
+    args = {}
+    if os.path.exists(f'{prefixo}.processos'):
+        args['arquivo_processos'] = f'{prefixo}.processos'
+    cnpjs = read_lines(f'{prefixo}.cnpjs') if os.path.exists(f'{prefixo}.cnpjs') else []
+    if cnpjs:
+        args['cnpj'] = ','.join(cnpjs)
+    if os.path.exists(f'{prefixo}.done'):
+        args['concluidos'] = f'{prefixo}.done'
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler('processo')
+    process.crawl(crawler, **args)
+    process.start()
+
+    stats = crawler.stats.get_stats()
+    with open(f'{prefixo}.stats_{attempt}.json', 'w', encoding='utf-8') as f:
+        json.dump(stats, f, default=str, indent=2)
+    motivo = stats.get('finish_reason')
+    if motivo == 'finished':
+        sys.exit(0)
+    if motivo == 'deadline':
+        sys.exit(EXIT_DEADLINE)
+    sys.exit(EXIT_BLOCKED if motivo in BLOCKED_REASONS else 3)
+
+
+class ShardLauncher:
+    def __init__(self, workers, workdir, max_restarts=3, overrides=None, context=None,
+                 target=run_shard, poll_interval=1.0):
+        self.workers = workers
+        self.workdir = workdir
+        self.max_restarts = max_restarts
+        self.overrides = overrides or {}
+        self.context = context or multiprocessing.get_context('spawn')
+        self.target = target
+        self.poll_interval = poll_interval
+        self.attempts = {}
+        self.failed = []
+
+    def _path(self, index, ext):
+        return os.path.join(self.workdir, f'shard_{index}.{ext}')
+
+    def prepare(self, processos, cnpjs):
+        """Grava a entrada de cada shard; retorna os índices com trabalho."""
+        os.makedirs(self.workdir, exist_ok=True)
+        ativos = []
+        for index, shard in enumerate(split_input(processos, cnpjs, self.workers)):
+            if not shard['processos'] and not shard['cnpjs']:
+                continue
+            for tipo in ('processos', 'cnpjs'):
+                if shard[tipo]:
+                    with open(self._path(index, tipo), 'w', encoding='utf-8') as f:
+                        f.write('\n'.join(shard[tipo]) + '\n')
+            ativos.append(index)
+        return ativos
+
+    def resume_input(self, index):
+        """Tira da entrada do shard os processos já concluídos; retorna quantos faltam."""
+        path = self._path(index, 'processos')
+        if not os.path.exists(path):
+            return 0
+        feitos = read_done(self._path(index, 'done'))
+        restantes = [p for p in read_lines(path) if digits(p) not in feitos]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(''.join(p + '\n' for p in restantes))
+        return len(restantes)
+
+    def start(self, index):
+        attempt = self.attempts.get(index, 0) + 1
+        self.attempts[index] = attempt
+        process = self.context.Process(
+            target=self.target,
+            args=(self.workdir, index, attempt, self.overrides),
+            name=f'shard-{index}'
+        )
+        process.start()
+        logger.info(f"Shard {index} iniciado (tentativa {attempt}, pid {process.pid})")
+        return process
+
+    def run(self, shards):
+        running = {index: self.start(index) for index in shards}
+        while running:
+            for index, process in list(running.items()):
+                process.join(self.poll_interval / max(len(running), 1))
+                if process.is_alive():
+                    continue
+
+                del running[index]
+                if process.exitcode == 0:
+                    logger.info(f"Shard {index} concluído")
+                    continue
+
+                if process.exitcode == EXIT_DEADLINE:
+                    logger.info(
+                        f"Shard {index} encerrado no prazo; restante em {self._path(index, 'restante')}"
+                    )
+                    continue
+
+                if process.exitcode == EXIT_BLOCKED:
+                    restantes = self.resume_input(index)
+                    logger.error(
+                        f"Shard {index} encerrado por bloqueio do site; não é reiniciado "
+                        f"({restantes} processos pendentes em {self._path(index, 'processos')})"
+                    )
+                    self.failed.append(index)
+                    continue
+
+                if self.attempts[index] > self.max_restarts:
+                    logger.error(f"Shard {index} falhou {self.attempts[index]} vezes, desistindo")
+                    self.failed.append(index)
+                    continue
+
+                restantes = self.resume_input(index)
+                if not restantes and not os.path.exists(self._path(index, 'cnpjs')):
+                    logger.info(f"Shard {index} terminou com código {process.exitcode}, sem processos pendentes")
+                    continue
+                logger.warning(
+                    f"Shard {index} terminou com código {process.exitcode}; "
+                    f"reiniciando com {restantes} processos pendentes"
+                )
+                running[index] = self.start(index)
+        return self.combined_stats()
+
+    def combined_stats(self):
+        stats_list = []
+        for path in sorted(glob.glob(os.path.join(self.workdir, 'shard_*.stats_*.json'))):
+            with open(path, encoding='utf-8') as f:
+                stats_list.append(json.load(f))
+
+        combinado = merge_stats(stats_list)
+        combinado['shards'] = len(self.attempts)
+        combinado['shards_failed'] = sorted(self.failed)
+        combinado['restarts'] = sum(a - 1 for a in self.attempts.values())
+        with open(os.path.join(self.workdir, 'stats.json'), 'w', encoding='utf-8') as f:
+            json.dump(combinado, f, default=str, indent=2)
+        return combinado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl do TRF5 dividido em vários processos")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--arquivo', help="arquivo com um número de processo por linha")
+    parser.add_argument('--cnpjs', default='', help="CNPJs separados por vírgula")
+    parser.add_argument('--arquivo-cnpjs', help="arquivo com um CNPJ por linha")
+    parser.add_argument('--max-restarts', type=int, default=3)
+    parser.add_argument(
+        '--dir',
+        default=os.path.join('logs', f'shards_{datetime.now():%Y%m%d_%H%M%S}'),
+        help="diretório com entradas, logs, checkpoints e estatísticas dos shards"
+    )
+    parser.add_argument('-s', dest='settings', action='append', default=[], metavar='NOME=VALOR')
+    args = parser.parse_args(argv)
+
+    processos = read_lines(args.arquivo) if args.arquivo else []
+    cnpjs = [c for c in args.cnpjs.split(',') if c.strip()]
+    if args.arquivo_cnpjs:
+        cnpjs += read_lines(args.arquivo_cnpjs)
+    if not processos and not cnpjs:
+        parser.error("informe --arquivo, --cnpjs ou --arquivo-cnpjs")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    overrides = dict(s.split('=', 1) for s in args.settings)
+    launcher = ShardLauncher(args.workers, args.dir, max_restarts=args.max_restarts, overrides=overrides)
+
+    shards = launcher.prepare(processos, cnpjs)
+    logger.info(
+        f"{len(processos)} processos e {len(cnpjs)} CNPJs em {len(shards)} shards ({args.dir})"
+    )
+    inicio = time.monotonic()
+    stats = launcher.run(shards)
+    logger.info(
+        f"Concluído em {time.monotonic() - inicio:.0f}s: {stats.get('item_scraped_count', 0)} itens, "
+        f"{stats['restarts']} reinícios, shards com falha: {stats['shards_failed'] or 'nenhum'}"
+    )
+    return 1 if stats['shards_failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Logging estruturado e sem bloqueio para o crawl.
+
+Durante o crawl, ``QueueLogging`` tira do logger raiz os handlers que
+escrevem em arquivo/terminal e os coloca atrás de uma fila: o reactor só
+enfileira o registro, e a formatação e a escrita acontecem na thread do
+``QueueListener``. A formatação é preguiçosa: mensagens com argumentos no
+estilo ``%s`` só viram texto na thread de escrita.
+
+Antes de entrar na fila, cada registro passa pelo ``SamplingFilter``, que
+deixa passar no máximo ``LOG_SAMPLING_RATE`` mensagens por segundo de cada
+tipo (logger + nível + template; em mensagens já formatadas, como f-strings,
+os números viram ``0`` para formar o template). O que for descartado é
+contado em ``log_sampled/<logger>``; erros nunca são descartados.
+
+Com ``LOG_JSON = True`` os handlers passam a escrever uma linha JSON por
+registro.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import time
+from datetime import datetime, timezone
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+DIGITS_RE = re.compile(r'\d+')
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como um objeto JSON em uma linha."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        spider = getattr(record, 'spider', None)
+        if spider is not None:
+            data['spider'] = getattr(spider, 'name', str(spider))
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Limita quantas mensagens de cada tipo passam por segundo.
+
+    Só as contagens do segundo atual ficam em memória: ao virar o segundo, as
+    janelas anteriores são descartadas.
+    """
+
+    def __init__(self, rate=10, max_level=logging.WARNING, stats=None, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+        self.stats = stats
+        self.clock = clock
+        self.window = None
+        self.counts = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level or not self.rate:
+            return True
+
+        now = int(self.clock())
+        if now != self.window:
+            self.window = now
+            self.counts = {}
+
+        key = (record.name, record.levelno, self.template(record))
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+        if count <= self.rate:
+            return True
+
+        if self.stats is not None:
+            self.stats.inc_value(f'log_sampled/{record.name}')
+        return False
+
+    @staticmethod
+    def template(record):
+        if record.args:
+            return record.msg
+        return DIGITS_RE.sub('0', str(record.msg))
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que deixa a formatação para a thread do listener."""
+
+    def prepare(self, record):
+        return record
+
+
+class QueueLogging:
+    def __init__(self, stats, sampling_rate=10, json_format=False):
+        self.stats = stats
+        self.sampling_rate = sampling_rate
+        self.json_format = json_format
+        self.queue_handler = None
+        self.listener = None
+        self.moved = []
+        self.formatters = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('LOG_QUEUE_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler.stats,
+            sampling_rate=settings.getint('LOG_SAMPLING_RATE', 10),
+            json_format=settings.getbool('LOG_JSON')
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        self.install(logging.getLogger())
+
+    def spider_closed(self, spider):
+        self.uninstall(logging.getLogger())
+
+    def install(self, root):
+        # O handler de contagem do Scrapy (log_count/*) fica no logger raiz:
+        # só os handlers que fazem I/O vão para a thread
+        self.moved = [h for h in root.handlers if isinstance(h, logging.StreamHandler)]
+        if not self.moved:
+            return
+
+        if self.json_format:
+            formatter = JsonFormatter()
+            for handler in self.moved:
+                self.formatters.append((handler, handler.formatter))
+                handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        self.queue_handler = LazyQueueHandler(log_queue)
+        self.queue_handler.addFilter(SamplingFilter(self.sampling_rate, stats=self.stats))
+        self.listener = logging.handlers.QueueListener(
+            log_queue, *self.moved, respect_handler_level=True
+        )
+
+        for handler in self.moved:
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        self.listener.start()
+
+    def uninstall(self, root):
+        if self.listener is None:
+            return
+
+        # Esvazia a fila antes de devolver os handlers, preservando a ordem
+        root.removeHandler(self.queue_handler)
+        self.listener.stop()
+        for handler in self.moved:
+            root.addHandler(handler)
+        for handler, formatter in self.formatters:
+            handler.setFormatter(formatter)
+
+        self.listener = None
+        self.queue_handler = None
+        self.moved = []
+        self.formatters = []
@@ -0,0 +1,209 @@
+"""
+Diagnóstico de memória para crawls longos.
+
+A extensão ``MemoryDiagnostics`` (``MEMDIAG_ENABLED``) liga o
+``tracemalloc`` e, a cada ``MEMDIAG_INTERVAL`` segundos, registra:
+
+- RSS do processo e memória rastreada pelo tracemalloc;
+- os ``MEMDIAG_TOP`` pontos do código que mais cresceram desde a amostra
+  anterior;
+- quantos ``ProcessoItem``, movimentações e envolvidos (``Movimentacao``
+  e ``Envolvido``, os registros compactos que o spider usa, além dos
+  Items equivalentes), Requests e Responses estão vivos (via
+  ``scrapy.utils.trackref``).
+
+No fechamento grava ``logs/memory_<spider>_<data>.json`` com a linha do
+tempo e o crescimento acumulado desde o início do crawl. Com
+``MEMDIAG_RSS_LIMIT_MB`` o spider é fechado de forma ordenada (motivo
+``memory_limit``) quando o RSS passa do limite, com pipelines e diários
+de falha encerrados normalmente.
+"""
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request, Response
+from scrapy.utils.trackref import live_refs
+from twisted.internet import task
+
+
+TRACKED_ITEMS = ('ProcessoItem', 'Movimentacao', 'Envolvido', 'MovimentacaoItem', 'EnvolvidoItem')
+
+
+def current_rss():
+    """RSS atual em bytes; sem /proc, usa o pico informado pelo getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        # Windows: sem /proc nem getrusage
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def live_counts():
+    """Objetos vivos por tipo rastreado."""
+    counts = {name: 0 for name in TRACKED_ITEMS}
+    counts['Request'] = 0
+    counts['Response'] = 0
+    for cls, refs in list(live_refs.items()):
+        if cls.__name__ in counts:
+            counts[cls.__name__] += len(refs)
+        elif issubclass(cls, Response):
+            counts['Response'] += len(refs)
+        elif issubclass(cls, Request):
+            counts['Request'] += len(refs)
+    return counts
+
+
+def _site(stat):
+    frame = stat.traceback[0]
+    return f'{frame.filename}:{frame.lineno}'
+
+
+def top_growth(snapshot, previous, limit):
+    """Pontos de alocação que mais cresceram entre dois snapshots."""
+    diffs = snapshot.compare_to(previous, 'lineno')
+    return [
+        {
+            'site': _site(stat),
+            'size_kb': round(stat.size / 1024, 1),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'count_diff': stat.count_diff,
+        }
+        for stat in diffs[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+class MemoryDiagnostics:
+    SNAPSHOT_FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+
+    def __init__(self, crawler, interval=300, top=15, frames=1, rss_limit_mb=0, output_dir='logs'):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.rss_limit = rss_limit_mb * 1024 * 1024
+        self.output_dir = output_dir
+        self.samples = []
+        self.baseline = None
+        self.previous = None
+        self.started_tracing = False
+        self.limit_reached = False
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEMDIAG_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            interval=settings.getfloat('MEMDIAG_INTERVAL', 300),
+            top=settings.getint('MEMDIAG_TOP', 15),
+            frames=settings.getint('MEMDIAG_FRAMES', 1),
+            rss_limit_mb=settings.getint('MEMDIAG_RSS_LIMIT_MB', 0),
+            output_dir=settings.get('MEMDIAG_DIR', 'logs')
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+        self.baseline = self.previous = self._snapshot()
+
+        self.task = task.LoopingCall(self.check, spider)
+        self.task.start(self.interval, now=False)
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self.SNAPSHOT_FILTERS)
+
+    def check(self, spider):
+        snapshot = self._snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        rss = current_rss()
+        counts = live_counts()
+        growth = top_growth(snapshot, self.previous, self.top)
+        self.previous = snapshot
+
+        self.samples.append({
+            'time': datetime.now().isoformat(),
+            'rss_mb': round(rss / 1048576, 1),
+            'traced_mb': round(traced / 1048576, 1),
+            'traced_peak_mb': round(peak / 1048576, 1),
+            'items_scraped': self.stats.get_value('item_scraped_count', 0),
+            'live': counts,
+            'top_growth': growth,
+        })
+
+        self.stats.set_value('memdiag/rss_mb', round(rss / 1048576, 1))
+        self.stats.max_value('memdiag/rss_max_mb', round(rss / 1048576, 1))
+        self.stats.set_value('memdiag/traced_mb', round(traced / 1048576, 1))
+        for name, count in counts.items():
+            self.stats.set_value(f'memdiag/live/{name}', count)
+
+        spider.logger.info(
+            "Memória: RSS %.1f MB, rastreada %.1f MB, vivos %s",
+            rss / 1048576, traced / 1048576, counts
+        )
+        if growth:
+            spider.logger.info("Maior crescimento: %s (+%.1f KB)", growth[0]['site'], growth[0]['size_diff_kb'])
+
+        if self.rss_limit and rss > self.rss_limit and not self.limit_reached:
+            self.limit_reached = True
+            self.stats.set_value('memdiag/limit_reached', True)
+            spider.logger.warning(
+                f"RSS de {rss / 1048576:.0f} MB acima do limite de "
+                f"{self.rss_limit / 1048576:.0f} MB, encerrando o spider"
+            )
+            self.crawler.engine.close_spider(spider, 'memory_limit')
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+
+        report = {
+            'spider': spider.name,
+            'reason': reason,
+            'rss_mb': round(current_rss() / 1048576, 1),
+            'live': live_counts(),
+            'samples': self.samples,
+        }
+        if self.baseline is not None and tracemalloc.is_tracing():
+            report['growth_since_start'] = top_growth(self._snapshot(), self.baseline, self.top)
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = os.path.join(
+            self.output_dir,
+            f'memory_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.json'
+        )
+        tmp = f'{filename}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, filename)
+        spider.logger.info(f"Relatório de memória salvo em {filename}")
@@ -1,26 +1,161 @@
 from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware, get_retry_request
+from scrapy.exceptions import DontCloseSpider, NotConfigured
 from scrapy.http import HtmlResponse
+from scrapy.utils.response import response_status_message
+import json
 import logging
+import math
+import os
+import random
+from collections import deque
 from datetime import datetime
+from urllib.parse import urlsplit
 import time
 
+from trf_scraper.deadline import behind_schedule
+from trf_scraper.endpoints import ENDPOINT_TYPES, endpoint_type
+from trf_scraper.histogram import LogHistogram
+from trf_scraper.journal import FailureJournal, failure_entry
+from trf_scraper.ratelimit import SqliteTokenBucket
+
+
+# Sinal do circuit breaker: ``concurrency`` ({slot: valor}) vira teto
+# temporário (``hold=True``, sonda meio-aberta) ou a nova concorrência
+# (``hold=False``, retomada). Quem trata é o AdaptiveConcurrencyMiddleware
+circuit_concurrency = object()
+
+CAPTCHA_INDICATORS = [
+    b'captcha',
+    b'robot',
+    b'blocked',
+    b'access denied'
+]
+
+
+def is_captcha_response(response):
+    body_lower = response.body.lower()
+    return any(indicator in body_lower for indicator in CAPTCHA_INDICATORS)
+
+
+class ResponseTimeMiddleware:
+    """
+    Mede o tempo de resposta e mantém histogramas por tipo de endpoint.
+
+    Para cada tipo (página de processo, formulário e lista do CNPJ) há três
+    histogramas: tempo total, tempo no servidor (``download_latency`` do
+    Scrapy) e tempo na fila do slot de download (a diferença entre os
+    dois). p50/p95/p99 vão para as estatísticas em ``latency/*`` e para um
+    arquivo de snapshot reescrito a cada ``LATENCY_SNAPSHOT_INTERVAL``.
+
+    Fica depois do RateLimitMiddleware, para que a espera pelos tokens não
+    conte como tempo de resposta.
+    """
+
+    PHASES = ('total', 'server', 'queue')
+
+    def __init__(self, stats=None, slow_threshold=10, snapshot_dir=None, snapshot_interval=0):
+        self.stats = stats
+        self.slow_threshold = slow_threshold
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path = None
+        self._snapshot_task = None
+        self.histograms = {
+            (kind, phase): LogHistogram()
+            for kind in ENDPOINT_TYPES
+            for phase in self.PHASES
+        }
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        s = cls(
+            stats=crawler.stats,
+            slow_threshold=settings.getfloat('SLOW_RESPONSE_THRESHOLD', 10),
+            snapshot_dir=settings.get('LATENCY_SNAPSHOT_DIR', 'logs'),
+            snapshot_interval=settings.getfloat('LATENCY_SNAPSHOT_INTERVAL', 60)
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
 
-class ResponseTimeMiddleware:    
     def process_request(self, request, spider):
         request.meta['start_time'] = time.time()
     
     def process_response(self, request, response, spider):
-        if 'start_time' in request.meta:
-            elapsed = time.time() - request.meta['start_time']
-            spider.logger.debug(f"Response time: {elapsed:.2f}s - {request.url}")
+        # Retries copiam o meta: sem pop, uma resposta do cache seria medida
+        # a partir do envio da tentativa anterior
+        start_time = request.meta.pop('start_time', None)
+        if start_time is not None:
+            elapsed = time.time() - start_time
+            request.meta['response_time'] = elapsed
+            spider.logger.debug("Response time: %.2fs - %s", elapsed, request.url)
             
-            if elapsed > 10:
+            if elapsed > self.slow_threshold:
                 spider.logger.warning(
                     f"Slow response ({elapsed:.2f}s): {request.url}"
                 )
+
+            self._record(request, response, elapsed)
         
         return response
 
+    def _record(self, request, response, elapsed):
+        kind = endpoint_type(request)
+        self.histograms[(kind, 'total')].record(elapsed)
+
+        server = request.meta.get('download_latency')
+        if server is not None:
+            self.histograms[(kind, 'server')].record(server)
+            self.histograms[(kind, 'queue')].record(max(0.0, elapsed - server))
+
+        if self.stats is not None:
+            self.stats.inc_value(f'latency/{kind}/status/{response.status}')
+
+    def summary(self):
+        return {
+            f'{kind}/{phase}': histogram.summary()
+            for (kind, phase), histogram in self.histograms.items()
+            if histogram.count
+        }
+
+    def publish(self):
+        for name, summary in self.summary().items():
+            for key in ('p50', 'p95', 'p99'):
+                self.stats.set_value(f'latency/{name}/{key}', summary[key])
+
+    def write_snapshot(self):
+        if not self.snapshot_path:
+            return
+        self.publish()
+        tmp_path = f'{self.snapshot_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'latency': self.summary(),
+            }, f, indent=2)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def spider_opened(self, spider):
+        if self.snapshot_dir and self.snapshot_interval > 0:
+            from twisted.internet.task import LoopingCall
+
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            self.snapshot_path = os.path.join(
+                self.snapshot_dir,
+                f'latency_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.json'
+            )
+            self._snapshot_task = LoopingCall(self.write_snapshot)
+            self._snapshot_task.start(self.snapshot_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self._snapshot_task and self._snapshot_task.running:
+            self._snapshot_task.stop()
+        if self.stats is not None:
+            self.publish()
+        self.write_snapshot()
+
 
 class CustomUserAgentMiddleware:
     def __init__(self):
@@ -37,57 +172,610 @@ class CustomUserAgentMiddleware:
 
 
 class ErrorLoggingMiddleware:
-    def __init__(self):
-        self.failed_urls = []
+    """
+    Registra as requisições que falharam de vez.
+
+    Fica abaixo do RetryMiddleware, então só vê exceções e respostas
+    429/5xx que esgotaram os retries. Cada falha é gravada na hora no
+    diário JSONL (``FAILED_JOURNAL_DIR``); em memória ficam apenas as
+    ``FAILED_RECENT_SIZE`` mais recentes.
+    """
+
+    JOURNAL_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, journal_dir=None, recent_size=100, stats=None):
+        self.journal_dir = journal_dir
+        self.failed_urls = deque(maxlen=recent_size)
+        self.stats = stats
+        self.journal = None
     
     @classmethod
     def from_crawler(cls, crawler):
-        s = cls()
+        settings = crawler.settings
+        s = cls(
+            journal_dir=settings.get('FAILED_JOURNAL_DIR', 'logs'),
+            recent_size=settings.getint('FAILED_RECENT_SIZE', 100),
+            stats=crawler.stats
+        )
         crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
+
+    def _record(self, spider, entry):
+        self.failed_urls.append(entry)
+        if self.stats:
+            self.stats.inc_value('failures/journaled')
+
+        if self.journal_dir:
+            if self.journal is None:
+                filename = f'failed_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.jsonl'
+                self.journal = FailureJournal(os.path.join(self.journal_dir, filename))
+            self.journal.write(entry)
     
+    def process_response(self, request, response, spider):
+        if response.status in self.JOURNAL_STATUS and not request.meta.get('retry_deferred'):
+            self._record(spider, failure_entry(request, status=response.status))
+            spider.logger.error(
+                f"Failed request: {request.url} - HTTP {response.status}"
+            )
+        return response
+
     def process_exception(self, request, exception, spider):
-        self.failed_urls.append({
-            'url': request.url,
-            'exception': str(exception),
-            'timestamp': datetime.now().isoformat()
-        })
+        if request.meta.get('retry_deferred'):
+            return
+        self._record(spider, failure_entry(request, exception=exception))
         
         spider.logger.error(
             f"Failed request: {request.url} - {exception}"
         )
     
     def spider_closed(self, spider):
-        if self.failed_urls:
-            import os
-            os.makedirs('logs', exist_ok=True)
-            filename = f'logs/failed_urls_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.txt'
-            with open(filename, 'w') as f:
-                for item in self.failed_urls:
-                    f.write(f"{item['url']}\n")
-            
+        if self.journal:
+            self.journal.close()
             spider.logger.warning(
-                f"Saved {len(self.failed_urls)} failed URLs to {filename}"
+                f"Saved {self.journal.count} failed requests to {self.journal.path} "
+                f"(retry with -a retry_from={self.journal.path})"
             )
 
 
 class CaptchaDetectionMiddleware:
+    """
+    Circuit breaker para páginas de CAPTCHA/bloqueio.
+
+    Em vez de fechar o spider na primeira detecção, pausa o engine, devolve
+    a requisição para a fila e espera um cooldown exponencial. Depois do
+    cooldown o engine volta com concorrência 1 (meio-aberto): se a próxima
+    resposta for normal, o circuito fecha e os slots voltam com metade da
+    concorrência de antes da primeira pausa; se for outro bloqueio, o
+    cooldown dobra. O spider só é fechado quando o orçamento de
+    ``CIRCUIT_BREAKER_MAX_TRIPS`` pausas se esgota.
+
+    Com o AdaptiveConcurrencyMiddleware ativo, a sonda e a retomada passam
+    pelo estado dele (sinal ``circuit_concurrency``); senão, a concorrência
+    dos slots é escrita direto.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, max_trips=0, cooldown=60, max_cooldown=1800, reactor=None):
+        self.max_trips = max_trips
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.reactor = reactor
+        self.state = self.CLOSED
+        self.trips = 0
+        self.consecutive = 0
+        self.saved_concurrency = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            max_trips=settings.getint('CIRCUIT_BREAKER_MAX_TRIPS', 5),
+            cooldown=settings.getfloat('CIRCUIT_BREAKER_COOLDOWN', 60),
+            max_cooldown=settings.getfloat('CIRCUIT_BREAKER_MAX_COOLDOWN', 1800)
+        )
+
     def process_response(self, request, response, spider):
-        captcha_indicators = [
-            b'captcha',
-            b'robot',
-            b'blocked',
-            b'access denied'
-        ]
-        
-        body_lower = response.body.lower()
-        
-        if any(indicator in body_lower for indicator in captcha_indicators):
+        if not is_captcha_response(response):
+            if self.state == self.HALF_OPEN:
+                self._close_circuit(spider)
+            return response
+
+        spider.crawler.stats.inc_value('circuit_breaker/blocked_responses')
+
+        if self.state == self.OPEN:
+            return self._requeue(request)
+
+        self.trips += 1
+        self.consecutive += 1
+        spider.crawler.stats.set_value('circuit_breaker/trips', self.trips)
+
+        if self.trips > self.max_trips:
             spider.logger.critical(
                 f"CAPTCHA/Block detected on {request.url}! "
                 f"Consider adding delays or proxies."
             )
-            
             spider.crawler.engine.close_spider(spider, 'captcha_detected')
-        
-        return response
\ No newline at end of file
+            return response
+
+        self._open_circuit(spider, request)
+        return self._requeue(request)
+
+    def _requeue(self, request):
+        retry = request.replace(dont_filter=True)
+        retry.meta['circuit_breaker_requeued'] = request.meta.get('circuit_breaker_requeued', 0) + 1
+        return retry
+
+    def _open_circuit(self, spider, request):
+        cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self.consecutive - 1))
+        self.state = self.OPEN
+
+        engine = spider.crawler.engine
+        if not self.saved_concurrency:
+            # Só na primeira pausa: depois dela os slots estão presos em 1
+            self.saved_concurrency = {
+                key: slot.concurrency for key, slot in engine.downloader.slots.items()
+            }
+        engine.pause()
+        spider.crawler.stats.inc_value('circuit_breaker/paused_seconds', cooldown)
+        spider.logger.warning(
+            f"CAPTCHA/bloqueio em {request.url}: pausando por {cooldown:.0f}s "
+            f"({self.trips}/{self.max_trips} pausas)"
+        )
+
+        reactor = self.reactor
+        if reactor is None:
+            from twisted.internet import reactor
+        reactor.callLater(cooldown, self._half_open, spider)
+
+    def _half_open(self, spider):
+        self.state = self.HALF_OPEN
+        slots = spider.crawler.engine.downloader.slots
+        self._set_concurrency(spider, {key: 1 for key in slots}, hold=True)
+
+        spider.logger.info("Cooldown encerrado, testando o site com concorrência 1")
+        spider.crawler.engine.unpause()
+
+    def _close_circuit(self, spider):
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self._set_concurrency(
+            spider,
+            {key: max(1, concurrency // 2) for key, concurrency in self.saved_concurrency.items()},
+            hold=False
+        )
+        self.saved_concurrency = {}
+
+        spider.crawler.stats.inc_value('circuit_breaker/resumed')
+        spider.logger.info("Site respondendo normalmente, crawl retomado com concorrência reduzida")
+
+    def _set_concurrency(self, spider, concurrency, hold):
+        tratado = spider.crawler.signals.send_catch_log(
+            circuit_concurrency, spider=spider, concurrency=concurrency, hold=hold
+        )
+        if tratado:
+            return
+        slots = spider.crawler.engine.downloader.slots
+        for key, value in concurrency.items():
+            if key in slots:
+                slots[key].concurrency = value
+
+
+def sleep(seconds):
+    """Espera sem bloquear o reactor; para usar com ``await``."""
+    from scrapy.utils.defer import maybe_deferred_to_future
+    from twisted.internet import reactor
+    from twisted.internet.task import deferLater
+
+    return maybe_deferred_to_future(deferLater(reactor, seconds, lambda: None))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class _SlotControl:
+    def __init__(self, concurrency, delay, window):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latencies = deque(maxlen=window)
+        self.errors = deque(maxlen=window)
+        self.since_decision = 0
+        self.cooldown_until = 0
+        # Teto imposto pelo circuit breaker durante a sonda meio-aberta
+        self.limit = None
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Controle AIMD da concorrência por slot de download.
+
+    A cada ``ADAPTIVE_CONCURRENCY_WINDOW`` respostas, se o p95 do tempo de
+    resposta (medido pelo ResponseTimeMiddleware) estiver abaixo do alvo e
+    a taxa de erros for baixa, a concorrência do slot sobe em 1. Respostas
+    429/503 ou de CAPTCHA cortam a concorrência pela metade, dobram o
+    delay e congelam o crescimento por um período de cooldown.
+
+    Fica acima do BackoffRetryMiddleware (560 > 550): ``process_response`` e
+    ``process_exception`` rodam em ordem decrescente, então o AIMD vê cada
+    tentativa antes de o retry transformá-la em uma nova requisição.
+
+    O circuit breaker de CAPTCHA não escreve nos slots: pede pelo sinal
+    ``circuit_concurrency`` um teto durante a sonda e a concorrência da
+    retomada, que passam a fazer parte do estado do controle.
+    """
+
+    BACKOFF_STATUS = (429, 503)
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint('ADAPTIVE_CONCURRENCY_MIN', 1)
+        self.max_concurrency = settings.getint(
+            'ADAPTIVE_CONCURRENCY_MAX', settings.getint('CONCURRENT_REQUESTS')
+        )
+        self.start_concurrency = settings.getint(
+            'ADAPTIVE_CONCURRENCY_START', self.min_concurrency
+        )
+        self.target_latency = settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', 3.0)
+        self.max_error_rate = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE', 0.05)
+        self.window = settings.getint('ADAPTIVE_CONCURRENCY_WINDOW', 20)
+        self.decrease_factor = settings.getfloat('ADAPTIVE_CONCURRENCY_DECREASE_FACTOR', 0.5)
+        self.cooldown = settings.getfloat('ADAPTIVE_CONCURRENCY_COOLDOWN', 60)
+        self.min_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.max_delay = settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', 10)
+        self.controls = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mw = cls(crawler)
+        crawler.signals.connect(mw.speed_up, signal=behind_schedule)
+        crawler.signals.connect(mw.circuit_concurrency, signal=circuit_concurrency)
+        return mw
+
+    def circuit_concurrency(self, spider, concurrency, hold):
+        """Sonda (teto temporário) ou retomada pedida pelo circuit breaker."""
+        for key, value in concurrency.items():
+            control = self._control_for(key)
+            if hold:
+                control.limit = value
+            else:
+                control.limit = None
+                control.concurrency = max(self.min_concurrency, min(value, self.max_concurrency))
+                control.cooldown_until = time.monotonic() + self.cooldown
+                control.latencies.clear()
+                control.errors.clear()
+                control.since_decision = 0
+            self._apply(key, control)
+        return True
+
+    def speed_up(self, spider):
+        """Crawl atrasado para o prazo: +1 de concorrência nos slots fora do cooldown."""
+        agora = time.monotonic()
+        for key, control in self.controls.items():
+            if agora < control.cooldown_until or control.concurrency >= self.max_concurrency:
+                continue
+            control.concurrency += 1
+            control.delay = self.min_delay
+            self.stats.inc_value(f'adaptive_concurrency/{key}/increases')
+            self._apply(key, control)
+
+    def process_response(self, request, response, spider):
+        control = self._control(request)
+        if control is None:
+            return response
+
+        if response.status in self.BACKOFF_STATUS or is_captcha_response(response):
+            self._backoff(request, control, f"status {response.status}")
+            return response
+
+        self._record(control, request.meta.get('response_time'), response.status >= 500)
+        self._maybe_adjust(request, control)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        control = self._control(request)
+        if control is not None:
+            self._record(control, None, True)
+            self._maybe_adjust(request, control)
+
+    def _control(self, request):
+        key = request.meta.get('download_slot')
+        if key is None:
+            return None
+        return self._control_for(key)
+
+    def _control_for(self, key):
+        control = self.controls.get(key)
+        if control is None:
+            control = _SlotControl(self.start_concurrency, self.min_delay, self.window)
+            self.controls[key] = control
+            self._apply(key, control)
+        return control
+
+    def _record(self, control, latency, is_error):
+        if latency is not None:
+            control.latencies.append(latency)
+        control.errors.append(is_error)
+        control.since_decision += 1
+
+    def _maybe_adjust(self, request, control):
+        key = request.meta['download_slot']
+        if control.since_decision < self.window:
+            self._apply(key, control)
+            return
+        control.since_decision = 0
+
+        p95 = percentile(control.latencies, 95)
+        error_rate = sum(control.errors) / len(control.errors)
+        if p95 is not None:
+            self.stats.set_value(f'adaptive_concurrency/{key}/p95', round(p95, 3))
+        self.stats.set_value(f'adaptive_concurrency/{key}/error_rate', round(error_rate, 3))
+
+        if error_rate > self.max_error_rate or (p95 is not None and p95 > self.target_latency):
+            if control.concurrency > self.min_concurrency:
+                control.concurrency -= 1
+                self.stats.inc_value(f'adaptive_concurrency/{key}/decreases')
+        elif time.monotonic() >= control.cooldown_until:
+            control.delay = max(self.min_delay, control.delay / 2)
+            if control.concurrency < self.max_concurrency:
+                control.concurrency += 1
+                self.stats.inc_value(f'adaptive_concurrency/{key}/increases')
+
+        self._apply(key, control)
+
+    def _backoff(self, request, control, reason):
+        key = request.meta['download_slot']
+        if time.monotonic() < control.cooldown_until:
+            # As respostas em voo quando veio o primeiro 429 chegam em rajada:
+            # um corte por cooldown, senão a concorrência despenca para o mínimo
+            self.stats.inc_value(f'adaptive_concurrency/{key}/backoffs_skipped')
+            return
+        control.concurrency = max(
+            self.min_concurrency,
+            int(control.concurrency * self.decrease_factor)
+        )
+        control.delay = min(self.max_delay, max(control.delay * 2, self.min_delay or 1))
+        control.cooldown_until = time.monotonic() + self.cooldown
+        control.latencies.clear()
+        control.errors.clear()
+        control.since_decision = 0
+
+        self.stats.inc_value(f'adaptive_concurrency/{key}/backoffs')
+        self.crawler.spider.logger.warning(
+            f"Concorrência reduzida em {key} para {control.concurrency} "
+            f"(delay {control.delay:.1f}s) - {reason}"
+        )
+        self._apply(key, control)
+
+    def _apply(self, key, control):
+        concurrency = control.concurrency
+        if control.limit is not None:
+            concurrency = min(concurrency, control.limit)
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = concurrency
+            slot.delay = control.delay
+        self.stats.set_value(f'adaptive_concurrency/{key}/concurrency', concurrency)
+        self.stats.set_value(f'adaptive_concurrency/{key}/delay', round(control.delay, 3))
+
+
+class RateLimitMiddleware:
+    """
+    Limite global de requisições/s por host, compartilhado entre processos.
+
+    Fica depois do HttpCacheMiddleware para que respostas vindas do cache
+    não consumam tokens. Quando outro processo segura o banco, a reserva é
+    tentada de novo depois de ``lock_retry_delay`` segundos, sem bloquear o
+    reactor.
+    """
+
+    def __init__(self, bucket, stats, lock_retry_delay=0.02):
+        self.bucket = bucket
+        self.stats = stats
+        self.lock_retry_delay = lock_retry_delay
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RATE_LIMIT_ENABLED'):
+            raise NotConfigured
+
+        from scrapy.utils.project import data_path
+
+        bucket = SqliteTokenBucket(
+            data_path(settings.get('RATE_LIMIT_DB', 'ratelimit.sqlite'), createdir=False),
+            rates=settings.getdict('RATE_LIMITS'),
+            burst=settings.getint('RATE_LIMIT_BURST', 1),
+            lock_timeout=settings.getfloat('RATE_LIMIT_LOCK_TIMEOUT', 0.01)
+        )
+        s = cls(bucket, crawler.stats, settings.getfloat('RATE_LIMIT_LOCK_RETRY_DELAY', 0.02))
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_request(self, request, spider):
+        host = urlsplit(request.url).hostname
+        wait = self.bucket.acquire(host)
+        while wait is None:
+            self.stats.inc_value(f'ratelimit/{host}/lock_retries')
+            await sleep(self.lock_retry_delay)
+            wait = self.bucket.acquire(host)
+        if wait > 0:
+            self.stats.inc_value(f'ratelimit/{host}/delayed')
+            self.stats.inc_value(f'ratelimit/{host}/wait_time', wait)
+            await sleep(wait)
+
+    def spider_closed(self, spider):
+        self.bucket.close()
+
+
+def parse_retry_after(value, now=None):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos."""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time.time()))
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+    """
+    Retry com backoff exponencial, jitter e respeito ao Retry-After.
+
+    A nova tentativa espera fora do Scrapy (``reactor.callLater``) e só
+    então volta ao engine, sem ocupar o slot de download nem a vaga de
+    CONCURRENT_REQUESTS; a requisição original sai com ``retry_deferred``
+    no meta, para não ser tratada como falha. Cada host tem um orçamento de
+    retries (``RETRY_BUDGET_PER_HOST``); requisições que esgotam as
+    tentativas ou o orçamento vão para uma fila adiada, repetida uma única
+    vez quando o spider fica ocioso no fim do crawl.
+    """
+
+    def __init__(self, settings, rng=None, reactor=None):
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 2.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 300.0)
+        self.retry_after_max = settings.getfloat('RETRY_AFTER_MAX', 900.0)
+        self.budget = settings.getint('RETRY_BUDGET_PER_HOST', 0)
+        self.deferred_enabled = settings.getbool('RETRY_DEFERRED_ENABLED', True)
+        self.deferred_delay = settings.getfloat('RETRY_DEFERRED_DELAY', 120.0)
+        self.rng = rng or random.Random()
+        self.reactor = reactor
+        self.retries_per_host = {}
+        self.deferred = []
+        # Tentativas esperando o backoff: requisição -> chamada agendada
+        self.waiting = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        o = cls(crawler.settings)
+        o.crawler = crawler
+        crawler.signals.connect(o.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def backoff(self, attempt, retry_after=None):
+        """Espera antes da tentativa ``attempt`` (1 = primeiro retry)."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        # Equal jitter: metade fixa, metade aleatória
+        delay = delay / 2 + self.rng.uniform(0, delay / 2)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_after_max))
+        return delay
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('dont_retry', False):
+            return response
+        if response.status in self.retry_http_codes:
+            reason = response_status_message(response.status)
+            retry_after = None
+            if response.status in (429, 503):
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            return self._backoff_retry(request, reason, spider, retry_after) or response
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, self.exceptions_to_retry) and not request.meta.get('dont_retry', False):
+            return self._backoff_retry(request, exception, spider)
+        return None
+
+    def _backoff_retry(self, request, reason, spider, retry_after=None):
+        stats = self.crawler.stats
+        host = urlsplit(request.url).hostname
+
+        if self.budget and self.retries_per_host.get(host, 0) >= self.budget:
+            stats.inc_value(f'retry/budget_exhausted/{host}')
+            self._defer(request, spider)
+            return None
+
+        new_request = get_retry_request(
+            request,
+            spider=spider,
+            reason=reason,
+            max_retry_times=request.meta.get('max_retry_times', self.max_retry_times),
+            priority_adjust=request.meta.get('priority_adjust', self.priority_adjust),
+        )
+        if new_request is None:
+            self._defer(request, spider)
+            return None
+
+        self.retries_per_host[host] = self.retries_per_host.get(host, 0) + 1
+        delay = self.backoff(new_request.meta['retry_times'], retry_after)
+        self._schedule(new_request, delay)
+        # A nova tentativa continua o trabalho: a original não é falha
+        request.meta['retry_deferred'] = True
+        stats.inc_value('retry/backoff_time', delay, start=0.0)
+        if retry_after is not None:
+            stats.inc_value('retry/retry_after')
+        spider.logger.debug(
+            "Retry %d de %s em %.1fs (%s)", new_request.meta['retry_times'], request.url, delay, reason
+        )
+        return None
+
+    def _schedule(self, request, delay):
+        """Devolve ``request`` ao engine daqui a ``delay`` segundos."""
+        if self.reactor is None:
+            from twisted.internet import reactor
+            self.reactor = reactor
+        self.waiting[request] = self.reactor.callLater(delay, self._release, request)
+
+    def _release(self, request):
+        del self.waiting[request]
+        self.crawler.engine.crawl(request)
+
+    def _defer(self, request, spider):
+        if not self.deferred_enabled or request.meta.get('deferred_retry'):
+            return
+
+        deferred = request.copy()
+        deferred.dont_filter = True
+        deferred.meta['deferred_retry'] = True
+        deferred.meta['retry_times'] = 0
+        self.deferred.append(deferred)
+
+        # A falha não é definitiva: o ErrorLoggingMiddleware não registra
+        request.meta['retry_deferred'] = True
+        self.crawler.stats.inc_value('retry/deferred')
+        spider.logger.warning(f"Retries esgotados, adiado para o fim do crawl: {request.url}")
+
+    def spider_idle(self, spider):
+        if self.deferred:
+            pendentes, self.deferred = self.deferred, []
+            for request in pendentes:
+                self._schedule(request, self.deferred_delay)
+
+            self.crawler.stats.inc_value('retry/deferred_rescheduled', len(pendentes))
+            spider.logger.info(
+                f"Repetindo {len(pendentes)} requisições adiadas em {self.deferred_delay:.0f}s"
+            )
+        # Scheduler vazio, mas há tentativas esperando o backoff
+        if self.waiting:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for call in self.waiting.values():
+            if call.active():
+                call.cancel()
+        self.waiting = {}
@@ -0,0 +1,136 @@
+"""
+Índice de partes: nomes normalizados e documentos (CPF/CNPJ) mapeados
+para os números dos processos em que aparecem.
+
+O índice fica na coleção ``partes``, com um documento pequeno por par
+(chave, processo) e índice único em ``(chave, numero)``, para que partes
+presentes em centenas de milhares de processos (INSS, União, relatores)
+não virem um documento que cresce sem limite. As chaves são:
+
+- ``nome:<NOME NORMALIZADO>``   a partir dos ``envolvidos`` extraídos
+- ``cnpj:<dígitos>``            a partir dos processos gravados de uma busca
+                                por CNPJ e de documentos citados nos envolvidos
+
+Cada busca por CNPJ no formulário fica em ``partes_buscas``: ``buscado_em``
+registra quando foi feita e ``total_busca`` quantos processos a lista trouxe.
+Enquanto essa busca tiver menos de ``PARTY_INDEX_TTL`` segundos e o índice
+tiver, vindos de processos gravados, ao menos ``total_busca`` processos para
+o CNPJ, o spider resolve o CNPJ pelo índice e vai direto às páginas dos
+processos, sem o POST em ``cp.do``.
+"""
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+
+PARTY_COLLECTION = 'partes'
+PARTY_SEARCH_COLLECTION = 'partes_buscas'
+
+CNPJ_RE = re.compile(r'(?<!\d)(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})(?!\d)')
+CPF_RE = re.compile(r'(?<!\d)(\d{3}\.\d{3}\.\d{3}-\d{2})(?!\d)')
+# Sufixo de OAB dos advogados: "FULANO DE TAL - CE006397"
+OAB_SUFFIX_RE = re.compile(r'\s+-\s+[A-Z]{2}\d+[A-Z]?$')
+
+
+def digits(value):
+    return ''.join(filter(str.isdigit, str(value or '')))
+
+
+def normalize_name(nome):
+    """Nome sem acentos, em maiúsculas, sem espaços repetidos e sem o sufixo de OAB."""
+    if not nome:
+        return ''
+    sem_acentos = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    normalizado = ' '.join(sem_acentos.upper().split())
+    return OAB_SUFFIX_RE.sub('', normalizado)
+
+
+def documents_in(nome):
+    """CNPJs e CPFs citados no nome de uma parte, como ``(tipo, dígitos)``."""
+    documentos = [('cnpj', digits(m)) for m in CNPJ_RE.findall(nome or '')]
+    documentos += [('cpf', digits(m)) for m in CPF_RE.findall(nome or '')]
+    return documentos
+
+
+class PartyIndex:
+    def __init__(self, collection, searches=None, ttl=7 * 86400, clock=None):
+        self.collection = collection
+        self.searches = searches if searches is not None else collection.database[PARTY_SEARCH_COLLECTION]
+        self.ttl = ttl
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [('chave', 1), ('numero', 1)], name='chave_1_numero_1', unique=True, background=True
+        )
+        self.collection.create_index([('numero', 1)], name='numero_1', background=True)
+
+    def index_processo(self, numero, envolvidos, cnpj=None):
+        """Grava um vínculo (parte, processo) por parte do processo (um único bulk_write)."""
+        from pymongo import UpdateOne
+
+        numero = digits(numero)
+        if not numero:
+            return 0
+
+        agora = self.clock()
+        operacoes = {}
+
+        def entrada(chave, campos, papel=None):
+            update = {'$set': dict(campos, atualizado_em=agora)}
+            if papel:
+                update['$addToSet'] = {'papeis': papel}
+            operacoes[chave] = UpdateOne({'chave': chave, 'numero': numero}, update, upsert=True)
+
+        for envolvido in envolvidos or ():
+            nome = envolvido.get('nome')
+            normalizado = normalize_name(nome)
+            if normalizado:
+                entrada(f'nome:{normalizado}', {'tipo': 'nome', 'nome': normalizado}, envolvido.get('papel'))
+            for tipo, documento in documents_in(nome):
+                entrada(f'{tipo}:{documento}', {'tipo': tipo, 'documento': documento, 'nome': normalizado})
+
+        if cnpj:
+            entrada(f'cnpj:{digits(cnpj)}', {'tipo': 'cnpj', 'documento': digits(cnpj)})
+
+        if operacoes:
+            self.collection.bulk_write(list(operacoes.values()), ordered=False)
+        return len(operacoes)
+
+    def record_search(self, cnpj, total):
+        """
+        Registra uma busca por CNPJ no formulário e quantos processos a lista
+        trouxe. Os vínculos do CNPJ só vêm dos processos gravados
+        (``index_processo``), então a contagem da lista é independente deles.
+        """
+        documento = digits(cnpj)
+        self.searches.update_one(
+            {'_id': f'cnpj:{documento}'},
+            {'$set': {'documento': documento, 'buscado_em': self.clock(), 'total_busca': total}},
+            upsert=True
+        )
+
+    def resolve(self, cnpj):
+        """
+        Processos do CNPJ se o índice estiver fresco e completo; None quando
+        é preciso buscar no formulário.
+        """
+        chave = f'cnpj:{digits(cnpj)}'
+        busca = self.searches.find_one({'_id': chave})
+        if not busca or not busca.get('buscado_em'):
+            return None
+
+        buscado_em = busca['buscado_em']
+        if buscado_em.tzinfo is None:
+            # pymongo devolve datas UTC sem fuso
+            buscado_em = buscado_em.replace(tzinfo=timezone.utc)
+        if self.clock() - buscado_em > timedelta(seconds=self.ttl):
+            return None
+
+        processos = [
+            vinculo['numero']
+            for vinculo in self.collection.find({'chave': chave}, {'numero': True, '_id': False})
+        ]
+        if len(processos) < busca.get('total_busca', 0):
+            return None
+        return processos
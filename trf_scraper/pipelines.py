@@ -1,7 +1,68 @@
+import hashlib
+import json
+import time
+import weakref
+
+from trf_scraper.indexes import ensure_indexes
+from trf_scraper.items import to_document
+from trf_scraper.partyindex import PARTY_COLLECTION, PartyIndex
+from trf_scraper.textcodes import COUNTERS_COLLECTION, TEXT_COLLECTION, TextDictionary, ensure_text_index
+
+
+# Campos que mudam a cada coleta sem que o processo tenha mudado
+VOLATILE_FIELDS = ('data_extracao', 'url', 'cnpj_busca')
+
+
+# Itens que o MongoDBPipeline gravou (ou confirmou sem alteração). Quem marca
+# processos como concluídos (checkpoint, shards, vistos) consulta was_stored:
+# item_scraped também dispara quando a gravação falhou ou não houve conexão
+_stored = weakref.WeakSet()
+
+
+def was_stored(item):
+    try:
+        return item in _stored
+    except TypeError:
+        return False
+
+
+def _mark_stored(item):
+    try:
+        _stored.add(item)
+    except TypeError:
+        # dict comum não aceita weakref; o spider produz ProcessoItem
+        pass
+
+
+def persists_items(settings):
+    """Se o MongoDBPipeline está ativo; sem ele, todo item raspado conta como gravado."""
+    from scrapy.utils.misc import load_object
+
+    pipelines = settings.getwithbase('ITEM_PIPELINES')
+    return any(
+        ordem is not None and load_object(path) is MongoDBPipeline
+        for path, ordem in pipelines.items()
+    )
+
+
+def content_hash(document):
+    """Hash do conteúdo do processo, ignorando os campos voláteis."""
+    conteudo = {k: v for k, v in document.items() if k not in VOLATILE_FIELDS}
+    serializado = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(serializado.encode('utf-8')).hexdigest()
+
+
 class MongoDBPipeline:
-    def __init__(self, mongo_uri, mongo_db):
+    def __init__(self, mongo_uri, mongo_db, text_index=False, text_encoding=False, text_encoding_min_count=3,
+                 party_index=False):
         self.mongo_uri = mongo_uri
         self.mongo_db = mongo_db
+        self.text_index = text_index
+        self.text_encoding = text_encoding
+        self.text_encoding_min_count = text_encoding_min_count
+        self.text_dictionary = None
+        self.party_index_enabled = party_index
+        self.party_index = None
         self.client = None
         self.db = None
 
@@ -9,7 +70,11 @@ class MongoDBPipeline:
     def from_crawler(cls, crawler):
         return cls(
             mongo_uri=crawler.settings.get('MONGO_URI', 'mongodb://localhost:27017/'),
-            mongo_db=crawler.settings.get('MONGO_DATABASE', 'trf5_processos')
+            mongo_db=crawler.settings.get('MONGO_DATABASE', 'trf5_processos'),
+            text_index=crawler.settings.getbool('MONGO_TEXT_INDEX'),
+            text_encoding=crawler.settings.getbool('MONGO_TEXT_ENCODING'),
+            text_encoding_min_count=crawler.settings.getint('MONGO_TEXT_ENCODING_MIN_COUNT', 3),
+            party_index=crawler.settings.getbool('PARTY_INDEX_ENABLED')
         )
     
     def open_spider(self, spider):
@@ -29,8 +94,26 @@ class MongoDBPipeline:
             self.client.admin.command('ping')
             spider.logger.info("Conexão com MongoDB estabelecida com sucesso.")
             
-            self.db.processos.create_index('numero_processo', unique=True)
-            spider.logger.info("Índice 'numero_processo' garantido no MongoDB.")
+            ensure_indexes(
+                self.db.processos,
+                text_index=self.text_index,
+                logger=spider.logger
+            )
+            spider.logger.info("Índices da coleção 'processos' garantidos no MongoDB.")
+
+            if self.text_encoding:
+                self.text_dictionary = TextDictionary(
+                    self.db[TEXT_COLLECTION],
+                    self.db[COUNTERS_COLLECTION],
+                    min_count=self.text_encoding_min_count
+                )
+                ensure_text_index(self.db[TEXT_COLLECTION])
+                carregados = self.text_dictionary.load()
+                spider.logger.info(f"Dicionário de textos de movimentação: {carregados} códigos")
+
+            if self.party_index_enabled:
+                self.party_index = PartyIndex(self.db[PARTY_COLLECTION])
+                self.party_index.ensure_indexes()
             
         except ImportError:
             spider.logger.warning(
@@ -54,35 +137,65 @@ class MongoDBPipeline:
         
         try:
             from datetime import datetime
-            from scrapy.utils.serialize import ScrapyJSONEncoder
             from pymongo.errors import PyMongoError
             
-            item_dict = dict(item)
-            
-            encoder = ScrapyJSONEncoder()
-            item_json = encoder.encode(item_dict)
-            import json
-            item_dict = json.loads(item_json)
+            item_dict = to_document(item)
             
             numero_processo = item_dict.get('numero_processo')
+            cnpj_busca = item_dict.pop('cnpj_busca', None)
             
             if numero_processo:
+                stats = spider.crawler.stats
+                digest = content_hash(item_dict)
+
+                inicio = time.perf_counter()
+                if self._touch_unchanged(numero_processo, digest, cnpj_busca):
+                    if self.party_index is not None and cnpj_busca:
+                        # Partes já indexadas; falta só o vínculo com esta busca
+                        self.party_index.index_processo(numero_processo, (), cnpj_busca)
+                    self._record_write(stats, time.perf_counter() - inicio)
+                    spider.logger.debug("Processo sem alterações: %s", numero_processo)
+                    stats.inc_value('mongodb/items_unchanged')
+                    _mark_stored(item)
+                    return item
+
+                if self.text_dictionary is not None:
+                    item_dict['movimentacoes'], codificados = self.text_dictionary.encode(
+                        item_dict.get('movimentacoes')
+                    )
+                    stats.inc_value('mongodb/textos_codificados', codificados)
+
+                agora = datetime.now()
+                item_dict['content_hash'] = digest
+                item_dict['content_changed_at'] = agora
+                update = {
+                    '$set': item_dict,
+                    '$setOnInsert': {'created_at': agora},
+                    '$currentDate': {'updated_at': True, 'checked_at': True},
+                    '$inc': {'change_count': 1}
+                }
+                if cnpj_busca:
+                    update['$addToSet'] = {'cnpjs': cnpj_busca}
+
                 result = self.db.processos.update_one(
                     {'numero_processo': numero_processo},
-                    {
-                        '$set': item_dict,
-                        '$setOnInsert': {'created_at': datetime.now()},
-                        '$currentDate': {'updated_at': True}
-                    },
+                    update,
                     upsert=True
                 )
+                self._record_write(stats, time.perf_counter() - inicio)
+                _mark_stored(item)
                 
+                if self.party_index is not None:
+                    self.party_index.index_processo(
+                        numero_processo, item_dict.get('envolvidos'), cnpj_busca
+                    )
+
                 if result.upserted_id:
-                    spider.logger.info(f"Processo inserido: {numero_processo}")
-                    spider.crawler.stats.inc_value('mongodb/items_inserted')
+                    spider.logger.debug("Processo inserido: %s", numero_processo)
+                    stats.inc_value('mongodb/items_inserted')
                 else:
-                    spider.logger.info(f"Processo atualizado: {numero_processo}")
-                    spider.crawler.stats.inc_value('mongodb/items_updated')
+                    spider.logger.debug("Processo atualizado: %s", numero_processo)
+                    stats.inc_value('mongodb/items_updated')
             else:
                 spider.logger.warning("Processo sem número - não foi salvo no MongoDB")
                 spider.crawler.stats.inc_value('mongodb/items_skipped')
@@ -95,6 +208,27 @@ class MongoDBPipeline:
             spider.crawler.stats.inc_value('mongodb/errors')
         
         return item
+
+    def _touch_unchanged(self, numero_processo, digest, cnpj_busca):
+        """
+        Marca a verificação de um processo cujo conteúdo não mudou.
+
+        Retorna False quando o processo não existe ou tem outro hash; nesse
+        caso o documento precisa ser regravado por inteiro.
+        """
+        update = {'$currentDate': {'checked_at': True}}
+        if cnpj_busca:
+            update['$addToSet'] = {'cnpjs': cnpj_busca}
+        result = self.db.processos.update_one(
+            {'numero_processo': numero_processo, 'content_hash': digest},
+            update
+        )
+        return result.matched_count == 1
+
+    def _record_write(self, stats, elapsed):
+        stats.inc_value('mongodb/writes')
+        stats.inc_value('mongodb/write_time', elapsed, start=0.0)
+        stats.max_value('mongodb/write_time_max', elapsed)
     
 
         
\ No newline at end of file
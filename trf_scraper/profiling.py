@@ -0,0 +1,184 @@
+"""
+Instrumentação de tempo por etapa do crawl.
+
+A extensão ``CallbackProfiler`` embrulha os callbacks do spider, os
+``_extract_*``, os métodos do ItemLoader e o ``process_item`` dos
+pipelines, e acumula nas estatísticas do crawler:
+
+- ``profiling/<etapa>/calls``  número de chamadas
+- ``profiling/<etapa>/wall``   tempo de relógio acumulado (s)
+- ``profiling/<etapa>/cpu``    tempo de CPU acumulado (s)
+
+No fechamento são publicadas as médias por chamada e por item extraído.
+Os tempos são cumulativos: o de ``parse_processo`` inclui os
+``_extract_*`` e o ItemLoader chamados dentro dele.
+
+Com ``PROFILING_SAMPLE_PAGES = N`` até N páginas de processo sorteadas
+(probabilidade ``PROFILING_SAMPLE_RATE``) também passam pelo cProfile, e o
+resultado é gravado em ``logs/profile_<spider>_<data>.pstats``:
+
+    python -m pstats logs/profile_processo_20240101_120000.pstats
+
+Desligada (padrão), a extensão não é carregada e nada é embrulhado.
+"""
+import cProfile
+import functools
+import inspect
+import os
+import random
+import time
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.loader import ItemLoader
+from scrapy.utils.misc import load_object
+
+
+SPIDER_METHODS = (
+    'parse_form_cnpj',
+    'parse_lista_processos',
+    'parse_processo',
+    '_extract_envolvidos',
+    '_extract_movimentacoes',
+)
+LOADER_METHODS = ('add_xpath', 'add_value', 'load_item')
+SAMPLED_METHOD = 'parse_processo'
+
+
+class CallbackProfiler:
+    def __init__(self, stats, sample_pages=0, sample_rate=0.05, output_dir='logs', rng=None):
+        self.stats = stats
+        self.sample_pages = sample_pages
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.rng = rng or random.Random()
+        self.sampled = 0
+        self.profile = cProfile.Profile() if sample_pages else None
+        self.names = set()
+        self._patched = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PROFILING_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler.stats,
+            sample_pages=settings.getint('PROFILING_SAMPLE_PAGES', 0),
+            sample_rate=settings.getfloat('PROFILING_SAMPLE_RATE', 0.05),
+            output_dir=settings.get('PROFILING_DIR', 'logs')
+        )
+
+        # Os pipelines guardam os métodos já ligados na criação do engine,
+        # por isso são embrulhados aqui, na classe, e não no spider_opened
+        for path, order in settings.getwithbase('ITEM_PIPELINES').items():
+            if order is not None:
+                pipeline_cls = load_object(path)
+                ext._patch(pipeline_cls, 'process_item', f'pipeline/{pipeline_cls.__name__}')
+
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        for name in SPIDER_METHODS:
+            method = getattr(spider, name, None)
+            if method is not None:
+                setattr(spider, name, self.wrap(method, f'spider/{name}', sample=name == SAMPLED_METHOD))
+
+        for name in LOADER_METHODS:
+            self._patch(ItemLoader, name, f'loader/{name}')
+
+    def spider_closed(self, spider):
+        self.restore()
+
+        items = self.stats.get_value('item_scraped_count', 0)
+        for name in sorted(self.names):
+            calls = self.stats.get_value(f'profiling/{name}/calls', 0)
+            if not calls:
+                continue
+            for kind in ('wall', 'cpu'):
+                total = self.stats.get_value(f'profiling/{name}/{kind}', 0.0)
+                self.stats.set_value(f'profiling/{name}/{kind}_avg', round(total / calls, 6))
+                if items:
+                    self.stats.set_value(f'profiling/{name}/{kind}_per_item', round(total / items, 6))
+
+        if self.profile is not None and self.sampled:
+            os.makedirs(self.output_dir, exist_ok=True)
+            filename = os.path.join(
+                self.output_dir,
+                f'profile_{spider.name}_{datetime.now():%Y%m%d_%H%M%S}.pstats'
+            )
+            self.profile.dump_stats(filename)
+            spider.logger.info(f"Perfil de {self.sampled} páginas salvo em {filename}")
+
+    def restore(self):
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patched = []
+
+    def _patch(self, owner, name, label):
+        # Métodos herdados são embrulhados na própria classe e removidos depois
+        self._patched.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, self.wrap(getattr(owner, name), label))
+
+    def wrap(self, func, name, sample=False):
+        """Embrulha ``func``; geradores são medidos a cada passo da iteração."""
+        self.names.add(name)
+        stats = self.stats
+        calls_key = f'profiling/{name}/calls'
+        wall_key = f'profiling/{name}/wall'
+        cpu_key = f'profiling/{name}/cpu'
+
+        def record(wall, cpu):
+            stats.inc_value(wall_key, wall, start=0.0)
+            stats.inc_value(cpu_key, cpu, start=0.0)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stats.inc_value(calls_key)
+            profile = self._sample_profile() if sample else None
+
+            wall, cpu = time.perf_counter(), time.process_time()
+            if profile:
+                profile.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profile:
+                    profile.disable()
+                record(time.perf_counter() - wall, time.process_time() - cpu)
+
+            if inspect.isgenerator(result):
+                return self._timed_iter(result, record, profile)
+            return result
+
+        return wrapper
+
+    def _timed_iter(self, gen, record, profile):
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            if profile:
+                profile.enable()
+            try:
+                value = next(gen)
+            except StopIteration:
+                return
+            finally:
+                if profile:
+                    profile.disable()
+                record(time.perf_counter() - wall, time.process_time() - cpu)
+            yield value
+
+    def _sample_profile(self):
+        if self.profile is None or self.sampled >= self.sample_pages:
+            return None
+        if self.rng.random() >= self.sample_rate:
+            return None
+        self.sampled += 1
+        return self.profile
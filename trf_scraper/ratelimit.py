@@ -0,0 +1,84 @@
+"""
+Token bucket compartilhado entre processos, guardado em SQLite.
+
+Vários ``scrapy crawl processo`` rodando na mesma máquina (ou com o
+arquivo em um volume compartilhado) dividem o mesmo orçamento de
+requisições por segundo de cada host. O SQLite garante a exclusão mútua
+entre processos com ``BEGIN IMMEDIATE``; a espera pelo lock é curta
+(``lock_timeout``) para não travar o reactor, e quem não consegue o lock
+tenta de novo mais tarde.
+"""
+import os
+import sqlite3
+import time
+
+
+class SqliteTokenBucket:
+    """
+    Token bucket por host com reserva de tokens.
+
+    ``acquire`` sempre consome um token: se não houver saldo, o saldo fica
+    negativo e o método retorna quanto tempo o chamador deve esperar até
+    que o seu token tenha sido reposto. Assim as requisições saem em fila,
+    sem várias tentativas disputando o mesmo token. Se outro processo segurar
+    o banco por mais de ``lock_timeout`` segundos, retorna ``None`` sem
+    consumir nada.
+    """
+
+    def __init__(self, path, rates, burst=1, clock=time.time, lock_timeout=0.01):
+        self.path = path
+        self.rates = dict(rates)
+        self.burst = burst
+        self.clock = clock
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            ' host TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        # A criação acima pode esperar; cada acquire, não
+        self.db.execute(f'PRAGMA busy_timeout = {int(lock_timeout * 1000)}')
+
+    def acquire(self, host):
+        """Reserva um token de ``host`` e retorna a espera em segundos (``None``: banco ocupado)."""
+        rate = self.rates.get(host)
+        if not rate:
+            return 0.0
+
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                return None
+            raise
+        try:
+            now = self.clock()
+            row = self.db.execute(
+                'SELECT tokens, updated_at FROM buckets WHERE host = ?', (host,)
+            ).fetchone()
+            if row is None:
+                tokens = float(self.burst)
+            else:
+                tokens = min(self.burst, row[0] + (now - row[1]) * rate)
+
+            tokens -= 1
+            self.db.execute(
+                'INSERT OR REPLACE INTO buckets (host, tokens, updated_at) VALUES (?, ?, ?)',
+                (host, tokens, now)
+            )
+            self.db.execute('COMMIT')
+        except Exception:
+            self.db.execute('ROLLBACK')
+            raise
+
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def close(self):
+        self.db.close()
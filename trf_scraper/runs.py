@@ -0,0 +1,225 @@
+"""
+Histórico de execuções do crawl.
+
+A extensão ``RunReport`` (``RUN_REPORT_ENABLED``) grava, ao fim de cada
+execução, um registro compacto na coleção ``runs`` do MongoDB: tamanho da
+entrada, itens, páginas/s, p95 de latência, retries, inserções/atualizações
+no banco e pico de memória. Se o MongoDB não estiver disponível, o registro
+é acrescentado a ``logs/runs.jsonl``.
+
+O registro é gravado no ``engine_stopped``, depois que todos os
+``spider_closed`` rodaram e os percentis de latência já foram publicados.
+
+Para comparar as últimas execuções:
+
+    scrapy runs -n 10
+"""
+import json
+import os
+import statistics
+import sys
+from datetime import datetime, timezone
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+RUN_FIELDS = (
+    # (campo, cabeçalho, largura)
+    ('started_at', 'início', 19),
+    ('reason', 'motivo', 10),
+    ('input_total', 'entrada', 8),
+    ('items', 'itens', 7),
+    ('duration', 'duração', 9),
+    ('pages_per_second', 'pág/s', 7),
+    ('items_per_second', 'itens/s', 8),
+    ('latency_p95', 'p95', 7),
+    ('retries', 'retries', 8),
+    ('mongodb_inserted', 'novos', 7),
+    ('mongodb_updated', 'alter.', 7),
+    ('mongodb_unchanged', 'iguais', 7),
+    ('peak_memory_mb', 'mem MB', 8),
+)
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value
+
+
+def peak_memory_mb(stats):
+    """Pico de memória do processo em MB, da fonte mais precisa disponível."""
+    memusage = stats.get('memusage/max')
+    if memusage:
+        return round(memusage / 1048576, 1)
+    if stats.get('memdiag/rss_max_mb'):
+        return stats['memdiag/rss_max_mb']
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((maxrss if sys.platform == 'darwin' else maxrss * 1024) / 1048576, 1)
+
+
+def build_run_record(spider, stats):
+    """Resume as estatísticas do crawl em um registro de execução."""
+    get = stats.get
+    duration = get('elapsed_time_seconds') or 0.0
+    items = get('item_scraped_count', 0)
+    pages = get('response_received_count', 0)
+    processos = getattr(spider, 'processos', None) or []
+
+    return {
+        'spider': spider.name,
+        'cnpj': getattr(spider, 'cnpj', None),
+        'started_at': _isoformat(get('start_time')),
+        'finished_at': _isoformat(get('finish_time')),
+        'duration': round(duration, 1),
+        'reason': get('finish_reason'),
+        'input_total': len(processos) + get('input/discovered', 0),
+        'items': items,
+        'pages': pages,
+        'pages_per_second': round(pages / duration, 3) if duration else 0.0,
+        'items_per_second': round(items / duration, 3) if duration else 0.0,
+        'latency_p95': get('latency/processo/total/p95'),
+        'retries': get('retry/count', 0),
+        'retries_exhausted': get('retry/max_reached', 0),
+        'retries_deferred': get('retry/deferred', 0),
+        'mongodb_inserted': get('mongodb/items_inserted', 0),
+        'mongodb_updated': get('mongodb/items_updated', 0),
+        'mongodb_unchanged': get('mongodb/items_unchanged', 0),
+        'mongodb_errors': get('mongodb/errors', 0),
+        'peak_memory_mb': peak_memory_mb(stats),
+    }
+
+
+def append_jsonl(path, record):
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def load_jsonl_runs(path, spider=None):
+    """Execuções gravadas no arquivo local, da mais antiga para a mais recente."""
+    runs = []
+    if not os.path.exists(path):
+        return runs
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and (spider is None or record.get('spider') == spider):
+                runs.append(record)
+    runs.sort(key=lambda r: r.get('started_at') or '')
+    return runs
+
+
+def load_mongo_runs(collection, spider=None, limit=10):
+    filtro = {'spider': spider} if spider else {}
+    cursor = collection.find(filtro, {'_id': 0}).sort('started_at', -1).limit(limit)
+    return list(reversed(list(cursor)))
+
+
+def find_regressions(runs, field='pages_per_second', tolerance=0.2, baseline=5):
+    """
+    Marca as execuções cujo ``field`` ficou mais de ``tolerance`` abaixo da
+    mediana das ``baseline`` execuções anteriores (que terminaram normalmente).
+
+    Retorna ``{índice: mediana}`` para cada execução marcada.
+    """
+    regressions = {}
+    for i, run in enumerate(runs):
+        anteriores = [
+            r[field] for r in runs[max(0, i - baseline):i]
+            if r.get(field) and r.get('reason') == 'finished'
+        ]
+        if not anteriores or not run.get(field):
+            continue
+        mediana = statistics.median(anteriores)
+        if run[field] < mediana * (1 - tolerance):
+            regressions[i] = mediana
+    return regressions
+
+
+def format_runs(runs, regressions=None):
+    """Tabela de texto com uma linha por execução."""
+    regressions = regressions or {}
+    linhas = [' '.join(f'{titulo:>{largura}}' for _, titulo, largura in RUN_FIELDS)]
+    for i, run in enumerate(runs):
+        celulas = []
+        for field, _, largura in RUN_FIELDS:
+            value = run.get(field)
+            if value is None:
+                value = '-'
+            elif field == 'started_at':
+                value = str(value)[:19].replace('T', ' ')
+            celulas.append(f'{str(value):>{largura}}')
+        linha = ' '.join(celulas)
+        if i in regressions:
+            linha += f'  << regressão (mediana {regressions[i]:.2f} pág/s)'
+        linhas.append(linha)
+    return '\n'.join(linhas)
+
+
+class RunReport:
+    def __init__(self, crawler, mongo_uri=None, mongo_db=None, fallback_path='logs/runs.jsonl'):
+        self.crawler = crawler
+        self.mongo_uri = mongo_uri
+        self.mongo_db = mongo_db
+        self.fallback_path = fallback_path
+        self.spider = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RUN_REPORT_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            crawler,
+            mongo_uri=settings.get('MONGO_URI'),
+            mongo_db=settings.get('MONGO_DATABASE'),
+            fallback_path=settings.get('RUN_REPORT_FILE', 'logs/runs.jsonl')
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        return ext
+
+    def spider_opened(self, spider):
+        self.spider = spider
+
+    def engine_stopped(self):
+        if self.spider is None:
+            return
+        record = build_run_record(self.spider, self.crawler.stats.get_stats())
+        self.save(record)
+
+    def save(self, record):
+        logger = self.spider.logger
+        try:
+            self._insert_mongo(dict(record))
+            logger.info("Registro da execução gravado na coleção 'runs'")
+            return 'mongodb'
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar a execução no MongoDB ({e}), usando {self.fallback_path}")
+
+        append_jsonl(self.fallback_path, record)
+        return self.fallback_path
+
+    def _insert_mongo(self, record):
+        from pymongo import MongoClient
+
+        client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=2000)
+        try:
+            client[self.mongo_db].runs.insert_one(record)
+        finally:
+            client.close()
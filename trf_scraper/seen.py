@@ -0,0 +1,225 @@
+"""
+Conjunto persistente de processos já vistos, entre execuções e fontes.
+
+O mesmo processo chega pela entrada direta (``processos``), por várias
+listas de CNPJ e pelo índice de partes, na mesma execução e em execuções
+seguidas. ``SeenDupeFilter`` (``DUPEFILTER_CLASS``) deduplica pelo número
+normalizado de 20 dígitos em vez da impressão digital da requisição:
+
+- um filtro de Bloom em memória (cerca de 1,8 MB por milhão de processos
+  com 0,1% de falsos positivos) responde "nunca visto" sem ir ao disco;
+- quando o Bloom diz "talvez", a tabela SQLite ``seen`` decide.
+
+Um processo é duplicado se já foi agendado nesta execução ou se foi gravado
+(sinal ``item_scraped`` de um item que o MongoDBPipeline confirmou) há menos
+de ``SEEN_TTL`` segundos. Falhas de uma
+execução anterior voltam a ser buscadas. O Bloom é salvo ao lado do banco
+(``<SEEN_DB>.bloom``) com o último rowid incluído; na abertura as linhas
+mais novas (de outros workers ou de uma execução que caiu) são acrescentadas.
+
+Requisições sem número de processo (formulário, listas) continuam no
+filtro por impressão digital do Scrapy.
+"""
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+import time
+
+from scrapy import signals
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from trf_scraper.journal import numero_from_request
+from trf_scraper.pipelines import persists_items, was_stored
+
+
+logger = logging.getLogger(__name__)
+
+BLOOM_MAGIC = b'TRFBL1'
+BLOOM_HEADER = struct.Struct('>6sQBQQ')
+
+
+def normalize(numero):
+    """Número do processo só com dígitos; None se não tiver 20 dígitos."""
+    numero = ''.join(filter(str.isdigit, str(numero or '')))
+    return numero if len(numero) == 20 else None
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.nbits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.nbits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.bits = bytearray((self.nbits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('ascii'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.nbits for i in range(self.k))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_bytes(self, last_rowid=0):
+        return BLOOM_HEADER.pack(BLOOM_MAGIC, self.nbits, self.k, self.count, last_rowid) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Retorna ``(filtro, last_rowid)``."""
+        magic, nbits, k, count, last_rowid = BLOOM_HEADER.unpack_from(data)
+        if magic != BLOOM_MAGIC or len(data) != BLOOM_HEADER.size + (nbits + 7) // 8:
+            raise ValueError("arquivo do filtro de Bloom inválido")
+        bloom = cls.__new__(cls)
+        bloom.nbits, bloom.k, bloom.count = nbits, k, count
+        # Capacidade para a qual k é ótimo
+        bloom.capacity = max(1, round(nbits * math.log(2) / k))
+        bloom.bits = bytearray(data[BLOOM_HEADER.size:])
+        return bloom, last_rowid
+
+
+class SeenSet:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS seen (
+            numero TEXT PRIMARY KEY,
+            fonte TEXT,
+            visto_em REAL NOT NULL,
+            concluido_em REAL
+        );
+    '''
+
+    def __init__(self, path, ttl=86400, capacity=1000000, error_rate=0.001, clock=time.time):
+        self.path = path
+        self.bloom_path = f'{path}.bloom'
+        self.ttl = ttl
+        self.error_rate = error_rate
+        self.clock = clock
+        self.started = clock()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.bloom = self._load_bloom(capacity)
+
+    def _load_bloom(self, capacity):
+        total = self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        bloom, last_rowid = None, 0
+        if os.path.exists(self.bloom_path):
+            try:
+                with open(self.bloom_path, 'rb') as f:
+                    bloom, last_rowid = BloomFilter.from_bytes(f.read())
+            except (ValueError, struct.error) as e:
+                logger.warning(f"Filtro de Bloom {self.bloom_path} descartado: {e}")
+        if bloom is None or bloom.capacity < total:
+            # Reconstruído da tabela, com folga para crescer
+            bloom, last_rowid = BloomFilter(max(capacity, 2 * total), self.error_rate), 0
+
+        for (numero,) in self.conn.execute('SELECT numero FROM seen WHERE rowid > ?', (last_rowid,)):
+            bloom.add(numero)
+        logger.info(f"Processos vistos em {self.path}: {total} ({bloom.nbits // 8 // 1024} KB de Bloom)")
+        return bloom
+
+    def check_and_add(self, numero, fonte=None):
+        """True se ``numero`` é duplicado; senão o registra como agendado agora."""
+        agora = self.clock()
+        if numero in self.bloom:
+            row = self.conn.execute(
+                'SELECT visto_em, concluido_em FROM seen WHERE numero = ?', (numero,)
+            ).fetchone()
+            if row:
+                visto_em, concluido_em = row
+                if visto_em >= self.started:
+                    return True
+                if concluido_em is not None and agora - concluido_em < self.ttl:
+                    return True
+        else:
+            self.bloom.add(numero)
+
+        self.conn.execute(
+            '''INSERT INTO seen (numero, fonte, visto_em) VALUES (?, ?, ?)
+               ON CONFLICT (numero) DO UPDATE SET fonte = excluded.fonte, visto_em = excluded.visto_em''',
+            (numero, fonte, agora)
+        )
+        return False
+
+    def mark_done(self, numeros):
+        self.conn.executemany(
+            'UPDATE seen SET concluido_em = ? WHERE numero = ?',
+            [(self.clock(), n) for n in numeros]
+        )
+
+    def close(self):
+        last_rowid = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM seen').fetchone()[0]
+        tmp = f'{self.bloom_path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(self.bloom.to_bytes(last_rowid))
+        os.replace(tmp, self.bloom_path)
+        self.conn.close()
+
+
+class SeenDupeFilter(RFPDupeFilter):
+    """Dupefilter pelo número do processo, com contagem de duplicados por fonte."""
+
+    def __init__(self, path=None, debug=False, *, fingerprinter=None, seen=None, stats=None,
+                 require_stored=False):
+        super().__init__(path, debug, fingerprinter=fingerprinter)
+        self.seen = seen
+        self.stats = stats
+        # Com o MongoDBPipeline ativo, só o que ele gravou conta como concluído
+        self.require_stored = require_stored
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy.utils.project import data_path
+
+        settings = crawler.settings
+        seen = SeenSet(
+            data_path(settings.get('SEEN_DB', 'seen.sqlite'), createdir=False),
+            ttl=settings.getfloat('SEEN_TTL', 86400),
+            capacity=settings.getint('SEEN_CAPACITY', 1000000),
+            error_rate=settings.getfloat('SEEN_ERROR_RATE', 0.001),
+        )
+        dupefilter = cls(
+            job_dir(settings),
+            settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            seen=seen,
+            stats=crawler.stats,
+            require_stored=persists_items(settings),
+        )
+        crawler.signals.connect(dupefilter.item_scraped, signal=signals.item_scraped)
+        return dupefilter
+
+    def request_seen(self, request):
+        numero = normalize(numero_from_request(request))
+        if numero is None:
+            return super().request_seen(request)
+
+        fonte = request.meta.get('fonte', 'outro')
+        duplicado = self.seen.check_and_add(numero, fonte)
+        self.stats.inc_value(f"seen/{'duplicate' if duplicado else 'new'}/{fonte}")
+        return duplicado
+
+    def item_scraped(self, item, response, spider):
+        if self.require_stored and not was_stored(item):
+            # Falha no MongoDB: a próxima execução deve buscar de novo
+            return
+        numeros = {normalize(item.get('numero_processo')), normalize(response.meta.get('numero_busca'))}
+        self.seen.mark_done(n for n in numeros if n)
+
+    def close(self, reason):
+        super().close(reason)
+        self.seen.close()
@@ -1,9 +1,19 @@
 from datetime import datetime
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 from scrapy.http import FormRequest
 from scrapy.loader import ItemLoader
+from scrapy.utils.misc import load_object
 
-from trf_scraper.items import ProcessoItem, EnvolvidoItem, MovimentacaoItem
+from trf_scraper.checkpoint import Checkpoint
+from trf_scraper.deadline import parse_deadline
+from trf_scraper.freshness import FreshnessScorer, score_priority
+from trf_scraper.frontier import digits, worker_id
+from trf_scraper.items import ProcessoItem, Envolvido, Movimentacao
+from trf_scraper.journal import PROCESSO_URL_RE, read_failures
+from trf_scraper.partyindex import PARTY_COLLECTION, PartyIndex
+from trf_scraper.pipelines import persists_items, was_stored
 
 
 class ProcessoSpider(scrapy.Spider):
@@ -11,68 +21,293 @@ class ProcessoSpider(scrapy.Spider):
     name = "processo"
     allowed_domains = ["www5.trf5.jus.br", "cp.trf5.jus.br"]
     
-    START_URL = 'http://www5.trf5.jus.br/cp/'
+    # Host canônico: http://www5.trf5.jus.br/cp/ redireciona para cá
+    START_URL = 'https://cp.trf5.jus.br/cp/'
     FORM_ACTION_URL = 'https://cp.trf5.jus.br/cp/cp.do'
     PROCESSO_URL = 'https://cp.trf5.jus.br/processo/{}'
+    # Concorrência e delay são ajustados pelo AdaptiveConcurrencyMiddleware
     custom_settings = {
         'ROBOTSTXT_OBEY': False,
-        'CONCURRENT_REQUESTS': 4,
-        'DOWNLOAD_DELAY': 2,
-        'AUTOTHROTTLE_ENABLED': True,
-        'AUTOTHROTTLE_START_DELAY': 1,
-        'AUTOTHROTTLE_MAX_DELAY': 5,
         'RETRY_TIMES': 3,
         'RETRY_HTTP_CODES': [500, 502, 503, 504, 408, 429],
     }
+    # O daemon (trf_scraper/daemon.py) recebe os processos depois de aberto
+    requires_input = True
 
-    def __init__(self, processos=None, cnpj=None, *args, **kwargs):
+    def __init__(self, processos=None, cnpj=None, retry_from=None, arquivo_processos=None, frontier=None,
+                 checkpoint=None, resume=None, prioridade=None, orcamento=None, deadline=None,
+                 concluidos=None, *args, **kwargs):
         super(ProcessoSpider, self).__init__(*args, **kwargs)
         self.processos = processos.split(',') if processos else []
         self.cnpj = cnpj
+        self.frontier_path = frontier
+        self.frontier = None
+        self.worker = worker_id()
+        self._leased = set()
+        # resume= continua gravando no mesmo checkpoint
+        self.checkpoint_path = resume or checkpoint
+        self.resume = bool(resume)
+        self.checkpoint = None
+        # Processos já concluídos em outra execução (arquivo, um por linha): não são buscados
+        self.concluidos = self._load_done_file(concluidos) if concluidos else set()
+        # Com o MongoDBPipeline ativo, só o que ele gravou conta como concluído
+        self._require_stored = False
+        self._party_index = None
+        # Desligado na primeira falha do MongoDB, para não esperar o timeout a cada CNPJ
+        self._party_index_ok = True
+        self._mongo_client = None
+        if prioridade not in (None, 'fixa', 'freshness'):
+            raise ValueError("prioridade deve ser 'fixa' ou 'freshness'")
+        # Com prazo, o que couber na janela deve ser o de maior valor
+        self.deadline = parse_deadline(deadline)
+        self.prioridade = prioridade or ('freshness' if self.deadline else 'fixa')
+        # Máximo de páginas de processo agendadas nesta execução
+        self.orcamento = int(orcamento) if orcamento else None
+        self._agendados = 0
+        self._freshness = None
 
-        if not self.processos and not self.cnpj:
-            raise ValueError("Informe pelo menos um parâmetro: processos ou cnpj")
-        
-        self.logger.info(f"Spider inicializado - Processos: {len(self.processos)}, CNPJ: {bool(self.cnpj)}")
+        if arquivo_processos:
+            self._load_input_file(arquivo_processos)
+
+        if retry_from:
+            self._load_retry_journal(retry_from)
+
+        if self.requires_input and not self.processos and not self.cnpj and not self.frontier_path:
+            raise ValueError(
+                "Informe pelo menos um parâmetro: processos, cnpj, arquivo_processos, retry_from ou frontier"
+            )
         
+        self.logger.info(f"Spider inicializado - Processos: {len(self.processos)}, CNPJs: {len(self.cnpjs)}")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.frontier_path:
+            frontier_cls = load_object(crawler.settings.get('FRONTIER_CLASS'))
+            spider.frontier = frontier_cls.from_settings(spider.frontier_path, crawler.settings)
+            crawler.signals.connect(spider.frontier_idle, signal=signals.spider_idle)
+            crawler.signals.connect(spider.frontier_item, signal=signals.item_scraped)
+        spider._require_stored = persists_items(crawler.settings)
+        if spider.checkpoint_path:
+            spider.checkpoint = Checkpoint.from_settings(
+                spider.checkpoint_path, crawler.settings, resume=spider.resume
+            )
+            spider.checkpoint.entrada = [p.strip() for p in spider.processos if p.strip()]
+            crawler.signals.connect(spider.checkpoint_item, signal=signals.item_scraped)
+        return spider
+
+    @property
+    def cnpjs(self):
+        """CNPJs a buscar; ``-a cnpj`` aceita vários separados por vírgula."""
+        if not self.cnpj:
+            return []
+        return [c.strip() for c in self.cnpj.split(',') if c.strip()]
+
+    def _load_input_file(self, path):
+        """Acrescenta os processos de um arquivo (um por linha; # comenta)."""
+        with open(path, encoding='utf-8') as f:
+            for linha in f:
+                linha = linha.split('#', 1)[0].strip()
+                if linha:
+                    self.processos.append(linha)
+        
+    def _load_done_file(self, path):
+        """Números (só dígitos) de um arquivo de processos concluídos."""
+        with open(path, encoding='utf-8') as f:
+            return {digits(linha) for linha in f if digits(linha)}
+
+    def _load_retry_journal(self, path):
+        """Acrescenta as falhas de um diário JSONL aos processos, sem repetir."""
+        processos, cnpjs = read_failures(path)
+
+        vistos = {''.join(filter(str.isdigit, p)) for p in self.processos}
+        for processo in processos:
+            chave = ''.join(filter(str.isdigit, processo))
+            if chave not in vistos:
+                vistos.add(chave)
+                self.processos.append(processo)
+
+        if cnpjs and not self.cnpj:
+            self.cnpj = ','.join(cnpjs)
+
+        self.logger.info(
+            f"Retry a partir de {path}: {len(processos)} processos, {len(cnpjs)} CNPJs"
+        )
+
     def start_requests(self):
         """
         Inicia requisições:
         - Processos individuais: GET direto (mais rápido e eficiente)
         - CNPJ: POST via formulário (necessário para busca)
         """
-        for processo in self.processos:
-            processo = processo.strip()
-            if not processo:
-                continue
-            
-            # Remove formatação do número do processo para a URL
-            processo_limpo = processo.replace('-', '').replace('.', '')
-            url = self.PROCESSO_URL.format(processo_limpo)
-            
-            self.logger.info(f"Acessando processo diretamente: {processo} -> {url}")
-            
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_processo,
-                meta={
-                    'numero_busca': processo,
-                    'dont_cache': True,
-                },
-                priority=1,
-                errback=self.handle_error
+        if self.frontier is not None:
+            # Os processos informados entram na fila compartilhada, e este
+            # worker pega lotes dela como os demais
+            novos = self.frontier.add(p for p in self.processos if p.strip())
+            self.logger.info(f"Frontier {self.frontier_path}: {novos} processos adicionados")
+            yield from self._lease_requests()
+        else:
+            if self.checkpoint is not None:
+                processos = list(self.checkpoint.pending_input())
+                self.logger.info(
+                    f"Checkpoint {self.checkpoint_path}: {len(processos)} de "
+                    f"{len(self.checkpoint.entrada)} processos pendentes"
+                )
+                self.crawler.stats.inc_value(
+                    'checkpoint/skipped', len(self.checkpoint.entrada) - len(processos)
+                )
+            else:
+                processos = [p.strip() for p in self.processos if p.strip()]
+            if self.concluidos:
+                processos = [p for p in processos if not self._checkpoint_done(p)]
+            for processo, priority in self._prioritize(processos, priority=1):
+                yield self._processo_request(processo, priority=priority)
+        
+        for cnpj in self.cnpjs:
+            yield from self._cnpj_requests(cnpj)
+
+    async def start(self):
+        # Scrapy >= 2.13 inicia o crawl por start(); versões anteriores chamam
+        # start_requests() diretamente
+        for request in self.start_requests():
+            yield request
+
+    def _processo_request(self, processo, fonte='processos', priority=1):
+        # Remove formatação do número do processo para a URL
+        processo_limpo = processo.replace('-', '').replace('.', '')
+        url = self.PROCESSO_URL.format(processo_limpo)
+        
+        self.logger.debug("Acessando processo diretamente: %s -> %s", processo, url)
+        
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_processo,
+            # fonte: origem do número, para as contagens de duplicados (SeenDupeFilter)
+            meta={'numero_busca': processo, 'fonte': fonte},
+            priority=priority,
+            errback=self.handle_error
+        )
+
+    def _lease_requests(self):
+        numeros = self.frontier.lease(
+            self.worker,
+            self.settings.getint('FRONTIER_BATCH', 50),
+            self.settings.getfloat('FRONTIER_LEASE_TIMEOUT', 600)
+        )
+        self._leased.update(numeros)
+        self.crawler.stats.inc_value('frontier/leased', len(numeros))
+        for numero in numeros:
+            yield self._processo_request(numero, fonte='frontier')
+
+    def frontier_idle(self, spider):
+        """Sem requisições pendentes: pega outro lote ou espera os outros workers."""
+        requests = list(self._lease_requests())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests:
+            self.logger.info(f"{len(requests)} processos arrendados do frontier")
+            raise DontCloseSpider
+        if self.frontier.has_work():
+            # Números arrendados por outros workers ou devolvidos com atraso
+            raise DontCloseSpider
+
+    def _frontier_ack(self, response):
+        if not self._leased:
+            return
+        numero = digits(response.meta.get('numero_busca'))
+        if numero in self._leased:
+            self._leased.discard(numero)
+            self.frontier.ack([numero])
+            self.crawler.stats.inc_value('frontier/acked')
+
+    def frontier_item(self, item, response, spider):
+        """Processo gravado pelos pipelines: confirma o número no frontier."""
+        if self._require_stored and not was_stored(item):
+            # Falha no MongoDB: o arrendamento volta ao frontier no fechamento
+            return
+        self._frontier_ack(response)
+
+    def checkpoint_item(self, item, response, spider):
+        """Processo gravado pelos pipelines: anota no checkpoint."""
+        if self._require_stored and not was_stored(item):
+            # Falha no MongoDB: fica de fora para a retomada buscar de novo
+            return
+        numeros = {digits(item.get('numero_processo')), digits(response.meta.get('numero_busca'))}
+        self.checkpoint.mark(n for n in numeros if n)
+
+    def _checkpoint_done(self, numero):
+        if digits(numero) not in self.concluidos and (self.checkpoint is None or numero not in self.checkpoint):
+            return False
+        self.crawler.stats.inc_value('checkpoint/skipped')
+        return True
+
+    def _prioritize(self, numeros, priority=1):
+        """
+        Processos como ``(numero, prioridade)``: em ordem de nota de frescor com
+        prioridade=freshness, senão na ordem recebida; sem passar do orçamento.
+        """
+        ordenados = [(n, priority) for n in numeros]
+        scorer = self._get_freshness()
+        if scorer is not None and numeros:
+            try:
+                ranking = scorer.rank(numeros)
+            except Exception as e:
+                self.logger.warning(f"Notas de frescor indisponíveis ({e}), mantendo a ordem da entrada")
+                # Não espera o timeout do MongoDB de novo a cada lista
+                self.prioridade = 'fixa'
+                self._freshness = None
+            else:
+                ordenados = [(n, score_priority(nota)) for n, nota in ranking]
+                self.crawler.stats.inc_value('freshness/scored', len(ranking))
+                self.crawler.stats.inc_value(
+                    'freshness/expected_changes',
+                    sum(nota for _, nota in ranking[:self._budget_left(len(ranking))]),
+                    start=0.0
+                )
+
+        permitidos = self._budget_left(len(ordenados))
+        if permitidos < len(ordenados):
+            self.crawler.stats.inc_value('freshness/over_budget', len(ordenados) - permitidos)
+        self._agendados += permitidos
+        return ordenados[:permitidos]
+
+    def _budget_left(self, total):
+        if self.orcamento is None:
+            return total
+        return max(min(total, self.orcamento - self._agendados), 0)
+
+    def _cnpj_requests(self, cnpj):
+        cnpj_limpo = self._clean_cnpj(cnpj)
+        indexados = self._resolve_from_party_index(cnpj_limpo)
+        if indexados is not None:
+            self.logger.info(
+                f"CNPJ {cnpj_limpo} resolvido pelo índice de partes: {len(indexados)} processos"
             )
+            self.crawler.stats.inc_value('party_index/hit')
+            self.crawler.stats.inc_value('input/discovered', len(indexados))
+            pendentes = [n for n in indexados if not self._checkpoint_done(n)]
+            for numero, priority in self._prioritize(pendentes, priority=0):
+                yield scrapy.Request(
+                    url=self.PROCESSO_URL.format(numero),
+                    callback=self.parse_processo,
+                    cb_kwargs={'cnpj': cnpj_limpo},
+                    meta={'numero_busca': numero, 'fonte': 'indice_partes'},
+                    priority=priority,
+                    errback=self.handle_error
+                )
+            return
+
+        self.logger.info(f"Acessando formulário para busca por CNPJ: {cnpj}")
         
-        if self.cnpj:
-            self.logger.info(f"Acessando formulário para busca por CNPJ: {self.cnpj}")
-            
-            yield scrapy.Request(
-                url=self.START_URL,
-                callback=self.parse_form_cnpj,
-                meta={'cnpj': self.cnpj},
-                priority=2,
-                errback=self.handle_error
-            )
+        yield scrapy.Request(
+            url=self.START_URL,
+            callback=self.parse_form_cnpj,
+            meta={'cnpj': cnpj},
+            priority=2,
+            # Mesma URL para cada CNPJ buscado
+            dont_filter=True,
+            errback=self.handle_error
+        )
 
     def parse_form_cnpj(self, response):
         """Processa formulário e faz busca por CNPJ"""
@@ -86,12 +321,12 @@ class ProcessoSpider(scrapy.Spider):
             url=self.FORM_ACTION_URL,
             formdata=formdata,
             callback=self.parse_lista_processos,
-            meta={'dont_cache': True},
+            cb_kwargs={'cnpj': cnpj_limpo},
             priority=2,
             errback=self.handle_error
         )
 
-    def parse_lista_processos(self, response):
+    def parse_lista_processos(self, response, cnpj=None):
         self.logger.info("Processando lista de processos do CNPJ...")
         
         links = response.css('a.linkar::attr(href)').getall()
@@ -105,21 +340,37 @@ class ProcessoSpider(scrapy.Spider):
             return
         
         self.logger.info(f"Encontrados {len(links)} processos para o CNPJ")
+        self.crawler.stats.inc_value('input/discovered', len(links))
+        self._record_cnpj_search(cnpj, links)
         
+        por_numero = {}
+        sem_numero = []
         for link in links:
+            match = PROCESSO_URL_RE.search(link)
+            if match:
+                por_numero.setdefault(match.group(1), link)
+            else:
+                sem_numero.append((link, 0))
+        pendentes = [n for n in por_numero if not self._checkpoint_done(n)]
+        seguir = [(por_numero[n], priority) for n, priority in self._prioritize(pendentes, priority=0)]
+        
+        for link, priority in seguir + sem_numero:
             yield response.follow(
                 link,
                 callback=self.parse_processo,
+                cb_kwargs={'cnpj': cnpj},
+                meta={'fonte': 'cnpj'},
+                priority=priority,
                 errback=self.handle_error
             )
 
-    def parse_processo(self, response):
-        self.logger.info(f"Processando página do processo: {response.url}")
+    def parse_processo(self, response, cnpj=None):
+        self.logger.debug("Processando página do processo: %s", response.url)
         
         has_process = response.xpath("//p[contains(., 'PROCESSO N')]").get()
-        self.logger.info(f"Process header found: {has_process is not None}")
-        if has_process:
-            self.logger.info(f"Process header text: {has_process[:100]}")
+        self.crawler.stats.inc_value(
+            'processo/cabecalho_encontrado' if has_process else 'processo/cabecalho_ausente'
+        )
         
         if self._is_error_page(response):
             processo_num = response.xpath("//p[contains(., 'PROCESSO N')]/text()").get()
@@ -138,6 +389,8 @@ class ProcessoSpider(scrapy.Spider):
                 self.logger.error(f"No error keywords found, but has_process_number={has_process is not None}")
             
             self._save_debug_html(response, 'erro_processo')
+            self.crawler.stats.inc_value('processo/pagina_erro')
+            self._frontier_ack(response)
             return
         
         loader = ItemLoader(item=ProcessoItem(), response=response)
@@ -148,6 +401,8 @@ class ProcessoSpider(scrapy.Spider):
         
         loader.add_value('url', response.url)
         loader.add_value('data_extracao', datetime.now())
+        if cnpj:
+            loader.add_value('cnpj_busca', cnpj)
         
         item = loader.load_item()
         
@@ -166,6 +421,7 @@ class ProcessoSpider(scrapy.Spider):
                 f"Número de processo inválido: {item['numero_processo']} - {response.url}"
             )
             self.crawler.stats.inc_value('validation/invalid_numero_processo')
+            self._frontier_ack(response)
             return
         
         yield item
@@ -193,12 +449,9 @@ class ProcessoSpider(scrapy.Spider):
             nome = nome.lstrip(':').strip()
             
             if papel and nome:
-                loader = ItemLoader(item=EnvolvidoItem())
-                loader.add_value('papel', papel)
-                loader.add_value('nome', nome)
-                envolvidos.append(loader.load_item())
+                envolvidos.append(Envolvido.extract(papel, nome))
         
-        self.logger.debug(f"Extraídos {len(envolvidos)} envolvidos")
+        self.logger.debug("Extraídos %d envolvidos", len(envolvidos))
         return envolvidos
 
     def _extract_movimentacoes(self, response):
@@ -207,15 +460,100 @@ class ProcessoSpider(scrapy.Spider):
         datas = response.xpath('//a[starts-with(@name, "mov_")]//text()').getall()
         textos = response.xpath('//td[@width="95%"]//text()').getall()
         
+        # Registros compactos em vez de um MovimentacaoItem por linha: um
+        # processo antigo chega a milhares de movimentações
         for data, texto in zip(datas, textos):
-            loader = ItemLoader(item=MovimentacaoItem())
-            loader.add_value('data', data)
-            loader.add_value('texto', texto)
-            movimentacoes.append(loader.load_item())
+            movimentacoes.append(Movimentacao.extract(data, texto))
         
-        self.logger.debug(f"Extraídas {len(movimentacoes)} movimentações")
+        self.logger.debug("Extraídas %d movimentações", len(movimentacoes))
         return movimentacoes
 
+    def _mongo_db(self):
+        """Banco do MongoDB para consultas do spider, conectado na primeira chamada."""
+        settings = getattr(self, 'settings', None)
+        if settings is None:
+            return None
+        if self._mongo_client is None:
+            try:
+                from pymongo import MongoClient
+            except ImportError:
+                return None
+            self._mongo_client = MongoClient(
+                settings.get('MONGO_URI'),
+                serverSelectionTimeoutMS=2000
+            )
+        return self._mongo_client[settings.get('MONGO_DATABASE')]
+
+    def _get_party_index(self):
+        """Índice de partes no MongoDB, aberto na primeira consulta (None se desligado)."""
+        settings = getattr(self, 'settings', None)
+        if not self._party_index_ok:
+            return None
+        if self._party_index is None and settings is not None and settings.getbool('PARTY_INDEX_ENABLED'):
+            db = self._mongo_db()
+            if db is None:
+                return None
+            self._party_index = PartyIndex(
+                db[PARTY_COLLECTION],
+                ttl=settings.getint('PARTY_INDEX_TTL', 7 * 86400)
+            )
+        return self._party_index
+
+    def _get_freshness(self):
+        """Notas de frescor a partir da coleção de processos (só com prioridade=freshness)."""
+        if self._freshness is None and self.prioridade == 'freshness':
+            db = self._mongo_db()
+            if db is not None:
+                self._freshness = FreshnessScorer(db.processos)
+        return self._freshness
+
+    def _resolve_from_party_index(self, cnpj):
+        index = self._get_party_index()
+        if index is None:
+            return None
+        try:
+            processos = index.resolve(cnpj)
+        except Exception as e:
+            self.logger.warning(f"Índice de partes indisponível ({e}), usando o formulário")
+            self._disable_party_index()
+            return None
+        if processos is None:
+            self.crawler.stats.inc_value('party_index/miss')
+        return processos
+
+    def _record_cnpj_search(self, cnpj, links):
+        index = self._get_party_index()
+        if index is None or not cnpj:
+            return
+        # Processos distintos da lista: o índice só resolve o CNPJ quando
+        # tiver gravado esse mesmo número de processos vindos dela
+        total = len({m.group(1) if m else link for link, m in zip(links, map(PROCESSO_URL_RE.search, links))})
+        try:
+            index.record_search(cnpj, total)
+        except Exception as e:
+            self.logger.warning(f"Não foi possível registrar a busca no índice de partes: {e}")
+            self._disable_party_index()
+
+    def _disable_party_index(self):
+        self._party_index_ok = False
+        self._party_index = None
+        self.crawler.stats.set_value('party_index/disabled', True)
+
+    def closed(self, reason):
+        if self._mongo_client is not None:
+            self._mongo_client.close()
+        if self.frontier is not None:
+            if self._leased:
+                # Devolve o que este worker não terminou para os demais
+                self.frontier.nack(self._leased)
+                self.logger.info(f"{len(self._leased)} processos devolvidos ao frontier")
+            self.frontier.close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.logger.info(
+                f"Checkpoint {self.checkpoint_path}: {len(self.checkpoint)} processos concluídos"
+            )
+
     def _build_formdata_cnpj(self, cnpj_limpo):
         """
         Constrói formdata para busca por CNPJ.
@@ -282,8 +620,18 @@ class ProcessoSpider(scrapy.Spider):
         self.logger.info(f"HTML de debug salvo: {filename}")
 
     def handle_error(self, failure):
+        if failure.request.meta.get('retry_deferred'):
+            # O BackoffRetryMiddleware agendou outra tentativa: ainda não é falha
+            self.logger.debug(f"Nova tentativa agendada: {failure.request.url}")
+            return
         self.logger.error(f"Erro na requisição: {failure.request.url}")
         self.logger.error(f"Tipo do erro: {failure.type}")
         self.logger.error(f"Valor: {failure.value}")
 
+        numero = digits(failure.request.meta.get('numero_busca'))
+        if self.frontier is not None and numero in self._leased:
+            self._leased.discard(numero)
+            self.frontier.nack([numero], delay=self.settings.getfloat('FRONTIER_RETRY_DELAY', 300))
+            self.crawler.stats.inc_value('frontier/nacked')
+
         
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Textos repetitivos de movimentações e envolvidos.
+
+Papéis ("RELATOR", "APTE", "ADV/PROC") e textos de movimentação
+("Conclusos para decisão", "Juntada de Petição") se repetem em quase todo
+processo. Dois mecanismos evitam guardar uma cópia de cada um:
+
+- ``intern_text``: na extração, textos curtos iguais passam a apontar
+  para o mesmo objeto ``str`` (tabela limitada por ``TextPool``).
+- ``TextDictionary`` (``MONGO_TEXT_ENCODING``): no MongoDB, textos de
+  movimentação frequentes são gravados como ``texto_cod`` (inteiro) e o
+  texto fica uma única vez na coleção ``movimentacao_textos``. A API
+  traduz os códigos de volta com ``TextDecoder``.
+"""
+from collections import Counter
+
+
+TEXT_COLLECTION = 'movimentacao_textos'
+COUNTERS_COLLECTION = 'counters'
+
+
+class TextPool:
+    """
+    Tabela de interning com tamanho máximo.
+
+    Diferente de ``sys.intern``, textos longos (normalmente únicos) não
+    entram, e a tabela para de crescer em ``maxsize`` entradas.
+    """
+
+    def __init__(self, maxsize=50000, maxlen=120):
+        self.maxsize = maxsize
+        self.maxlen = maxlen
+        self._pool = {}
+
+    def intern(self, text):
+        if not isinstance(text, str) or len(text) > self.maxlen:
+            return text
+        existing = self._pool.get(text)
+        if existing is not None:
+            return existing
+        if len(self._pool) < self.maxsize:
+            self._pool[text] = text
+        return text
+
+    def clear(self):
+        self._pool.clear()
+
+    def __len__(self):
+        return len(self._pool)
+
+
+TEXT_POOL = TextPool()
+
+
+def intern_text(text):
+    """Processador de ItemLoader/registro que compartilha textos repetidos."""
+    return TEXT_POOL.intern(text)
+
+
+def ensure_text_index(collection):
+    collection.create_index([('texto', 1)], name='texto_1', unique=True, background=True)
+
+
+class TextDictionary:
+    """
+    Códigos inteiros para os textos de movimentação frequentes.
+
+    Um texto ganha código na ``min_count``-ésima vez que aparece na
+    execução (ou se já tiver código no banco). Os códigos vêm de um
+    contador em ``counters`` e são estáveis entre execuções.
+    """
+
+    def __init__(self, collection, counters, min_count=3, maxlen=120, max_tracked=100000):
+        self.collection = collection
+        self.counters = counters
+        self.min_count = min_count
+        self.maxlen = maxlen
+        self.max_tracked = max_tracked
+        self.codes = {}
+        self.seen = Counter()
+
+    def load(self):
+        """Carrega os códigos já gravados; retorna quantos são."""
+        for doc in self.collection.find({}, {'_id': True, 'texto': True}):
+            self.codes[doc['texto']] = doc['_id']
+        return len(self.codes)
+
+    def code(self, texto):
+        """Código do texto, ou None se ele ainda não for frequente."""
+        code = self.codes.get(texto)
+        if code is not None:
+            return code
+        if not isinstance(texto, str) or len(texto) > self.maxlen:
+            return None
+
+        self.seen[texto] += 1
+        if self.seen[texto] < self.min_count:
+            if len(self.seen) > self.max_tracked:
+                # Textos que apareceram poucas vezes não justificam a memória
+                self.seen = Counter({t: n for t, n in self.seen.items() if n > 1})
+            return None
+
+        del self.seen[texto]
+        return self._allocate(texto)
+
+    def _allocate(self, texto):
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        counter = self.counters.find_one_and_update(
+            {'_id': self.collection.name},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        code = counter['seq']
+        try:
+            self.collection.insert_one({'_id': code, 'texto': texto})
+        except DuplicateKeyError:
+            # Outro processo gravou o mesmo texto antes
+            code = self.collection.find_one({'texto': texto})['_id']
+
+        self.codes[texto] = code
+        return code
+
+    def encode(self, movimentacoes):
+        """
+        Troca ``texto`` por ``texto_cod`` nas movimentações com código.
+        Retorna ``(movimentacoes, quantidade_codificada)``.
+        """
+        encoded = []
+        count = 0
+        for mov in movimentacoes or ():
+            code = self.code(mov.get('texto'))
+            if code is None:
+                encoded.append(mov)
+                continue
+            mov = {k: v for k, v in mov.items() if k != 'texto'}
+            mov['texto_cod'] = code
+            encoded.append(mov)
+            count += 1
+        return encoded, count
+
+
+class TextDecoder:
+    """Traduz ``texto_cod`` de volta para ``texto`` ao ler os processos."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.texts = {}
+
+    def decode(self, documento):
+        movimentacoes = documento.get('movimentacoes') if documento else None
+        if not movimentacoes:
+            return documento
+
+        faltando = {
+            mov['texto_cod'] for mov in movimentacoes
+            if 'texto_cod' in mov and mov['texto_cod'] not in self.texts
+        }
+        if faltando:
+            for doc in self.collection.find({'_id': {'$in': sorted(faltando)}}):
+                self.texts[doc['_id']] = doc['texto']
+
+        decoded = []
+        for mov in movimentacoes:
+            if 'texto_cod' in mov:
+                mov = dict(mov)
+                mov['texto'] = self.texts.get(mov.pop('texto_cod'))
+            decoded.append(mov)
+        documento['movimentacoes'] = decoded
+        return documento